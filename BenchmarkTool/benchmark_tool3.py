@@ -4,8 +4,9 @@
 Sweep Cr/cont, generate -> compile -> run -> aggregate (delay & miss) for generator3
 - Generation pipeline mirrors benchmark_tool.py / benchmark_tool2.py
 - Reading logic combines:
-  * delay_ratio from task_*_delays.csv
-  * global miss rate (%) from program stdout line: "Global miss rate: XX.XX% (misses=... / jobs=...)"
+  * delay_ratio mean + misses/jobs from the program's SUMMARY line (in-program streaming stats)
+  * with --no-stats: delay_ratio from task_*_delays.bin / .csv and the global miss rate (%) from
+    program stdout line: "Global miss rate: XX.XX% (misses=... / jobs=...)"
 """
 
 import argparse
@@ -15,12 +16,23 @@ import os
 import random
 import re
 import subprocess
+import time
+from itertools import islice
 from pathlib import Path
 
 import numpy as np  # seed numpy inside generator3
 
 # generator3: must provide generate_taskset(...) and generate_c_file(...)
-from generator3 import generate_taskset, generate_c_file  # <-- 适配你的 generator3
+from generator3 import generate_taskset, generate_c_file, generate_taskset_spec, generate_taskset_json, apply_cost_profile  # <-- 适配你的 generator3
+from generator3 import PARTITIONERS, UTIL_METHODS, core_loads, generate_utilization_timing
+from calibration import STATES, STATS, ensure_profile
+from build_support import BuildCache, build_fragment_lib, build_parallel, build_runner
+from pipeline import BuildPipeline
+from refine import GridRefiner
+from delay_log import read_case_delay_ratios
+from run_summary import delay_and_miss, parse_duration, parse_summary
+from results_db import OK, ResultsDB
+from inflation import report as inflation_report
 
 # ----------------------------
 # grid & reproducible seeding
@@ -40,15 +52,26 @@ def make_grid(step: float):
                 yield (M, N, Cr, cont)
 
 
-def seed_for(M, N, Cr, cont, run_idx):
-    """Deterministic seed (same scheme as tool1/2)."""
+def fmt_frac(x: float):
+    """Cr/cont as written in directory names and summary.csv: 2 decimals unless refinement needs more."""
+    s = f"{x:.2f}"
+    return s if abs(float(s) - x) < 1e-9 else f"{x:.6f}".rstrip("0")
+
+
+def seed_for(M, N, Cr, cont, run_idx, util=None):
+    """Deterministic seed (same scheme as tool1/2; refined points also mix in the sub-0.01 digits,
+    --utils points their utilization)."""
     s = (
         (M * 73856093)
         ^ (N * 19349663)
         ^ (int(round(Cr * 100)) * 83492791)
         ^ (int(round(cont * 100)) * 2654435761)
+        ^ ((int(round(Cr * 10000)) % 100) * 40503)
+        ^ ((int(round(cont * 10000)) % 100) * 2246822519)
         ^ (run_idx + 1)
     )
+    if util is not None:
+        s ^= int(round(util * 10000)) * 3266489917
     s &= 0xFFFFFFFF
     return 1 if s == 0 else s
 
@@ -58,24 +81,9 @@ def seed_for(M, N, Cr, cont, run_idx):
 
 def parse_delay_ratios(case_dir: Path):
     """
-    Read all task_*_delays.csv -> collect "delay_ratio" -> return list[float]
+    Read all task_*_delays.bin / .csv -> collect "delay_ratio" -> return np.ndarray
     """
-    vals = []
-    for p in case_dir.glob("task_*_delays.csv"):
-        try:
-            with p.open("r", newline="") as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    v = row.get("delay_ratio")
-                    if v is None:
-                        continue
-                    try:
-                        vals.append(float(v))
-                    except Exception:
-                        pass
-        except Exception:
-            pass
-    return vals
+    return read_case_delay_ratios(case_dir)
 
 
 _miss_rate_re = re.compile(
@@ -114,20 +122,84 @@ def main():
     ap.add_argument("--out", type=Path, default=Path("out_serial3"), help="输出根目录")
     ap.add_argument("--runs", type=int, default=1, help="每个场景重复次数（建议先 1 验证，再增大）")
     ap.add_argument("--step", type=float, default=0.10, help="Cr/cont 步长，0.10 模拟 tool1，0.20 模拟 tool2")
+    ap.add_argument("--refine", action="store_true",
+                    help="自适应网格细化：以 --step 为粗网格，逐层细分 miss/delay 在相邻点间变化剧烈的单元")
+    ap.add_argument("--min-step", type=float, default=0.025, help="--refine 的最细步长")
+    ap.add_argument("--refine-miss", type=float, default=10.0,
+                    help="--refine：单元四角 miss 率极差超过该值（百分点）则细分")
+    ap.add_argument("--refine-delay", type=float, default=0.2,
+                    help="--refine：单元四角 delay 均值相对极差超过该值则细分")
+    ap.add_argument("--max-cases", type=int, default=None, help="--refine：总用例数上限（点数 x runs）")
     # --- task gen args (forwarded to generator3) ---
     ap.add_argument("--wcet-min", type=int, default=200)
     ap.add_argument("--wcet-max", type=int, default=500)
     ap.add_argument("--raf-max", type=int, default=200)
     ap.add_argument("--fn", type=int, default=10, help="每任务分段数")
+    ap.add_argument("--utils", type=str, default=None,
+                    help="按利用率生成周期/WCET，逗号分隔的利用率列表作为网格的一维（如 0.3,0.5,0.7）；"
+                         "默认不设：period = 10 * wcet")
+    ap.add_argument("--util-scope", choices=("core", "total"), default="core",
+                    help="--utils 的含义：每核利用率（总利用率 = u * M）或任务集总利用率")
+    ap.add_argument("--util-method", choices=UTIL_METHODS, default="uunifast",
+                    help="利用率向量的抽样方法（U 接近 N 时用 randfixedsum）")
+    ap.add_argument("--period-range", type=int, nargs=2, default=None, metavar=("PMIN", "PMAX"),
+                    help="--utils：周期范围（us，对数均匀；默认 10*wcet-min .. 10*wcet-max）")
+    ap.add_argument("--harmonic", action="store_true", help="--utils：谐波周期（PMIN * 2^k）")
+    ap.add_argument("--partition", choices=tuple(PARTITIONERS), default="rr",
+                    help="任务到核的分配：rr=轮转（i %% M）；wfd/ffd/bfd=按利用率降序的 worst/first/best-fit；"
+                         "contention=先分散有竞争共享片段的任务，再 wfd（每核负载见 cores.csv）")
     # --- compile/run ---
+    ap.add_argument("--cost-profile", type=Path, default=None,
+                    help="主机片段 cost profile 目录（按主机指纹缓存，缺失时先自动标定）")
+    ap.add_argument("--cost-stat", choices=STATS, default="mean", help="profile 中使用的统计量")
+    ap.add_argument("--cost-state", choices=STATES, default="cold", help="冷态/热态 cost")
     ap.add_argument("--gcc", type=str, default="gcc")
     ap.add_argument("--compile-flags", type=str, default="-O2 -pthread -lm")
     ap.add_argument("--timeout", type=int, default=60, help="单次运行超时（秒）")
-    ap.add_argument("--skip-if-done", action="store_true", help="若场景已存在结果则跳过（断点续跑）")
+    ap.add_argument("--db", type=Path, default=None, help="SQLite 结果库（默认 <out>/results.sqlite）")
+    ap.add_argument("--skip-if-done", action="store_true",
+                    help="断点续跑：保留结果库，已成功完成的 run 直接取库中结果，不再编译/运行")
+    ap.add_argument("--no-fraglib", action="store_true",
+                    help="不使用预编译片段库，每个场景重新编译 linuxAPI_lib.c / bench_lib.c")
+    ap.add_argument("--build-cache", type=Path, default=None,
+                    help="taskset.out 内容寻址缓存目录（默认 <out>/build_cache）")
+    ap.add_argument("--no-build-cache", action="store_true", help="禁用 taskset.out 构建缓存")
+    ap.add_argument("--build-jobs", type=int, default=os.cpu_count() or 1,
+                    help="并行编译进程数（默认=主机核数）；测量始终串行")
+    ap.add_argument("--pipeline", action="store_true",
+                    help="流水线模式：测量场景 i 时在其未占用的核上编译场景 i+1（替代 Step 2a）")
+    ap.add_argument("--stream", action="store_true",
+                    help="流式模式：按 --lookahead 窗口惰性生成/编译/测量，不再先为整个网格生成源码；"
+                         "测量完的源码与可执行文件随即删除（可由确定性种子重新生成）")
+    ap.add_argument("--lookahead", type=int, default=16, help="--stream：每个窗口的用例数（点数 x runs）")
+    ap.add_argument("--keep-sources", action="store_true", help="--stream：保留已测量用例的源码与可执行文件")
+    ap.add_argument("--runner", action="store_true",
+                    help="使用预编译的数据驱动 runner：每个场景只写 taskset.txt，不再逐个编译")
+    ap.add_argument("--log-format", choices=("none", "bin", "csv"), default="none",
+                    help="逐作业日志格式：none=不记录（只用 SUMMARY 在线统计），"
+                         "bin=task_*_delays.bin（np.memmap 读取），csv=旧的文本格式")
+    ap.add_argument("--no-stats", action="store_true",
+                    help="关闭程序内在线统计（SUMMARY 行），改为读取逐作业日志")
+    ap.add_argument("--counters", action="store_true",
+                    help="每个任务线程采集 perf 计数（cycles/instructions/LLC miss/上下文切换/缺页，"
+                         "perf 不可用时退回 getrusage），存入结果库 task_counters 并导出 counters.csv")
+    ap.add_argument("--trace", type=int, default=0, metavar="EVENTS",
+                    help="片段级事件跟踪：每个任务保留最近 EVENTS 个片段事件（环形缓冲区），写出 task_*_trace.bin 与 "
+                         "taskset.json，用 trace_export.py 转成 Chrome trace JSON；0 = 关闭")
+    ap.add_argument("--fragment-stats", action="store_true",
+                    help="每个任务线程按片段统计调用次数/耗时/直方图，存入结果库 fragment_stats，"
+                         "并输出共享与 para_ 变体的膨胀系数报告 inflation.csv（按 M 与 contention 分组）")
+    ap.add_argument("--adaptive", action="store_true",
+                    help="自适应运行时长：delay 均值与 miss 率的 95%% 置信区间足够窄时提前停止")
+    ap.add_argument("--min-duration", type=float, default=0.2, help="自适应：最短运行时长（秒）")
+    ap.add_argument("--max-duration", type=float, default=None,
+                    help="运行时长（秒）；--adaptive 时为上限（默认 generator3 的 RUN_DURATION_SEC）")
+    ap.add_argument("--ci-rel", type=float, default=0.01, help="自适应：delay 均值置信区间半宽（相对均值）")
+    ap.add_argument("--ci-miss", type=float, default=0.5, help="自适应：miss 率置信区间半宽（百分点）")
     # --- library paths (same style as tool1/2) ---
-    ap.add_argument("--linuxapi-path", type=Path, default=here / "LinuxAPI",
+    ap.add_argument("--linuxapi-path", type=Path, default=here.parent / "LinuxAPI",
                     help="包含 linuxAPI_lib.h / linuxAPI_lib.c 的目录")
-    ap.add_argument("--tacle-path", type=Path, default=here / "Taclebench",
+    ap.add_argument("--tacle-path", type=Path, default=here.parent / "Taclebench",
                     help="包含 bench_lib.h / bench_lib.c 的目录")
     ap.add_argument("--linuxapi-c", type=str, default="linuxAPI_lib.c")
     ap.add_argument("--linuxapi-h", type=str, default="linuxAPI_lib.h")
@@ -148,186 +220,449 @@ def main():
     linuxapi_c   = (linuxapi_dir / args.linuxapi_c).resolve()
     bench_c      = (tacle_dir / args.bench_c).resolve()
 
-    # sanity hints
-    for pth, lab in [(linuxapi_dir, "LinuxAPI dir"), (tacle_dir, "Taclebench dir"),
-                     (linuxapi_c, "linuxAPI_lib.c"), (bench_c, "bench_lib.c"),
-                     (linuxapi_dir / args.linuxapi_h, "linuxAPI_lib.h"),
-                     (tacle_dir / args.bench_h, "bench_lib.h")]:
-        if not pth.exists():
-            print(f"[WARN] Not found: {lab} -> {pth}")
+    # the fragment libraries are hashed, compiled and linked into every case: stop early without them
+    missing = [f"{lab} -> {pth}" for pth, lab in [
+        (linuxapi_c, "linuxAPI_lib.c"), (bench_c, "bench_lib.c"),
+        (linuxapi_dir / args.linuxapi_h, "linuxAPI_lib.h"), (tacle_dir / args.bench_h, "bench_lib.h")]
+        if not pth.exists()]
+    if missing:
+        ap.error("fragment library sources not found (set --linuxapi-path / --tacle-path): " + ", ".join(missing))
 
-    # -----------------------
-    # Step 1: generate C
-    # -----------------------
-    print("[STEP 1] Generating all C files...")
-    total_cases = 0
-    gen_cases = 0
+    # host-calibrated fragment costs (only re-measured when the host fingerprint changes)
+    if args.cost_profile is not None:
+        try:
+            prof = ensure_profile(args.cost_profile, linuxapi_dir, tacle_dir, gcc=args.gcc)
+            no_cost = apply_cost_profile(prof, stat=args.cost_stat, state=args.cost_state)
+        except (RuntimeError, ValueError) as e:
+            ap.error(f"--cost-profile: {e}")
+        if no_cost:
+            print(f"[COST_PROFILE] 没有 {args.cost_state}/{args.cost_stat} 数据的片段保持内置 cost：{', '.join(no_cost)}")
+
+    # generator3 render options (shared by per-case sources and the runner)
+    if args.no_stats and args.log_format == "none":
+        ap.error("--no-stats needs per-job logs (--log-format bin|csv)")
+    if args.no_stats and args.counters:
+        ap.error("--counters is reported in the SUMMARY record and cannot be combined with --no-stats")
+    if args.no_stats and args.fragment_stats:
+        ap.error("--fragment-stats is reported in the SUMMARY record and cannot be combined with --no-stats")
+    if args.trace < 0:
+        ap.error("--trace must be >= 0")
+    render_opts = dict(log_format=args.log_format, stats=not args.no_stats, counters=args.counters,
+                       trace=args.trace, fragstats=args.fragment_stats)
+
+    # utilization axis (None: period = 10 * wcet, the original generation)
+    utils = [None]
+    if args.utils is not None:
+        try:
+            utils = [float(u) for u in args.utils.split(",") if u.strip()]
+        except ValueError:
+            ap.error(f"--utils: not a comma-separated list of numbers: {args.utils}")
+        if not utils or any(u <= 0 for u in utils):
+            ap.error("--utils must be > 0")
+        if args.util_scope == "core" and any(u > 1 for u in utils):
+            ap.error("--utils with --util-scope core must be <= 1 (N = M tasks)")
+    period_range = args.period_range or (10 * args.wcet_min, 10 * args.wcet_max)
+    if not 0 < period_range[0] <= period_range[1]:
+        ap.error("--period-range must satisfy 0 < PMIN <= PMAX")
+
+    def total_util(M, util):
+        return util * M if args.util_scope == "core" else util
+
+    # run length of the generated programs: read from the environment, so every run
+    # (serial subprocess or packed Popen) inherits it
+    if args.max_duration is not None:
+        os.environ["TASKSET_MAX_SEC"] = str(args.max_duration)
+    if args.adaptive:
+        os.environ.update(TASKSET_CI_REL=str(args.ci_rel), TASKSET_CI_MISS=str(args.ci_miss),
+                          TASKSET_MIN_SEC=str(args.min_duration))
+
+    # fragment library: compiled once per campaign, linked into every case
+    include_dirs = [linuxapi_dir, tacle_dir]
+    if args.no_fraglib:
+        link_inputs = [linuxapi_c, bench_c]
+    else:
+        fraglib = build_fragment_lib(out_root, args.gcc, args.compile_flags,
+                                     include_dirs, [linuxapi_c, bench_c])
+        if fraglib is None:
+            return
+        link_inputs = [fraglib]
+    build_cache = BuildCache(
+        None if args.no_build_cache else (args.build_cache or out_root / "build_cache"),
+        args.gcc, args.compile_flags, include_dirs, link_inputs
+    )
 
-    for (M, N, Cr, cont) in make_grid(args.step):
-        if M > host_cores:
-            print(f"[WARN] Skip M={M} (exceeds host cores {host_cores})")
-            continue
-        for run_idx in range(args.runs):
-            total_cases += 1
-            case_dir = out_root / f"M{M}_N{N}" / f"Cr_{Cr:0.2f}" / f"cont_{cont:0.2f}" / f"run_{run_idx:03d}"
-            c_path = case_dir / "generated_taskset.c"
+    # data-driven runner: built once for the whole campaign
+    runner_exe = None
+    if args.runner:
+        runner_exe = build_runner(out_root, args.gcc, args.compile_flags,
+                                  include_dirs, link_inputs, render_opts)
+        if runner_exe is None:
+            return
+    case_file = "taskset.txt" if args.runner else "generated_taskset.c"
+
+    # results store: one case per (M,N,Cr,cont) point, one run per run_idx
+    db = ResultsDB(args.db or out_root / "results.sqlite", fresh=not args.skip_if_done)
+    # options that define the cases: a resumed store must have been written with the same ones
+    campaign = dict(utils=args.utils, util_scope=args.util_scope, util_method=args.util_method,
+                    period_range=list(period_range), harmonic=args.harmonic, partition=args.partition)
+    conflicts = db.meta_conflicts(defaults={"utils": None, "util_scope": "core", "util_method": "uunifast",
+                                            "partition": "rr"}, **campaign)
+    if conflicts:
+        db.close()
+        ap.error("--skip-if-done: the results store was written with other options ("
+                 + "; ".join(f"{k}: stored {old}, now {new}" for k, old, new in conflicts) + ")")
+    db.set_meta(tool="benchmark_tool3", step=args.step, runs=args.runs, refine=args.refine, **campaign)
 
-            if args.skip_if_done and c_path.exists():
+    # -----------------------
+    # per-point helpers (uniform sweep and --refine share them)
+    # -----------------------
+    def point_dirs(M, N, Cr, cont, util=None):
+        base = out_root / f"M{M}_N{N}"
+        if util is not None:
+            base = base / f"U_{fmt_frac(util)}"
+        return [base / f"Cr_{fmt_frac(Cr)}" / f"cont_{fmt_frac(cont)}" / f"run_{i:03d}"
+                for i in range(args.runs)]
+
+    def generate_point(M, N, Cr, cont, level, util=None):
+        """Step 1 for one (M,N,Cr,cont[,util]): write the case file of every run; returns #generated."""
+        pid = db.point_id(M, N, Cr, cont, level, util, args.partition)
+        gen = 0
+        for run_idx, case_dir in enumerate(point_dirs(M, N, Cr, cont, util)):
+            c_path = case_dir / case_file
+
+            if db.is_done(pid, run_idx) or (args.skip_if_done and c_path.exists()):
                 continue
+            t0 = time.monotonic()
 
             case_dir.mkdir(parents=True, exist_ok=True)
 
             # deterministic seed (random + numpy)
-            sd = seed_for(M, N, Cr, cont, run_idx)
+            sd = seed_for(M, N, Cr, cont, run_idx, util)
             random.seed(sd)
             np.random.seed(sd)
 
             # generate
+            timing = None
+            if util is not None:
+                wcets, periods = generate_utilization_timing(
+                    N, total_util(M, util), 1, args.util_method,
+                    period_range[0], period_range[1], args.harmonic)
+                timing = (wcets[0].tolist(), periods[0].tolist())
             taskset = generate_taskset(
                 M=M, N=N,
                 wcet_min=args.wcet_min, wcet_max=args.wcet_max,
                 Cr=Cr, RaF_max=args.raf_max, FN=args.fn,
-                contention=cont
+                contention=cont, timing=timing, partition=args.partition
             )
-            generate_c_file(taskset, str(c_path))
-            gen_cases += 1
+            db.add_core_loads(pid, run_idx, core_loads(taskset))
+            if args.runner:
+                generate_taskset_spec(taskset, str(c_path))
+            else:
+                generate_c_file(taskset, str(c_path), **render_opts)
+            if args.trace:
+                generate_taskset_json(taskset, str(c_path.parent / "taskset.json"))
+            db.add_stage(pid, run_idx, "generate", time.monotonic() - t0)
+            gen += 1
             print(f"[GEN_OK] {c_path}")
+        return gen
 
-    print(f"[STEP 1 DONE] Generated {gen_cases}/{total_cases} cases (some may be skipped).")
-
-    # -----------------------
-    # Step 2: compile & run
-    #   -> read delay & miss
-    #   -> aggregate per (M,N,Cr,cont)
-    # -----------------------
-    print("[STEP 2] Compiling & running sequentially...")
-
+    # resumed runs are read back from the results store, so summary.csv is always rewritten in full
     summary_path = out_root / "summary.csv"
-    write_header = not (args.skip_if_done and summary_path.exists())
-    summary_f = open(summary_path, "a" if args.skip_if_done else "w", newline="")
+    summary_f = open(summary_path, "w", newline="")
     summary_w = csv.writer(summary_f)
 
-    if write_header:
-        summary_w.writerow([
-            "M","N","Cr","contention",
-            "runs",
-            # delay stats (per-run mean of delay ratios)
-            "delay_mean_of_means","delay_std_of_means","delay_min_of_means","delay_max_of_means",
-            # miss stats (global miss rate % per run)
-            "miss_mean","miss_std","miss_min","miss_max",
-            # optional: sum of misses/jobs across runs (not averaged)
-            "sum_misses","sum_jobs"
-        ])
+    summary_w.writerow([
+        "M","N","Cr","contention",
+        "runs",
+        # delay stats (per-run mean of delay ratios)
+        "delay_mean_of_means","delay_std_of_means","delay_min_of_means","delay_max_of_means",
+        # miss stats (global miss rate % per run)
+        "miss_mean","miss_std","miss_min","miss_max",
+        # optional: sum of misses/jobs across runs (not averaged)
+        "sum_misses","sum_jobs",
+        # measured run length (per-run mean; shorter than RUN_DURATION_SEC with --adaptive)
+        "duration_mean_s",
+        # refinement level of the point (0 = --step grid; always 0 without --refine)
+        "level",
+        # target utilization of --utils (as given, see --util-scope; empty: period = 10 * wcet)
+        "util"
+    ])
 
     compiled = 0
     ran = 0
-    frac_vals = [round(args.step * i, 2) for i in range(int(round(1.0 / args.step)) + 1)]
+    pipeline = BuildPipeline(build_cache) if (args.pipeline and not args.runner) else None
+
+    def measure_point(M, N, Cr, cont, level, util, case_dirs, built, next_case):
+        """Step 2 for one (M,N,Cr,cont[,util]): run every case, write its summary row; returns (delay, miss) means."""
+        nonlocal compiled, ran
+        per_run_delay_means = []
+        per_run_miss_rates  = []
+        sum_misses = 0
+        sum_jobs   = 0
+        durations  = []
+        pid = db.point_id(M, N, Cr, cont, level, util, args.partition)
+
+        def add_result(dmean, miss_rate, misses, jobs, duration):
+            nonlocal sum_misses, sum_jobs
+            if duration is not None:
+                durations.append(duration)
+            if not math.isnan(dmean):
+                per_run_delay_means.append(dmean)
+            if not math.isnan(miss_rate):
+                per_run_miss_rates.append(miss_rate)
+            if misses is not None and jobs is not None:
+                sum_misses += misses
+                sum_jobs   += jobs
+
+        for run_idx, case_dir in enumerate(case_dirs):
+            if db.is_done(pid, run_idx):
+                # resumed: measured by an earlier invocation
+                add_result(*db.get_run(pid, run_idx))
+                continue
 
-    for M in range(1, 17):
-        N = M
-        if M > host_cores:
-            continue
-        for Cr in frac_vals:
-            for cont in frac_vals:
-                case_dirs = [
-                    out_root / f"M{M}_N{N}" / f"Cr_{Cr:0.2f}" / f"cont_{cont:0.2f}" / f"run_{i:03d}"
-                    for i in range(args.runs)
-                ]
-
-                per_run_delay_means = []
-                per_run_miss_rates  = []
-                sum_misses = 0
-                sum_jobs   = 0
-
-                for case_dir in case_dirs:
-                    c_path = case_dir / "generated_taskset.c"
-                    if not c_path.exists():
-                        print(f"[MISS] {c_path} not found, skip this run.")
-                        continue
+            c_path = case_dir / case_file
+            if not c_path.exists():
+                print(f"[MISS] {c_path} not found, skip this run.")
+                continue
 
-                    # compile
-                    cmd = (
-                        f'{args.gcc} {args.compile_flags} '
-                        f'-I"{linuxapi_dir}" -I"{tacle_dir}" '
-                        f'generated_taskset.c '
-                        f'"{linuxapi_c}" "{bench_c}" '
-                        f'-o taskset.out'
-                    )
-                    comp = subprocess.run(
-                        cmd, shell=True, cwd=str(case_dir),
-                        stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True
-                    )
+            if args.runner:
+                run_cmd = [str(runner_exe), case_file]
+            else:
+                run_cmd = ["./taskset.out"]
+                if pipeline is not None:
+                    t0 = time.monotonic()
+                    ok, comp_out = pipeline.wait(case_dir)
+                    db.add_stage(pid, run_idx, "build", time.monotonic() - t0)
                     compiled += 1
-                    if comp.returncode != 0:
-                        print(f"[COMPILE_FAIL] {case_dir}\n{comp.stdout}")
+                    # overlap: build the next case on cores M.. while this one runs on 0..M-1
+                    pipeline.prefetch(next_case.get(case_dir), range(M))
+                    if not ok:
+                        print(f"[COMPILE_FAIL] {case_dir}\n{comp_out}")
+                        db.add_run(pid, run_idx, "build_fail", case_dir=case_dir)
                         continue
+                elif not built.get(case_dir):
+                    db.add_run(pid, run_idx, "build_fail", case_dir=case_dir)
+                    continue
 
-                    # run
-                    try:
-                        runp = subprocess.run(
-                            ["./taskset.out"],
-                            cwd=str(case_dir),
-                            stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
-                            text=True, timeout=args.timeout
-                        )
-                    except subprocess.TimeoutExpired:
-                        print(f"[RUN_TIMEOUT] {case_dir}")
-                        continue
+            # run
+            t0 = time.monotonic()
+            try:
+                runp = subprocess.run(
+                    run_cmd,
+                    cwd=str(case_dir),
+                    stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                    text=True, timeout=args.timeout
+                )
+            except subprocess.TimeoutExpired:
+                print(f"[RUN_TIMEOUT] {case_dir}")
+                db.add_run(pid, run_idx, "timeout", case_dir=case_dir)
+                continue
+            db.add_stage(pid, run_idx, "run", time.monotonic() - t0)
 
-                    ran += 1
-                    if runp.returncode != 0:
-                        print(f"[RUN_FAIL] {case_dir}\n{runp.stdout}")
-                        continue
+            ran += 1
+            if runp.returncode != 0:
+                print(f"[RUN_FAIL] {case_dir}\n{runp.stdout}")
+                db.add_run(pid, run_idx, "run_fail", case_dir=case_dir)
+                continue
+
+            # save stdout
+            with open(case_dir / "run_log.txt", "w") as lf:
+                lf.write(runp.stdout)
+
+            summ = parse_summary(runp.stdout)
+            duration = parse_duration(runp.stdout)
+            if summ is not None:
+                # in-program streaming stats: no per-job logs to read (no jobs -> both NaN)
+                dmean, miss_rate, misses, jobs = delay_and_miss(summ)
+            else:
+                # parse delay
+                dvals = parse_delay_ratios(case_dir)
+                dmean = float(dvals.mean()) if dvals.size else float("nan")
+
+                # parse miss
+                miss_rate, misses, jobs = parse_global_miss_rate(runp.stdout)
+                if miss_rate is None:
+                    miss_rate = float("nan")
+            db.add_run(pid, run_idx, OK, dmean, miss_rate, misses, jobs, duration,
+                       stop=summ.get("stop") if summ else None, case_dir=case_dir, summary=summ)
+            add_result(dmean, miss_rate, misses, jobs, duration)
+
+        # aggregate this (M,N,Cr,cont)
+        def agg_stats(vals):
+            if not vals:
+                return ("NaN","NaN","NaN","NaN")
+            n = len(vals)
+            mean_v = sum(vals) / n
+            var = sum((x - mean_v) ** 2 for x in vals) / n
+            std_v = math.sqrt(var)
+            return (f"{mean_v:.9f}", f"{std_v:.9f}", f"{min(vals):.9f}", f"{max(vals):.9f}")
+
+        delay_stats = agg_stats(per_run_delay_means)
+        miss_stats  = agg_stats(per_run_miss_rates)
+
+        summary_w.writerow([
+            M, N, fmt_frac(Cr), fmt_frac(cont),
+            len(per_run_delay_means) if per_run_delay_means or per_run_miss_rates else 0,
+            *delay_stats,
+            *miss_stats,
+            str(sum_misses), str(sum_jobs),
+            (f"{sum(durations) / len(durations):.3f}" if durations else "NaN"),
+            level,
+            "" if util is None else fmt_frac(util)
+        ])
+        summary_f.flush()
+
+        # console friendly report
+        # 例： [OK] M=4 Cr=0.30 cont=0.20 runs=5 delay_mean=1.234567 miss_mean=12.345%
+        delay_mean_disp = delay_stats[0] if delay_stats[0] != "NaN" else "NaN"
+        miss_mean_disp  = miss_stats[0]  if miss_stats[0]  != "NaN" else "NaN"
+        print(f"[OK] M={M}" + (f" U={fmt_frac(util)}" if util is not None else "")
+              + f" Cr={fmt_frac(Cr)} cont={fmt_frac(cont)} runs={len(per_run_delay_means)} "
+              f"delay_mean={delay_mean_disp} miss_mean={miss_mean_disp}%"
+              + (f" level={level}" if args.refine else ""))
+        return float(delay_mean_disp), float(miss_mean_disp)
+
+    def run_points(points):
+        """
+        Step 1 + 2a + 2 for a batch of (M, Cr, cont, level, util) points (N = M).
+        Returns [(M, Cr, cont, delay_mean, miss_mean)] in batch order.
+        """
+        nonlocal compiled
+        # -----------------------
+        # Step 1: generate case files
+        # -----------------------
+        print(f"[STEP 1] Generating {case_file} for {len(points)} points x {args.runs} runs...")
+        gen_cases = sum(generate_point(M, M, Cr, cont, level, util) for (M, Cr, cont, level, util) in points)
+        print(f"[STEP 1 DONE] Generated {gen_cases}/{len(points) * args.runs} cases (some may be skipped).")
+
+        grid_points = [(M, M, Cr, cont, level, util, point_dirs(M, M, Cr, cont, util))
+                       for (M, Cr, cont, level, util) in points]
+        # runs the results store already holds are neither built nor measured again
+        flat = [d for (M, N, Cr, cont, level, util, dirs) in grid_points for run_idx, d in enumerate(dirs)
+                if not db.is_done(db.point_id(M, N, Cr, cont, level, util, args.partition), run_idx) and (d / case_file).exists()]
+
+        # -----------------------
+        # Step 2a: compile all cases on a bounded worker pool
+        # -----------------------
+        built = {}
+        if not args.runner and pipeline is None:
+            print(f"[STEP 2a] Compiling {len(flat)} cases with {args.build_jobs} build jobs...")
+            for case_dir, ok, comp_out in build_parallel(build_cache, flat, args.build_jobs):
+                compiled += 1
+                built[case_dir] = ok
+                if not ok:
+                    print(f"[COMPILE_FAIL] {case_dir}\n{comp_out}")
+            print(f"[STEP 2a DONE] Built {sum(built.values())}/{len(flat)} cases.")
+
+        # -----------------------
+        # Step 2: run (strictly serial)
+        #   -> read delay & miss
+        #   -> aggregate per (M,N,Cr,cont)
+        # -----------------------
+        print("[STEP 2] Running sequentially (prebuilt runner)..." if args.runner
+              else "[STEP 2] Running compiled cases sequentially...")
+        # pipeline: next case to prefetch while the current one is measured
+        next_case = dict(zip(flat, flat[1:]))
+        results = []
+        for (M, N, Cr, cont, level, util, case_dirs) in grid_points:
+            dmean, mmean = measure_point(M, N, Cr, cont, level, util, case_dirs, built, next_case)
+            results.append((M, Cr, cont, dmean, mmean))
+        return results
+
+    def drop_sources(points):
+        """--stream: remove the measured cases' sources and binaries (results stay in run_log / the store)."""
+        for (M, Cr, cont, _, util) in points:
+            for case_dir in point_dirs(M, M, Cr, cont, util):
+                for name in (case_file, "taskset.out"):
+                    p = case_dir / name
+                    if p.exists():
+                        p.unlink()
+
+    def run_batches(points):
+        """
+        run_points over `points` (any iterable). With --stream the points are consumed lazily,
+        one window of about --lookahead cases at a time, so measurement starts after the first
+        window is generated and built, and only one window of sources is on disk at once.
+        """
+        if not args.stream:
+            return run_points(list(points))
+        per_window = max(1, args.lookahead // max(1, args.runs))
+        it = iter(points)
+        results = []
+        while True:
+            window = list(islice(it, per_window))
+            if not window:
+                return results
+            results.extend(run_points(window))
+            if not args.keep_sources:
+                drop_sources(window)
 
-                    # save stdout
-                    with open(case_dir / "run_log.txt", "w") as lf:
-                        lf.write(runp.stdout)
-
-                    # parse delay
-                    dvals = parse_delay_ratios(case_dir)
-                    if dvals:
-                        per_run_delay_means.append(sum(dvals) / len(dvals))
-
-                    # parse miss
-                    miss_rate, misses, jobs = parse_global_miss_rate(runp.stdout)
-                    if miss_rate is not None:
-                        per_run_miss_rates.append(miss_rate)
-                    if misses is not None and jobs is not None:
-                        sum_misses += misses
-                        sum_jobs   += jobs
-
-                # aggregate this (M,N,Cr,cont)
-                def agg_stats(vals):
-                    if not vals:
-                        return ("NaN","NaN","NaN","NaN")
-                    n = len(vals)
-                    mean_v = sum(vals) / n
-                    var = sum((x - mean_v) ** 2 for x in vals) / n
-                    std_v = math.sqrt(var)
-                    return (f"{mean_v:.9f}", f"{std_v:.9f}", f"{min(vals):.9f}", f"{max(vals):.9f}")
-
-                delay_stats = agg_stats(per_run_delay_means)
-                miss_stats  = agg_stats(per_run_miss_rates)
-
-                summary_w.writerow([
-                    M, N, f"{Cr:.2f}", f"{cont:.2f}",
-                    len(per_run_delay_means) if per_run_delay_means or per_run_miss_rates else 0,
-                    *delay_stats,
-                    *miss_stats,
-                    str(sum_misses), str(sum_jobs)
-                ])
-                summary_f.flush()
-
-                # console friendly report
-                # 例： [OK] M=4 Cr=0.30 cont=0.20 runs=5 delay_mean=1.234567 miss_mean=12.345%
-                delay_mean_disp = delay_stats[0] if delay_stats[0] != "NaN" else "NaN"
-                miss_mean_disp  = miss_stats[0]  if miss_stats[0]  != "NaN" else "NaN"
-                print(f"[OK] M={M} Cr={Cr:.2f} cont={cont:.2f} runs={len(per_run_delay_means)} "
-                      f"delay_mean={delay_mean_disp} miss_mean={miss_mean_disp}%")
+    frac_vals = [round(args.step * i, 2) for i in range(int(round(1.0 / args.step)) + 1)]
+    Ms = []
+    for M in range(1, 17):
+        if M > host_cores:
+            print(f"[WARN] Skip M={M} (exceeds host cores {host_cores})")
+            continue
+        Ms.append(M)
+
+    def feasible(M, util):
+        # N = M tasks carry a total utilization of at most M
+        return util is None or total_util(M, util) <= M
+
+    for util in utils:
+        for M in Ms:
+            if not feasible(M, util):
+                print(f"[WARN] Skip U={fmt_frac(util)} on M={M} (exceeds N={M} tasks)")
+
+    if not args.refine:
+        # uniform --step grid (make_grid order)
+        run_batches((M, Cr, cont, 0, util) for util in utils
+                    for (M, N, Cr, cont) in make_grid(args.step) if M in Ms and feasible(M, util))
+    else:
+        # coarse grid first, then split the cells whose corners disagree, level by level
+        # (one (Cr, cont) refinement per utilization; --max-cases is shared)
+        used = 0
+        for util in utils:
+            refiner = GridRefiner(frac_vals, args.min_step, args.refine_miss, args.refine_delay)
+            points = refiner.initial([M for M in Ms if feasible(M, util)])
+            level = 0
+            while points:
+                if args.max_cases is not None:
+                    points = points[:max(0, (args.max_cases - used) // args.runs)]
+                    if not points:
+                        break
+                print(f"[REFINE] level {level}: {len(points)} points"
+                      + (f" (U={fmt_frac(util)})" if util is not None else ""))
+                for (M, Cr, cont, dmean, mmean) in run_batches([p + (util,) for p in points]):
+                    refiner.record(M, Cr, cont, dmean, mmean)
+                used += len(points) * args.runs
+                budget = None if args.max_cases is None else (args.max_cases - used) // args.runs
+                points = refiner.next_level(budget)
+                level += 1
+            print(f"[REFINE DONE] {used} cases over {level} levels"
+                  + (f" (U={fmt_frac(util)})" if util is not None else ""))
 
     summary_f.close()
+    if args.counters:
+        db.export_csv("counters_csv", out_root / "counters.csv", formats={
+            "delay_mean": ".9f", "miss_rate_percent": ".9f"})
+    db.export_csv("cores_csv", out_root / "cores.csv", formats={
+        "core_util": ".4f", "shared_util": ".4f", "delay_mean": ".9f", "miss_rate_percent": ".9f"})
+    db.close()
+    if args.fragment_stats:
+        inflation_report(db.path, out_root / "inflation.csv")
     print(f"[DONE] Compiled: {compiled}, Ran: {ran}")
+    build_cache.report()
+    if pipeline is not None:
+        pipeline.close()
+        pipeline.report()
     print(f"[OUTPUT] Summary -> {summary_path.resolve()}")
+    print(f"[OUTPUT] Results store -> {db.path.resolve()}")
+    print(f"[OUTPUT] Per-core loads -> {(out_root / 'cores.csv').resolve()}")
+    if args.counters:
+        print(f"[OUTPUT] Counters -> {(out_root / 'counters.csv').resolve()}")
+    if args.fragment_stats:
+        print(f"[OUTPUT] Inflation -> {(out_root / 'inflation.csv').resolve()}")
     print("Tip: 先用 --runs 1 + 小步长验证，再扩大 runs 与网格密度。")
     
 
@@ -16,13 +16,28 @@ import math
 import os
 import random
 import re
-import subprocess
+import time
 from pathlib import Path
 
 import numpy as np
 
 # 使用 generator3 的同类型生成方案
-from generator3 import generate_taskset, generate_c_file
+from generator3 import generate_taskset, generate_c_file, generate_taskset_spec, generate_taskset_json
+from generator3 import PARTITIONERS, UTIL_METHODS, core_loads, generate_utilization_timing
+from calibration import STATES, STATS
+from build_support import BuildCache, build_fragment_lib, build_runner
+from campaign import (Pruner, apply_costs, build_case, check_options, enqueue_and_merge, queue_results,
+                      run_case, simulate_case)
+from packing import CorePacker, run_packed
+from pipeline import BuildPipeline
+from samplers import RNG_MODES, SAMPLERS, case_rng, make_sampler, parse_shard
+from rta import INTERFERENCE
+from simulator import RUN_DURATION_SEC
+from delay_log import read_case_delay_ratios
+from run_summary import delay_and_miss, parse_duration, parse_summary
+from results_db import OK, ResultsDB
+from inflation import report as inflation_report
+from workqueue import ROLES, WorkQueue, apply_spec, default_worker_id
 
 # ---------- 解析工具 ----------
 
@@ -43,22 +58,7 @@ def parse_global_miss_rate(stdout_text: str):
 
 
 def read_delay_ratios(case_dir: Path):
-    vals = []
-    for p in case_dir.glob("task_*_delays.csv"):
-        try:
-            with p.open("r", newline="") as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    v = row.get("delay_ratio")
-                    if v is None:
-                        continue
-                    try:
-                        vals.append(float(v))
-                    except Exception:
-                        pass
-        except Exception:
-            pass
-    return vals
+    return read_case_delay_ratios(case_dir)
 
 
 def stat4(vals):
@@ -94,24 +94,127 @@ def main():
     ap.add_argument("--wcet-min", type=int, default=200)
     ap.add_argument("--wcet-max", type=int, default=500)
     ap.add_argument("--raf-max", type=int, default=200)
+    ap.add_argument("--util-range", type=float, nargs=2, default=None, metavar=("LO", "HI"),
+                    help="utilization-driven periods/WCETs: each case draws its target utilization uniformly "
+                         "from [LO, HI] (default: period = 10 * wcet)")
+    ap.add_argument("--util-scope", choices=("core", "total"), default="core",
+                    help="--util-range is per core (total = u * M) or the taskset total")
+    ap.add_argument("--util-method", choices=UTIL_METHODS, default="uunifast",
+                    help="utilization vector sampling (randfixedsum when the total is close to N)")
+    ap.add_argument("--period-range", type=int, nargs=2, default=None, metavar=("PMIN", "PMAX"),
+                    help="--util-range: log-uniform period range in us (default 10*wcet-min .. 10*wcet-max)")
+    ap.add_argument("--harmonic", action="store_true", help="--util-range: harmonic periods (PMIN * 2^k)")
+    ap.add_argument("--partition", choices=tuple(PARTITIONERS), default="rr",
+                    help="task-to-core assignment: rr = round-robin (i %% M); wfd / ffd / bfd = worst / first / "
+                         "best-fit decreasing by utilization; contention = spread tasks with contended shared "
+                         "fragments first, then wfd (per-core loads go to cores.csv)")
     ap.add_argument("--seed", type=int, default=12345)
     ap.add_argument("--decimals", type=int, default=2)
+    ap.add_argument("--sampler", choices=SAMPLERS, default="uniform",
+                    help="uniform = unbiased random cases; boundary = active learning near the miss-rate boundary")
+    ap.add_argument("--boundary-miss", type=float, default=1.0,
+                    help="boundary sampler: a case counts as unschedulable above this miss rate (%%)")
+    ap.add_argument("--sampler-batch", type=int, default=16, help="boundary sampler: refit every N results")
+    ap.add_argument("--sampler-warmup", type=int, default=32, help="boundary sampler: uniform cases before the first fit")
+    ap.add_argument("--sampler-explore", type=float, default=0.2,
+                    help="boundary sampler: fraction of cases still drawn uniformly")
+    ap.add_argument("--rng", choices=RNG_MODES, default="philox",
+                    help="philox = independent per-case stream keyed by (seed, case_id); "
+                         "legacy = one sequential random/np.random stream (reproduces older campaigns)")
+    ap.add_argument("--shard", type=str, default="0/1",
+                    help="i/n: only run the cases with case_id %% n == i (needs --rng philox)")
+    ap.add_argument("--queue", type=Path, default=None,
+                    help="shared work-queue directory for a multi-host campaign (needs --role)")
+    ap.add_argument("--role", choices=ROLES, default=None,
+                    help="coordinator = enqueue the cases, reclaim stale leases, merge the results; "
+                         "worker = claim and run cases (campaign options come from the queue)")
+    ap.add_argument("--worker-id", type=str, default=None, help="worker name (default <hostname>-<pid>)")
+    ap.add_argument("--lease-sec", type=float, default=600.0,
+                    help="a lease without heartbeat for this long is handed to another worker")
     ap.add_argument("--bins", type=int, default=0)
     ap.add_argument("--delay-range", type=float, nargs=2, default=None)
     ap.add_argument("--miss-range", type=float, nargs=2, default=None)
+    ap.add_argument("--cost-profile", type=Path, default=None,
+                    help="per-host fragment cost profile directory (calibrated on first use)")
+    ap.add_argument("--cost-stat", choices=STATS, default="mean")
+    ap.add_argument("--cost-state", choices=STATES, default="cold")
     ap.add_argument("--gcc", type=str, default="gcc")
     ap.add_argument("--compile-flags", type=str, default="-O2 -pthread -lm")
     ap.add_argument("--timeout", type=int, default=60)
     ap.add_argument("--out", type=Path, default=Path("out_tool4"))
-    ap.add_argument("--skip-if-done", action="store_true")
-    ap.add_argument("--linuxapi-path", type=Path, default=here / "LinuxAPI")
-    ap.add_argument("--tacle-path", type=Path, default=here / "Taclebench")
+    ap.add_argument("--db", type=Path, default=None,
+                    help="SQLite results store (default <out>/results.sqlite); cases.csv is exported from it")
+    ap.add_argument("--skip-if-done", action="store_true",
+                    help="resume: keep the results store and skip the cases it already holds")
+    ap.add_argument("--no-fraglib", action="store_true",
+                    help="recompile linuxAPI_lib.c / bench_lib.c for every case instead of linking a prebuilt library")
+    ap.add_argument("--build-cache", type=Path, default=None,
+                    help="content-addressed taskset.out cache directory (default <out>/build_cache)")
+    ap.add_argument("--no-build-cache", action="store_true")
+    ap.add_argument("--pipeline", action="store_true",
+                    help="compile case i+1 on the cores case i does not use while case i is measured")
+    ap.add_argument("--pack", action="store_true",
+                    help="run several cases at once on disjoint core partitions (TASKSET_CORE_BASE offset)")
+    ap.add_argument("--guard-cores", type=int, default=0,
+                    help="idle cores kept between neighbouring partitions with --pack")
+    ap.add_argument("--runner", action="store_true",
+                    help="use one prebuilt data-driven runner; cases only write taskset.txt")
+    ap.add_argument("--log-format", choices=("none", "bin", "csv"), default="none",
+                    help="per-job log format: none = no per-job logs (SUMMARY stats only), "
+                         "bin = task_*_delays.bin (read via np.memmap), csv = legacy text")
+    ap.add_argument("--no-stats", action="store_true",
+                    help="disable in-program streaming stats (SUMMARY line) and read the per-job logs instead")
+    ap.add_argument("--counters", action="store_true",
+                    help="per-task perf counters (cycles, instructions, LLC misses, context switches, page faults; "
+                         "getrusage fallback), stored in the task_counters table and exported to counters.csv")
+    ap.add_argument("--trace", type=int, default=0, metavar="EVENTS",
+                    help="per-fragment event trace: keep the last EVENTS fragment events per task (ring buffer), "
+                         "written as task_*_trace.bin plus taskset.json; convert with trace_export.py; 0 = off")
+    ap.add_argument("--fragment-stats", action="store_true",
+                    help="per-fragment call counts / time sums / histograms per task thread, stored in the "
+                         "fragment_stats table, plus inflation.csv (shared vs para_ variant by M and contention)")
+    ap.add_argument("--prune", choices=("off", "log", "skip", "sample"), default="off",
+                    help="response-time analysis (Generator/rta.py), a heuristic (modelled costs, FIFO locks): "
+                         "log = record predictions only; sample (recommended) = measure only a --prune-keep "
+                         "fraction of the cases predicted schedulable; skip = measure none of them (needs a "
+                         "conservative cost basis: --cost-profile with --cost-stat p99|max, or --prune-margin > 1); "
+                         "predicted vs measured goes to predictions.csv")
+    ap.add_argument("--prune-keep", type=float, default=0.1, help="--prune sample: fraction of schedulable cases still measured")
+    ap.add_argument("--prune-margin", type=float, default=1.0, help="analysis: scale factor on the fragment costs (safety margin)")
+    ap.add_argument("--interference", choices=INTERFERENCE, default="fifo",
+                    help="analysis interference model: fifo = what the runner does (equal priorities per core); "
+                         "fp = preemptive fixed priority by the taskset priorities")
+    ap.add_argument("--backend", choices=("hw", "sim"), default="hw",
+                    help="hw = build and measure on this host; sim = run the taskset in the discrete-event simulator "
+                         "(Generator/simulator.py): no sources, builds or runs, same results format")
+    ap.add_argument("--adaptive", action="store_true",
+                    help="stop each run once the 95%% CI of the delay mean and miss rate is narrow enough")
+    ap.add_argument("--min-duration", type=float, default=0.2, help="adaptive: minimum run length (s)")
+    ap.add_argument("--max-duration", type=float, default=None,
+                    help="run length (s), or its upper bound with --adaptive (default: generator3 RUN_DURATION_SEC)")
+    ap.add_argument("--ci-rel", type=float, default=0.01,
+                    help="adaptive: target CI half-width of the delay mean, relative to the mean")
+    ap.add_argument("--ci-miss", type=float, default=0.5,
+                    help="adaptive: target CI half-width of the miss rate, in percentage points")
+    ap.add_argument("--linuxapi-path", type=Path, default=here.parent / "LinuxAPI")
+    ap.add_argument("--tacle-path", type=Path, default=here.parent / "Taclebench")
     ap.add_argument("--linuxapi-c", type=str, default="linuxAPI_lib.c")
     ap.add_argument("--bench-c", type=str, default="bench_lib.c")
     ap.add_argument("--linuxapi-h", type=str, default="linuxAPI_lib.h")
     ap.add_argument("--bench-h", type=str, default="bench_lib.h")
 
     args = ap.parse_args()
+    if (args.queue is None) != (args.role is None):
+        ap.error("--queue and --role go together")
+    queue = None
+    if args.queue is not None:
+        queue = WorkQueue(args.queue, lease_sec=args.lease_sec)
+        if args.role == "worker":
+            # campaign options from the coordinator; own output directory and results store
+            apply_spec(args, queue.load_spec())
+            worker_id = args.worker_id or default_worker_id()
+            args.out = queue.workers / worker_id
+            args.skip_if_done = True
     out_root: Path = args.out
     out_root.mkdir(parents=True, exist_ok=True)
 
@@ -119,72 +222,199 @@ def main():
     M = args.M
     N = args.N if args.N is not None else M
 
+    try:
+        shard_idx, shard_cnt = parse_shard(args.shard)
+    except ValueError as e:
+        ap.error(str(e))
+    if (shard_cnt > 1 or queue is not None) and (args.rng != "philox" or args.sampler != "uniform"):
+        ap.error("--shard / --queue need --rng philox and --sampler uniform (cases must not depend on earlier cases)")
+    case_ids = [i for i in range(Ncases) if i % shard_cnt == shard_idx]
+
+    # legacy stream only; with --rng philox every case gets case_rng(seed, case_id)
     random.seed(args.seed)
     np.random.seed(args.seed)
+    sampler = make_sampler(args.sampler, M, args.N, args.decimals, seed=args.seed,
+                           boundary=args.boundary_miss, batch=args.sampler_batch,
+                           warmup=args.sampler_warmup, explore=args.sampler_explore)
+
+    include_dirs = [args.linuxapi_path.resolve(), args.tacle_path.resolve()]
+    check_options(ap, args)
+    render_opts = dict(log_format=args.log_format, stats=not args.no_stats, counters=args.counters,
+                       trace=args.trace, fragstats=args.fragment_stats)
+    period_range = args.period_range or (10 * args.wcet_min, 10 * args.wcet_max)
+    if args.util_range is not None:
+        lo, hi = args.util_range
+        if not 0 < lo <= hi:
+            ap.error("--util-range must satisfy 0 < LO <= HI")
+        if (hi * M if args.util_scope == "core" else hi) > N:
+            ap.error(f"--util-range: total utilization above N={N} (each task is at most 1)")
+        if not 0 < period_range[0] <= period_range[1]:
+            ap.error("--period-range must satisfy 0 < PMIN <= PMAX")
+
+    # run length of the generated programs: read from the environment, so every run
+    # (serial subprocess or packed Popen) inherits it
+    if args.max_duration is not None:
+        os.environ["TASKSET_MAX_SEC"] = str(args.max_duration)
+    if args.adaptive:
+        os.environ.update(TASKSET_CI_REL=str(args.ci_rel), TASKSET_CI_MISS=str(args.ci_miss),
+                          TASKSET_MIN_SEC=str(args.min_duration))
+    apply_costs(ap, args, include_dirs)
+
+    lib_sources = [(args.linuxapi_path / args.linuxapi_c).resolve(),
+                   (args.tacle_path / args.bench_c).resolve()]
+    if args.backend == "sim":
+        link_inputs = []   # nothing is compiled
+    elif args.no_fraglib:
+        link_inputs = lib_sources
+    else:
+        fraglib = build_fragment_lib(out_root, args.gcc, args.compile_flags, include_dirs, lib_sources)
+        if fraglib is None:
+            return
+        link_inputs = [fraglib]
+    build_cache = BuildCache(
+        None if args.no_build_cache else (args.build_cache or out_root / "build_cache"),
+        args.gcc, args.compile_flags, include_dirs, link_inputs
+    )
+
+    runner_exe = None
+    if args.runner:
+        runner_exe = build_runner(out_root, args.gcc, args.compile_flags, include_dirs, link_inputs, render_opts)
+        if runner_exe is None:
+            return
 
     cases_csv = out_root / "cases.csv"
     summary_csv = out_root / "summary.csv"
     hist_csv = out_root / "histograms.csv"
 
-    with open(cases_csv, "w", newline="") as f:
-        w = csv.writer(f)
-        w.writerow(["case_id", "M", "N", "Cr", "contention",
-                    "delay_mean", "miss_rate_percent", "misses", "jobs"])
+    if queue is not None and args.role == "coordinator":
+        enqueue_and_merge(queue, args, case_ids, args.db or out_root / "results.sqlite")
+        args.skip_if_done = True
+    elif queue is not None:
+        case_ids = queue.claims(worker_id)
+        print(f"[QUEUE] worker {worker_id} -> {out_root}")
+
+    # results store: a normal run starts it afresh, --skip-if-done resumes from it
+    db = ResultsDB(args.db or out_root / "results.sqlite", fresh=not args.skip_if_done)
+    # options that define the cases: a resumed store must have been written with the same ones
+    campaign = dict(seed=args.seed, sampler=args.sampler, M=M, N=N, rng=args.rng,
+                    util_range=args.util_range, util_scope=args.util_scope, util_method=args.util_method,
+                    period_range=list(period_range), harmonic=args.harmonic, partition=args.partition)
+    conflicts = db.meta_conflicts(defaults={"util_range": None, "util_scope": "core", "util_method": "uunifast",
+                                            "partition": "rr"}, **campaign)
+    if conflicts:
+        db.close()
+        ap.error("--skip-if-done: the results store was written with other options ("
+                 + "; ".join(f"{k}: stored {old}, now {new}" for k, old, new in conflicts) + ")")
+    db.set_meta(tool="benchmark_tool4", shard=args.shard, **campaign)
+    if queue is not None and args.role == "coordinator":
+        case_ids = queue_results(db, case_ids)
 
     per_case_delay_means = []
     per_case_miss_rates  = []
     sum_misses = 0
     sum_jobs   = 0
+    sum_duration = 0.0
+    n_cases = 0
+
+    # response-time analysis (--prune): pruned cases are not written, built or run
+    pruner = Pruner(db, args.prune, keep=args.prune_keep, margin=args.prune_margin,
+                    interference=args.interference, seed=args.seed)
 
-    for i in range(Ncases):
-        Cr = round(random.random(), args.decimals)
-        cont = round(random.random(), args.decimals)
+    # --backend sim: simulated output of the prepared cases, consumed by the measurement loop
+    sim_out = {}
+
+    def skipped(i):
+        return db.is_done(i) or i in pruner
+
+    def case_util(i, M):
+        """Target utilization of case i (--util-range) and the taskset total; (None, None) without it."""
+        if args.util_range is None:
+            return None, None
+        # own stream: the case's Cr/contention/taskset draws stay those of a run without --util-range
+        util = round(float(case_rng(args.seed, i, stream=2).uniform(*args.util_range)), args.decimals)
+        return util, util * M if args.util_scope == "core" else util
+
+    def prepare_case(i):
+        # legacy stream: draws happen in case order, so prefetching case i+1 keeps it unchanged
+        rng = case_rng(args.seed, i) if args.rng == "philox" else None
+        _, _, Cr, cont = sampler.propose(rng)
 
         case_dir = out_root / f"case_{i:03d}"
         c_path = case_dir / "generated_taskset.c"
 
-        case_dir.mkdir(parents=True, exist_ok=True)
+        t0 = time.monotonic()
+        # legacy stream: generated even when resuming, so later cases see the same draws
+        if db.is_done(i) and rng is not None:
+            return Cr, cont, case_dir
+        util, U = case_util(i, M)
+        timing = None
+        if U is not None:
+            wcets, periods = generate_utilization_timing(N, U, 1, args.util_method, *period_range,
+                                                         harmonic=args.harmonic, rng=rng)
+            timing = (wcets[0].tolist(), periods[0].tolist())
         taskset = generate_taskset(
             M=M, N=N,
             wcet_min=args.wcet_min, wcet_max=args.wcet_max,
             Cr=Cr, RaF_max=args.raf_max, FN=args.fn,
-            contention=cont
+            contention=cont, rng=rng, timing=timing, partition=args.partition
         )
-        generate_c_file(taskset, str(c_path))
-
-        cmd = (
-            f'{args.gcc} {args.compile_flags} '
-            f'-I"{args.linuxapi_path}" -I"{args.tacle_path}" '
-            f'generated_taskset.c '
-            f'"{args.linuxapi_path / args.linuxapi_c}" "{args.tacle_path / args.bench_c}" '
-            f'-o taskset.out'
-        )
-        comp = subprocess.run(cmd, shell=True, cwd=str(case_dir),
-                              stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
-        if comp.returncode != 0:
+        if db.is_done(i):
+            return Cr, cont, case_dir
+        db.add_case(i, M, N, Cr, cont, util=util, partition=args.partition)
+        db.add_core_loads(i, 0, core_loads(taskset))
+        if pruner.predict(i, taskset):
+            return Cr, cont, case_dir
+        if args.backend == "sim":
+            sim_out[i] = simulate_case(db, i, taskset, args.max_duration or RUN_DURATION_SEC)
+            return Cr, cont, case_dir
+        case_dir.mkdir(parents=True, exist_ok=True)
+        if args.runner:
+            generate_taskset_spec(taskset, str(case_dir / "taskset.txt"))
+        else:
+            generate_c_file(taskset, str(c_path), **render_opts)
+        if args.trace:
+            generate_taskset_json(taskset, str(case_dir / "taskset.json"))
+        db.add_stage(i, 0, "generate", time.monotonic() - t0)
+        return Cr, cont, case_dir
+
+    def finish_case(i, Cr, cont, case_dir, stdout_text):
+        # stdout_text is None when the build or the run failed
+        nonlocal sum_misses, sum_jobs, sum_duration, n_cases
+        if i in pruner:
+            # proven schedulable: not measured, the sampler sees the prediction (no misses)
+            sampler.observe(M, Cr, cont, 0.0)
+            if queue is not None and args.role == "worker":
+                db.flush()
+                queue.complete(i)
+            print(f"[CASE {i:03d}] Cr={Cr:.{args.decimals}f} cont={cont:.{args.decimals}f} pruned (schedulable by analysis)")
+            return
+        n_cases += 1
+        summ = parse_summary(stdout_text)
+        duration = parse_duration(stdout_text)
+        if db.is_done(i):
+            # resumed: measured by an earlier invocation
+            dmean, miss_rate, misses, jobs, duration = db.get_run(i)
+        elif stdout_text is None:
             dmean, miss_rate, misses, jobs = float("nan"), float("nan"), 0, 0
+        elif summ is not None:
+            dmean, miss_rate, misses, jobs = delay_and_miss(summ)
         else:
-            try:
-                runp = subprocess.run(["./taskset.out"], cwd=str(case_dir),
-                                      stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
-                                      text=True, timeout=args.timeout)
-            except subprocess.TimeoutExpired:
-                dmean, miss_rate, misses, jobs = float("nan"), float("nan"), 0, 0
-            else:
-                with open(case_dir / "run_log.txt", "w") as lf:
-                    lf.write(runp.stdout)
-                dvals = read_delay_ratios(case_dir)
-                dmean = (sum(dvals) / len(dvals)) if dvals else float("nan")
-                miss_rate, misses, jobs = parse_global_miss_rate(runp.stdout)
-                if miss_rate is None:
-                    miss_rate, misses, jobs = float("nan"), 0, 0
-
-        with open(cases_csv, "a", newline="") as f:
-            w = csv.writer(f)
-            w.writerow([i, M, N, f"{Cr:.{args.decimals}f}", f"{cont:.{args.decimals}f}",
-                        ("" if math.isnan(dmean) else f"{dmean:.9f}"),
-                        ("" if (isinstance(miss_rate, float) and math.isnan(miss_rate)) else f"{miss_rate:.9f}"),
-                        misses, jobs])
+            dvals = read_delay_ratios(case_dir)
+            dmean = float(dvals.mean()) if dvals.size else float("nan")
+            miss_rate, misses, jobs = parse_global_miss_rate(stdout_text)
+            if miss_rate is None:
+                miss_rate, misses, jobs = float("nan"), 0, 0
+
+        if not db.is_done(i):
+            db.add_run(i, 0, OK if stdout_text is not None else "failed",
+                       dmean, miss_rate, misses, jobs, duration,
+                       stop=summ.get("stop") if summ else None, case_dir=case_dir, summary=summ)
+
+        sampler.observe(M, Cr, cont, miss_rate)
+        if queue is not None and args.role == "worker":
+            # the result must be in the store before the case leaves the queue
+            db.flush()
+            queue.complete(i)
 
         if not math.isnan(dmean):
             per_case_delay_means.append(dmean)
@@ -192,24 +422,110 @@ def main():
             per_case_miss_rates.append(miss_rate)
         sum_misses += (misses or 0)
         sum_jobs   += (jobs or 0)
+        sum_duration += (duration or 0.0)
 
         print(f"[CASE {i:03d}] Cr={Cr:.{args.decimals}f} cont={cont:.{args.decimals}f} "
               f"delay_mean={(f'{dmean:.6f}' if not math.isnan(dmean) else 'NaN')}  "
-              f"miss_mean={(f'{miss_rate:.6f}%' if not (isinstance(miss_rate, float) and math.isnan(miss_rate)) else 'NaN')}")
+              f"miss_mean={(f'{miss_rate:.6f}%' if not (isinstance(miss_rate, float) and math.isnan(miss_rate)) else 'NaN')}"
+              f"{(f'  duration={duration:.2f}s' if duration is not None else '')}")
+
+    pipeline = BuildPipeline(build_cache) if (args.pipeline and not args.runner and not args.pack) else None
+
+    if args.pack:
+        # several cases at once, each on its own block of M cores
+        packer = CorePacker(guard=args.guard_cores)
+        print(f"[PACK] cpus={len(packer.cpus)} guard={packer.guard}")
+        pending_info = {}
+
+        def packed_jobs():
+            for i in case_ids:
+                Cr, cont, case_dir = prepare_case(i)
+                if skipped(i):
+                    finish_case(i, Cr, cont, case_dir, None)
+                    continue
+                if args.runner:
+                    run_cmd = [str(runner_exe), "taskset.txt"]
+                else:
+                    run_cmd = ["./taskset.out"]
+                    # build only on CPUs no partition is using right now
+                    if not build_case(db, build_cache, i, case_dir, cpus=packer.free_cpus() or None):
+                        finish_case(i, Cr, cont, case_dir, None)
+                        continue
+                pending_info[i] = (Cr, cont, case_dir)
+                yield i, M, run_cmd, case_dir
+
+        for i, part, rc in run_packed(packed_jobs(), packer, args.timeout):
+            Cr, cont, case_dir = pending_info.pop(i)
+            stdout_text = (case_dir / "run_log.txt").read_text() if rc == 0 else None
+            finish_case(i, Cr, cont, case_dir, stdout_text)
+    else:
+        ids = iter(case_ids)
+        nxt_id = next(ids, None)
+        nxt = prepare_case(nxt_id) if nxt_id is not None else None
+
+        while nxt is not None:
+            i = nxt_id
+            Cr, cont, case_dir = nxt
+            nxt_id = next(ids, None)
+            nxt = prepare_case(nxt_id) if nxt_id is not None else None
+            if skipped(i):
+                finish_case(i, Cr, cont, case_dir, None)
+                continue
+            if i in sim_out:
+                finish_case(i, Cr, cont, case_dir, sim_out.pop(i))
+                continue
+            if args.runner:
+                run_cmd = [str(runner_exe), "taskset.txt"]
+                build_ok = True
+            else:
+                run_cmd = ["./taskset.out"]
+                build_ok = build_case(db, build_cache, i, case_dir, pipeline=pipeline)
+                if pipeline is not None:
+                    pipeline.prefetch(nxt[2] if nxt and not skipped(nxt_id) else None, range(M))
+            if not build_ok:
+                finish_case(i, Cr, cont, case_dir, None)
+                continue
+            finish_case(i, Cr, cont, case_dir, run_case(db, i, run_cmd, case_dir, args.timeout))
+
+    # cases.csv is an export of the cases_csv view
+    db.export_csv("cases_csv", cases_csv, formats={
+        "Cr": f".{args.decimals}f", "contention": f".{args.decimals}f",
+        "core_util_max": ".4f", "delay_mean": ".9f", "miss_rate_percent": ".9f", "duration_s": ".3f"})
+    if args.counters:
+        db.export_csv("counters_csv", out_root / "counters.csv", formats={
+            "Cr": f".{args.decimals}f", "contention": f".{args.decimals}f",
+            "delay_mean": ".9f", "miss_rate_percent": ".9f"})
+    pruner.export(out_root, args.decimals)
+    db.export_csv("cores_csv", out_root / "cores.csv", formats={
+        "Cr": f".{args.decimals}f", "contention": f".{args.decimals}f", "core_util": ".4f",
+        "shared_util": ".4f", "delay_mean": ".9f", "miss_rate_percent": ".9f"})
+    umax_mean, umax_max, n_over, n_cores = db.query(
+        "SELECT AVG(c.core_util_max), MAX(c.core_util_max), "
+        "(SELECT COUNT(*) FROM core_loads WHERE run_idx = 0 AND util > 1.0), "
+        "(SELECT COUNT(*) FROM core_loads WHERE run_idx = 0) FROM cases_csv c")[0]
+    if umax_max is not None:   # no measured case (all pruned or failed): nothing to report
+        print(f"[PARTITION] {args.partition}: max core utilization mean={umax_mean:.3f} max={umax_max:.3f}, "
+              f"overloaded cores={n_over}/{n_cores}")
+    db.close()
+    if args.fragment_stats:
+        # random contention: grouped into 10 bins
+        inflation_report(db.path, out_root / "inflation.csv", cont_bins=10)
+    if queue is not None:
+        queue.close()
 
     delay_stats = stat4(per_case_delay_means)
     miss_stats  = stat4(per_case_miss_rates)
 
     with open(summary_csv, "w", newline="") as f:
         w = csv.writer(f)
-        w.writerow(["cases", "M", "N", "seed",
+        w.writerow(["cases", "M", "N", "seed", "sampler",
                     "delay_mean_mean", "delay_mean_std", "delay_mean_min", "delay_mean_max",
                     "miss_mean", "miss_std", "miss_min", "miss_max",
-                    "sum_misses", "sum_jobs"])
-        w.writerow([Ncases, M, N, args.seed,
+                    "sum_misses", "sum_jobs", "sum_duration_s", "rng", "shard", "pruned"])
+        w.writerow([n_cases, M, N, args.seed, args.sampler,
                     *format4(delay_stats),
                     *format4(miss_stats),
-                    sum_misses, sum_jobs])
+                    sum_misses, sum_jobs, f"{sum_duration:.3f}", args.rng, args.shard, len(pruner.pruned)])
 
     # -------- 输出直方图数据 --------
     def histogram_data(values, bins_arg, range_arg):
@@ -238,9 +554,22 @@ def main():
                 w.writerow(["miss_rate", f"{miss_edges[j]:.9f}", f"{miss_edges[j+1]:.9f}", int(miss_counts[j])])
 
     print(f"\n[OUTPUT]")
+    print(f"Results store  : {db.path.resolve()}")
     print(f"Per-case table : {cases_csv.resolve()}")
+    print(f"Per-core loads : {(out_root / 'cores.csv').resolve()}")
     print(f"Summary table  : {summary_csv.resolve()}")
     print(f"Histograms CSV : {hist_csv.resolve()}")
+    if args.counters:
+        print(f"Counters table : {(out_root / 'counters.csv').resolve()}")
+    if args.fragment_stats:
+        print(f"Inflation      : {(out_root / 'inflation.csv').resolve()}")
+    if args.prune != "off":
+        print(f"Predictions    : {(out_root / 'predictions.csv').resolve()}")
+    if args.backend == "hw":
+        build_cache.report()
+    if pipeline is not None:
+        pipeline.close()
+        pipeline.report()
 
 
 if __name__ == "__main__":
@@ -12,7 +12,8 @@ benchmark_tool4 (no-plot, M randomized per case)
   * 流程：generator3 -> 编译 -> 运行 -> 读取 delay_mean & Global miss rate
 
 - 输出：
-  * cases.csv    ：每个用例一行（case_id, M, N, Cr, contention, delay_mean, miss_rate_percent, misses, jobs）
+  * results.sqlite：结果库（cases / runs / task_stats / stage_times），--skip-if-done 据此续跑
+  * cases.csv    ：每个用例一行（由结果库的 cases_csv 视图导出）（case_id, M, N, Cr, contention, util, delay_mean, miss_rate_percent, misses, jobs）
   * summary.csv  ：整体统计（delay/miss 的均值/方差/极值，misses/jobs 总计，以及 M/N 的 min/max）
   * histograms.csv：两个直方图的 bin 与计数（不画图；可用 --bins / --delay-range / --miss-range 控制）
 """
@@ -23,13 +24,28 @@ import math
 import os
 import random
 import re
-import subprocess
+import time
 from pathlib import Path
 
 import numpy as np
 
 # 使用 generator3 的同类型生成方案
-from generator3 import generate_taskset, generate_c_file
+from generator3 import generate_taskset, generate_c_file, generate_taskset_spec, generate_taskset_json
+from generator3 import PARTITIONERS, UTIL_METHODS, core_loads, generate_utilization_timing
+from calibration import STATES, STATS
+from build_support import BuildCache, build_fragment_lib, build_runner
+from campaign import (Pruner, apply_costs, build_case, check_options, enqueue_and_merge, queue_results,
+                      run_case, simulate_case)
+from packing import CorePacker, run_packed
+from pipeline import BuildPipeline
+from samplers import RNG_MODES, SAMPLERS, case_rng, make_sampler, parse_shard
+from rta import INTERFERENCE
+from simulator import RUN_DURATION_SEC
+from delay_log import read_case_delay_ratios
+from run_summary import delay_and_miss, parse_duration, parse_summary
+from results_db import OK, ResultsDB
+from inflation import report as inflation_report
+from workqueue import ROLES, WorkQueue, apply_spec, default_worker_id
 
 # ---------- 解析工具 ----------
 
@@ -51,23 +67,8 @@ def parse_global_miss_rate(stdout_text: str):
 
 
 def read_delay_ratios(case_dir: Path):
-    """读取该用例目录下所有 task_*_delays.csv 的 delay_ratio 列，返回聚合数组。"""
-    vals = []
-    for p in case_dir.glob("task_*_delays.csv"):
-        try:
-            with p.open("r", newline="") as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    v = row.get("delay_ratio")
-                    if v is None:
-                        continue
-                    try:
-                        vals.append(float(v))
-                    except Exception:
-                        pass
-        except Exception:
-            pass
-    return vals
+    """读取该用例目录下所有 task_*_delays.bin（或 .csv）的 delay_ratio，返回聚合数组。"""
+    return read_case_delay_ratios(case_dir)
 
 
 def stat4(vals):
@@ -108,9 +109,40 @@ def main():
     ap.add_argument("--wcet-min", type=int, default=200)
     ap.add_argument("--wcet-max", type=int, default=500)
     ap.add_argument("--raf-max", type=int, default=200)
+    ap.add_argument("--util-range", type=float, nargs=2, default=None, metavar=("LO", "HI"),
+                    help="按利用率生成周期/WCET：每个用例的目标利用率在 [LO, HI] 内均匀抽取（默认 period = 10 * wcet）")
+    ap.add_argument("--util-scope", choices=("core", "total"), default="core",
+                    help="--util-range 的含义：每核利用率（总利用率 = u * M）或任务集总利用率")
+    ap.add_argument("--util-method", choices=UTIL_METHODS, default="uunifast",
+                    help="利用率向量的抽样方法（总利用率接近 N 时用 randfixedsum）")
+    ap.add_argument("--period-range", type=int, nargs=2, default=None, metavar=("PMIN", "PMAX"),
+                    help="--util-range：周期范围（us，对数均匀；默认 10*wcet-min .. 10*wcet-max）")
+    ap.add_argument("--harmonic", action="store_true", help="--util-range：谐波周期（PMIN * 2^k）")
+    ap.add_argument("--partition", choices=tuple(PARTITIONERS), default="rr",
+                    help="任务到核的分配：rr=轮转（i %% M）；wfd/ffd/bfd=按利用率降序的 worst/first/best-fit；"
+                         "contention=先分散有竞争共享片段的任务，再 wfd（每核负载见 cores.csv）")
     ap.add_argument("--seed", type=int, default=12345)
     ap.add_argument("--decimals", type=int, default=2,
                     help="Cr/Contention 小数位（默认 2）")
+    ap.add_argument("--sampler", choices=SAMPLERS, default="uniform",
+                    help="用例采样：uniform=均匀随机（统计无偏）；boundary=主动学习，集中在 miss 率边界附近")
+    ap.add_argument("--boundary-miss", type=float, default=1.0,
+                    help="boundary 采样：miss 率（%%）超过该值视为不可调度")
+    ap.add_argument("--sampler-batch", type=int, default=16, help="boundary 采样：每 N 个结果重新拟合一次代理模型")
+    ap.add_argument("--sampler-warmup", type=int, default=32, help="boundary 采样：首次拟合前的均匀用例数")
+    ap.add_argument("--sampler-explore", type=float, default=0.2, help="boundary 采样：仍按均匀分布抽取的比例")
+    ap.add_argument("--rng", choices=RNG_MODES, default="philox",
+                    help="philox=每个用例独立的随机流（由 (seed, case_id) 决定）；"
+                         "legacy=整个 campaign 共用一个顺序随机流（复现旧结果）")
+    ap.add_argument("--shard", type=str, default="0/1",
+                    help="i/n：只运行 case_id %% n == i 的用例（需 --rng philox），各分片合起来与串行运行完全一致")
+
+    # 多主机：基于共享目录的工作队列
+    ap.add_argument("--queue", type=Path, default=None, help="共享工作队列目录（多主机 campaign，需配合 --role）")
+    ap.add_argument("--role", choices=ROLES, default=None,
+                    help="coordinator=写入用例队列、回收过期租约、合并结果；worker=领取并运行用例（campaign 参数取自队列）")
+    ap.add_argument("--worker-id", type=str, default=None, help="worker 名称（默认 <主机名>-<pid>）")
+    ap.add_argument("--lease-sec", type=float, default=600.0, help="租约超过该秒数无心跳即交给其他 worker")
 
     # 直方图数据（不画图）
     ap.add_argument("--bins", type=int, default=0,
@@ -121,132 +153,320 @@ def main():
                     help="miss_rate 直方图数值范围，例如: --miss-range 0 100")
 
     # 构建与运行
+    ap.add_argument("--cost-profile", type=Path, default=None,
+                    help="主机片段 cost profile 目录（按主机指纹缓存，缺失时先自动标定）")
+    ap.add_argument("--cost-stat", choices=STATS, default="mean", help="profile 中使用的统计量")
+    ap.add_argument("--cost-state", choices=STATES, default="cold", help="冷态/热态 cost")
     ap.add_argument("--gcc", type=str, default="gcc")
     ap.add_argument("--compile-flags", type=str, default="-O2 -pthread -lm")
     ap.add_argument("--timeout", type=int, default=60)
     ap.add_argument("--out", type=Path, default=Path("out_tool4"))
+    ap.add_argument("--db", type=Path, default=None,
+                    help="SQLite 结果库（默认 <out>/results.sqlite）；cases.csv 由其导出")
     ap.add_argument("--skip-if-done", action="store_true",
-                    help="若该用例目录已有 taskset.out 且已运行，尝试跳过（简单跳过，不做严格校验）")
+                    help="断点续跑：保留结果库，跳过库中已成功完成的用例")
+    ap.add_argument("--no-fraglib", action="store_true",
+                    help="不使用预编译片段库，每个用例重新编译 linuxAPI_lib.c / bench_lib.c")
+    ap.add_argument("--build-cache", type=Path, default=None,
+                    help="taskset.out 内容寻址缓存目录（默认 <out>/build_cache）")
+    ap.add_argument("--no-build-cache", action="store_true", help="禁用 taskset.out 构建缓存")
+    ap.add_argument("--pipeline", action="store_true",
+                    help="流水线模式：测量用例 i 时在其未占用的核上编译用例 i+1")
+    ap.add_argument("--pack", action="store_true",
+                    help="并发执行：多个用例同时运行在互不相交的核分区上（TASKSET_CORE_BASE 偏移）")
+    ap.add_argument("--guard-cores", type=int, default=0,
+                    help="--pack 时相邻分区之间保留的空闲核数")
+    ap.add_argument("--runner", action="store_true",
+                    help="使用预编译的数据驱动 runner：每个用例只写 taskset.txt，不再逐个编译")
+    ap.add_argument("--log-format", choices=("none", "bin", "csv"), default="none",
+                    help="逐作业日志格式：none=不记录（只用 SUMMARY 在线统计），"
+                         "bin=task_*_delays.bin（np.memmap 读取），csv=旧的文本格式")
+    ap.add_argument("--no-stats", action="store_true",
+                    help="关闭程序内在线统计（SUMMARY 行），改为读取逐作业日志")
+    ap.add_argument("--counters", action="store_true",
+                    help="每个任务线程采集 perf 计数（cycles/instructions/LLC miss/上下文切换/缺页，"
+                         "perf 不可用时退回 getrusage），存入结果库 task_counters 并导出 counters.csv")
+    ap.add_argument("--trace", type=int, default=0, metavar="EVENTS",
+                    help="片段级事件跟踪：每个任务保留最近 EVENTS 个片段事件（环形缓冲区），写出 task_*_trace.bin 与 "
+                         "taskset.json，用 trace_export.py 转成 Chrome trace JSON；0 = 关闭")
+    ap.add_argument("--fragment-stats", action="store_true",
+                    help="每个任务线程按片段统计调用次数/耗时/直方图，存入结果库 fragment_stats，"
+                         "并输出共享与 para_ 变体的膨胀系数报告 inflation.csv（按 M 与 contention 分组）")
+    ap.add_argument("--prune", choices=("off", "log", "skip", "sample"), default="off",
+                    help="响应时间分析（Generator/rta.py，启发式：模型 cost、FIFO 锁）：log=只记录预测；"
+                         "sample（推荐）=预测可调度的用例只按 --prune-keep 比例抽样测量；skip=这类用例全部不测量"
+                         "（需要保守的 cost：--cost-profile 配 --cost-stat p99|max，或 --prune-margin > 1）；"
+                         "预测与实测导出到 predictions.csv")
+    ap.add_argument("--prune-keep", type=float, default=0.1, help="--prune sample：可调度用例仍测量的比例")
+    ap.add_argument("--prune-margin", type=float, default=1.0, help="分析时片段 cost 的放大系数（安全裕量）")
+    ap.add_argument("--interference", choices=INTERFERENCE, default="fifo",
+                    help="分析的干扰模型：fifo=runner 实际调度（同核任务同优先级）；fp=按 priority 的抢占式固定优先级")
+    ap.add_argument("--backend", choices=("hw", "sim"), default="hw",
+                    help="sim：在离散事件仿真器（Generator/simulator.py）中执行任务集，不生成源码、不编译、不运行，"
+                         "结果格式与实际运行相同；hw：编译并在本机测量")
+    ap.add_argument("--adaptive", action="store_true",
+                    help="自适应运行时长：delay 均值与 miss 率的 95%% 置信区间足够窄时提前停止")
+    ap.add_argument("--min-duration", type=float, default=0.2, help="自适应：最短运行时长（秒）")
+    ap.add_argument("--max-duration", type=float, default=None,
+                    help="运行时长（秒）；--adaptive 时为上限（默认 generator3 的 RUN_DURATION_SEC）")
+    ap.add_argument("--ci-rel", type=float, default=0.01, help="自适应：delay 均值置信区间半宽（相对均值）")
+    ap.add_argument("--ci-miss", type=float, default=0.5, help="自适应：miss 率置信区间半宽（百分点）")
 
     # 头文件/库路径
-    ap.add_argument("--linuxapi-path", type=Path, default=here / "LinuxAPI")
-    ap.add_argument("--tacle-path",   type=Path, default=here / "Taclebench")
+    ap.add_argument("--linuxapi-path", type=Path, default=here.parent / "LinuxAPI")
+    ap.add_argument("--tacle-path",   type=Path, default=here.parent / "Taclebench")
     ap.add_argument("--linuxapi-c", type=str, default="linuxAPI_lib.c")
     ap.add_argument("--bench-c",    type=str, default="bench_lib.c")
     ap.add_argument("--linuxapi-h", type=str, default="linuxAPI_lib.h")
     ap.add_argument("--bench-h",    type=str, default="bench_lib.h")
 
     args = ap.parse_args()
+    if (args.queue is None) != (args.role is None):
+        ap.error("--queue and --role go together")
+    queue = None
+    if args.queue is not None:
+        queue = WorkQueue(args.queue, lease_sec=args.lease_sec)
+        if args.role == "worker":
+            # campaign options from the coordinator; own output directory and results store
+            apply_spec(args, queue.load_spec())
+            worker_id = args.worker_id or default_worker_id()
+            args.out = queue.workers / worker_id
+            args.skip_if_done = True
 
     out_root: Path = args.out
     out_root.mkdir(parents=True, exist_ok=True)
 
     Ncases = args.tasks
 
+    try:
+        shard_idx, shard_cnt = parse_shard(args.shard)
+    except ValueError as e:
+        ap.error(str(e))
+    if (shard_cnt > 1 or queue is not None) and (args.rng != "philox" or args.sampler != "uniform"):
+        ap.error("--shard / --queue need --rng philox and --sampler uniform (cases must not depend on earlier cases)")
+    case_ids = [i for i in range(Ncases) if i % shard_cnt == shard_idx]
+
+    # legacy stream only; with --rng philox every case gets case_rng(seed, case_id)
     random.seed(args.seed)
     np.random.seed(args.seed)
+    # M ∈ [1, args.M]；uniform 采样与原先逐用例抽取的随机流一致
+    sampler = make_sampler(args.sampler, (1, args.M), args.N, args.decimals, seed=args.seed,
+                           boundary=args.boundary_miss, batch=args.sampler_batch,
+                           warmup=args.sampler_warmup, explore=args.sampler_explore)
+
+    # 片段库：整个 campaign 只编译一次，各用例直接链接
+    include_dirs = [args.linuxapi_path.resolve(), args.tacle_path.resolve()]
+    # 选项组合与片段库源码（编译与标定都需要，缺失时尽早报错）
+    check_options(ap, args)
+    render_opts = dict(log_format=args.log_format, stats=not args.no_stats, counters=args.counters,
+                       trace=args.trace, fragstats=args.fragment_stats)
+    period_range = args.period_range or (10 * args.wcet_min, 10 * args.wcet_max)
+    if args.util_range is not None:
+        lo, hi = args.util_range
+        if not 0 < lo <= hi:
+            ap.error("--util-range must satisfy 0 < LO <= HI")
+        # 最坏情况：每核利用率配最大的 M，总利用率配最小的 N（N 跟随 M 时为 1）
+        if args.util_scope == "core" and hi * (args.M if args.N is not None else 1) > (args.N or 1):
+            ap.error("--util-range: total utilization above N (each task is at most 1)")
+        if args.util_scope == "total" and hi > (args.N or 1):
+            ap.error("--util-range: total utilization above N (each task is at most 1; N follows M down to 1)")
+        if not 0 < period_range[0] <= period_range[1]:
+            ap.error("--period-range must satisfy 0 < PMIN <= PMAX")
+
+    # run length of the generated programs: read from the environment, so every run
+    # (serial subprocess or packed Popen) inherits it
+    if args.max_duration is not None:
+        os.environ["TASKSET_MAX_SEC"] = str(args.max_duration)
+    if args.adaptive:
+        os.environ.update(TASKSET_CI_REL=str(args.ci_rel), TASKSET_CI_MISS=str(args.ci_miss),
+                          TASKSET_MIN_SEC=str(args.min_duration))
+
+    # 主机标定的片段 cost（仅在主机指纹变化时重新测量）
+    apply_costs(ap, args, include_dirs)
+
+    lib_sources = [(args.linuxapi_path / args.linuxapi_c).resolve(),
+                   (args.tacle_path / args.bench_c).resolve()]
+    if args.backend == "sim":
+        link_inputs = []   # 仿真不编译任何程序
+    elif args.no_fraglib:
+        link_inputs = lib_sources
+    else:
+        fraglib = build_fragment_lib(out_root, args.gcc, args.compile_flags, include_dirs, lib_sources)
+        if fraglib is None:
+            return
+        link_inputs = [fraglib]
+    build_cache = BuildCache(
+        None if args.no_build_cache else (args.build_cache or out_root / "build_cache"),
+        args.gcc, args.compile_flags, include_dirs, link_inputs
+    )
+
+    # 数据驱动 runner：整个 campaign 只编译一次
+    runner_exe = None
+    if args.runner:
+        runner_exe = build_runner(out_root, args.gcc, args.compile_flags, include_dirs, link_inputs, render_opts)
+        if runner_exe is None:
+            return
 
     cases_csv   = out_root / "cases.csv"
     summary_csv = out_root / "summary.csv"
     hist_csv    = out_root / "histograms.csv"
 
-    # cases 表头
-    with open(cases_csv, "w", newline="") as f:
-        w = csv.writer(f)
-        w.writerow(["case_id", "M", "N", "Cr", "contention",
-                    "delay_mean", "miss_rate_percent", "misses", "jobs"])
+    if queue is not None and args.role == "coordinator":
+        # 测量由各 worker 完成；coordinator 合并其结果库后只做汇总（worker 失败的用例只报告、不重跑）
+        enqueue_and_merge(queue, args, case_ids, args.db or out_root / "results.sqlite")
+        args.skip_if_done = True
+    elif queue is not None:
+        case_ids = queue.claims(worker_id)   # 惰性领取：每次取一个用例
+        print(f"[QUEUE] worker {worker_id} -> {out_root}")
+
+    # 结果库：正常运行时清空重建，--skip-if-done 时保留并续跑
+    db = ResultsDB(args.db or out_root / "results.sqlite", fresh=not args.skip_if_done)
+    # 决定用例内容的参数：续跑时结果库必须由相同参数写入
+    campaign = dict(seed=args.seed, sampler=args.sampler, M_max=args.M, N=args.N, rng=args.rng,
+                    util_range=args.util_range, util_scope=args.util_scope, util_method=args.util_method,
+                    period_range=list(period_range), harmonic=args.harmonic, partition=args.partition)
+    conflicts = db.meta_conflicts(defaults={"util_range": None, "util_scope": "core", "util_method": "uunifast",
+                                            "partition": "rr"}, **campaign)
+    if conflicts:
+        db.close()
+        ap.error("--skip-if-done: the results store was written with other options ("
+                 + "; ".join(f"{k}: stored {old}, now {new}" for k, old, new in conflicts) + ")")
+    db.set_meta(tool="benchmark_tool5", shard=args.shard, **campaign)
+    if queue is not None and args.role == "coordinator":
+        # 只汇总：worker 未成功测量的用例只报告，不在本机重新测量
+        case_ids = queue_results(db, case_ids)
 
     per_case_delay_means = []
     per_case_miss_rates  = []
     sum_misses = 0
     sum_jobs   = 0
+    sum_duration = 0.0
+    n_cases = 0
 
     Ms_used = []
     Ns_used = []
 
-    for i in range(Ncases):
-        # —— 本用例的随机 M/N ——
-        M_i = random.randint(1, args.M)
-        N_i = args.N if args.N is not None else M_i
+    # 响应时间分析（--prune）：被剪枝的用例不生成文件、不编译、不运行
+    pruner = Pruner(db, args.prune, keep=args.prune_keep, margin=args.prune_margin,
+                    interference=args.interference, seed=args.seed)
 
-        Ms_used.append(M_i)
-        Ns_used.append(N_i)
+    # --backend sim：已准备用例的仿真输出，由测量循环取用
+    sim_out = {}
+
+    def skipped(i):
+        return db.is_done(i) or i in pruner
+
+    def case_util(i, M_i):
+        """用例 i 的目标利用率（--util-range）与总利用率；未设置时为 (None, None)。"""
+        if args.util_range is None:
+            return None, None
+        # 独立随机流：不改变本用例 Cr/contention/任务集的抽样
+        util = round(float(case_rng(args.seed, i, stream=2).uniform(*args.util_range)), args.decimals)
+        return util, util * M_i if args.util_scope == "core" else util
 
-        # —— 随机 Cr / contention ——
-        Cr   = round(random.random(), args.decimals)
-        cont = round(random.random(), args.decimals)
+    def prepare_case(i):
+        """抽取用例 i 的参数并生成源码；按用例顺序调用，随机流与逐个生成完全一致。"""
+        # —— 本用例的 M/N/Cr/contention（由采样器给出）——
+        rng = case_rng(args.seed, i) if args.rng == "philox" else None
+        M_i, N_i, Cr, cont = sampler.propose(rng)
 
         # —— 目录与 C 文件路径 ——
         case_dir = out_root / f"case_{i:05d}"
         c_path   = case_dir / "generated_taskset.c"
-        case_dir.mkdir(parents=True, exist_ok=True)
 
-        # —— 生成任务集 & C 文件 ——
-        taskset = generate_taskset(
-            M=M_i, N=N_i,
-            wcet_min=args.wcet_min, wcet_max=args.wcet_max,
-            Cr=Cr, RaF_max=args.raf_max, FN=args.fn,
-            contention=cont
-        )
-        generate_c_file(taskset, str(c_path))
-
-        # —— 编译 ——（可选跳过）
-        exe_path = case_dir / "taskset.out"
-        need_build = True
-        if args.skip_if_done and exe_path.exists():
-            # 简单跳过策略：若存在输出文件且有 run_log 就当完成（你可按需增强）
-            need_build = False
-
-        if need_build:
-            cmd = (
-                f'{args.gcc} {args.compile_flags} '
-                f'-I"{args.linuxapi_path}" -I"{args.tacle_path}" '
-                f'generated_taskset.c '
-                f'"{args.linuxapi_path / args.linuxapi_c}" "{args.tacle_path / args.bench_c}" '
-                f'-o taskset.out'
+        # —— 生成任务集 & C 文件 ——（legacy 随机流：续跑时也要生成，保证后续用例的抽样不变）
+        t0 = time.monotonic()
+        util, U = case_util(i, M_i)
+        if not (db.is_done(i) and rng is not None):
+            timing = None
+            if U is not None:
+                wcets, periods = generate_utilization_timing(N_i, U, 1, args.util_method, *period_range,
+                                                             harmonic=args.harmonic, rng=rng)
+                timing = (wcets[0].tolist(), periods[0].tolist())
+            taskset = generate_taskset(
+                M=M_i, N=N_i,
+                wcet_min=args.wcet_min, wcet_max=args.wcet_max,
+                Cr=Cr, RaF_max=args.raf_max, FN=args.fn,
+                contention=cont, rng=rng, timing=timing, partition=args.partition
             )
-            comp = subprocess.run(cmd, shell=True, cwd=str(case_dir),
-                                  stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
-            if comp.returncode != 0:
-                with open(case_dir / "build_log.txt", "w") as bf:
-                    bf.write(comp.stdout)
-            # 若编译失败，继续往下会记录 NaN
-
-        # —— 运行 ——（若编译成功）
-        if exe_path.exists():
-            try:
-                runp = subprocess.run(["./taskset.out"], cwd=str(case_dir),
-                                      stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
-                                      text=True, timeout=args.timeout)
-            except subprocess.TimeoutExpired:
-                runp = None
+        if args.runner:
+            exe_path = runner_exe
+            run_cmd = [str(runner_exe), "taskset.txt"]
+        else:
+            exe_path = case_dir / "taskset.out"
+            run_cmd = ["./taskset.out"]
+        if db.is_done(i):
+            # 结果库中已有该用例：不写文件、不编译、不运行
+            return M_i, N_i, Cr, cont, case_dir, exe_path, run_cmd, False
+
+        db.add_case(i, M_i, N_i, Cr, cont, util=util, partition=args.partition)
+        db.add_core_loads(i, 0, core_loads(taskset))
+        if pruner.predict(i, taskset):
+            return M_i, N_i, Cr, cont, case_dir, exe_path, run_cmd, False
+        if args.backend == "sim":
+            # 仿真：用其 SUMMARY 记录代替程序输出，不写文件、不编译
+            sim_out[i] = simulate_case(db, i, taskset, args.max_duration or RUN_DURATION_SEC)
+            return M_i, N_i, Cr, cont, case_dir, exe_path, run_cmd, False
+        case_dir.mkdir(parents=True, exist_ok=True)
+        if args.runner:
+            generate_taskset_spec(taskset, str(case_dir / "taskset.txt"))
         else:
-            runp = None
+            generate_c_file(taskset, str(c_path), **render_opts)
+        if args.trace:
+            generate_taskset_json(taskset, str(case_dir / "taskset.json"))
+        db.add_stage(i, 0, "generate", time.monotonic() - t0)
+
+        # runner 模式无需编译
+        need_build = not args.runner
+        return M_i, N_i, Cr, cont, case_dir, exe_path, run_cmd, need_build
+
+    def finish_case(i, M_i, N_i, Cr, cont, case_dir, stdout_text):
+        """解析一个已结束用例的输出（stdout_text=None 表示编译/运行失败），写入结果库并聚合。"""
+        nonlocal sum_misses, sum_jobs, sum_duration, n_cases
+        if i in pruner:
+            # 分析证明可调度：不测量，采样器按预测（无 miss）更新
+            sampler.observe(M_i, Cr, cont, 0.0)
+            if queue is not None and args.role == "worker":
+                db.flush()
+                queue.complete(i)
+            print(f"[CASE {i:05d}] M={M_i} N={N_i}  Cr={Cr:.{args.decimals}f}  cont={cont:.{args.decimals}f}  "
+                  f"pruned (schedulable by analysis)")
+            return
+        n_cases += 1
+        Ms_used.append(M_i)
+        Ns_used.append(N_i)
 
         # —— 解析结果 ——（delay_mean / miss）
-        if (runp is None) or (runp.returncode is None) or (runp.returncode != 0):
+        summ = parse_summary(stdout_text)
+        duration = parse_duration(stdout_text)   # 实际运行时长（--adaptive 时可能提前结束）
+        if db.is_done(i):
+            # 续跑：结果来自之前的运行
+            dmean, miss_rate, misses, jobs, duration = db.get_run(i)
+        elif stdout_text is None:
             dmean, miss_rate, misses, jobs = float("nan"), float("nan"), 0, 0
+        elif summ is not None:
+            # 程序内在线统计，无需读取逐作业日志
+            dmean, miss_rate, misses, jobs = delay_and_miss(summ)
         else:
-            with open(case_dir / "run_log.txt", "w") as lf:
-                lf.write(runp.stdout)
             dvals = read_delay_ratios(case_dir)
-            dmean = (sum(dvals) / len(dvals)) if dvals else float("nan")
-            mr, ms, jb = parse_global_miss_rate(runp.stdout)
+            dmean = float(dvals.mean()) if dvals.size else float("nan")
+            mr, ms, jb = parse_global_miss_rate(stdout_text)
             if mr is None:
                 miss_rate, misses, jobs = float("nan"), 0, 0
             else:
                 miss_rate, misses, jobs = mr, ms, jb
 
-        # —— 写 cases.csv ——（每个用例一行）
-        with open(cases_csv, "a", newline="") as f:
-            w = csv.writer(f)
-            w.writerow([
-                i, M_i, N_i,
-                f"{Cr:.{args.decimals}f}", f"{cont:.{args.decimals}f}",
-                ("" if math.isnan(dmean) else f"{dmean:.9f}"),
-                ("" if (isinstance(miss_rate, float) and math.isnan(miss_rate)) else f"{miss_rate:.9f}"),
-                misses, jobs
-            ])
+        # —— 写结果库 ——（批量事务提交；cases.csv 最后由视图导出）
+        if not db.is_done(i):
+            db.add_run(i, 0, OK if stdout_text is not None else "failed",
+                       dmean, miss_rate, misses, jobs, duration,
+                       stop=summ.get("stop") if summ else None, case_dir=case_dir, summary=summ)
+
+        sampler.observe(M_i, Cr, cont, miss_rate)
+        if queue is not None and args.role == "worker":
+            # 先提交结果，再把用例移出队列
+            db.flush()
+            queue.complete(i)
 
         # —— 聚合 —— 
         if not math.isnan(dmean):
@@ -255,10 +475,94 @@ def main():
             per_case_miss_rates.append(miss_rate)
         sum_misses += (misses or 0)
         sum_jobs   += (jobs or 0)
+        sum_duration += (duration or 0.0)
 
         print(f"[CASE {i:05d}] M={M_i} N={N_i}  Cr={Cr:.{args.decimals}f}  cont={cont:.{args.decimals}f}  "
               f"delay_mean={(f'{dmean:.6f}' if not math.isnan(dmean) else 'NaN')}  "
-              f"miss_rate={(f'{miss_rate:.6f}%' if not (isinstance(miss_rate, float) and math.isnan(miss_rate)) else 'NaN')}")
+              f"miss_rate={(f'{miss_rate:.6f}%' if not (isinstance(miss_rate, float) and math.isnan(miss_rate)) else 'NaN')}"
+              f"{(f'  duration={duration:.2f}s' if duration is not None else '')}")
+
+    pipeline = BuildPipeline(build_cache) if (args.pipeline and not args.runner and not args.pack) else None
+
+    if args.pack:
+        # —— 并发模式：FIFO 依次装箱，分区空闲时再生成/编译下一个用例 ——
+        packer = CorePacker(guard=args.guard_cores)
+        print(f"[PACK] cpus={len(packer.cpus)} guard={packer.guard}")
+        pending_info = {}
+
+        def packed_jobs():
+            for i in case_ids:
+                M_i, N_i, Cr, cont, case_dir, exe_path, run_cmd, need_build = prepare_case(i)
+                if skipped(i):
+                    finish_case(i, M_i, N_i, Cr, cont, case_dir, None)
+                    continue
+                if need_build:
+                    # 只在当前未被任何分区占用的核上编译
+                    build_case(db, build_cache, i, case_dir, cpus=packer.free_cpus() or None)
+                if not exe_path.exists():
+                    finish_case(i, M_i, N_i, Cr, cont, case_dir, None)
+                    continue
+                pending_info[i] = (M_i, N_i, Cr, cont, case_dir)
+                yield i, M_i, run_cmd, case_dir
+
+        for i, part, rc in run_packed(packed_jobs(), packer, args.timeout):
+            M_i, N_i, Cr, cont, case_dir = pending_info.pop(i)
+            stdout_text = (case_dir / "run_log.txt").read_text() if rc == 0 else None
+            finish_case(i, M_i, N_i, Cr, cont, case_dir, stdout_text)
+    else:
+        ids = iter(case_ids)   # 列表，或 worker 模式下从队列惰性领取
+        nxt_id = next(ids, None)
+        nxt = prepare_case(nxt_id) if nxt_id is not None else None
+
+        while nxt is not None:
+            i = nxt_id
+            M_i, N_i, Cr, cont, case_dir, exe_path, run_cmd, need_build = nxt
+            nxt_id = next(ids, None)
+            nxt = prepare_case(nxt_id) if nxt_id is not None else None
+            if skipped(i):
+                finish_case(i, M_i, N_i, Cr, cont, case_dir, None)
+                continue
+            if i in sim_out:
+                finish_case(i, M_i, N_i, Cr, cont, case_dir, sim_out.pop(i))
+                continue
+
+            if need_build:
+                # 内容寻址缓存：相同 C 源码只编译一次；若编译失败，继续往下会记录 NaN
+                build_case(db, build_cache, i, case_dir, pipeline=pipeline)
+
+            # 流水线：用例 i 占用核 0..M_i-1，下一个用例在其余核上编译
+            if pipeline is not None and nxt is not None and nxt[7]:
+                pipeline.prefetch(nxt[4], range(M_i))
+
+            # —— 运行 ——（若编译成功；超时或非零退出记为失败）
+            stdout_text = run_case(db, i, run_cmd, case_dir, args.timeout) if exe_path.exists() else None
+            finish_case(i, M_i, N_i, Cr, cont, case_dir, stdout_text)
+
+    # —— cases.csv：由 cases_csv 视图导出 ——
+    db.export_csv("cases_csv", cases_csv, formats={
+        "Cr": f".{args.decimals}f", "contention": f".{args.decimals}f",
+        "core_util_max": ".4f", "delay_mean": ".9f", "miss_rate_percent": ".9f", "duration_s": ".3f"})
+    if args.counters:
+        db.export_csv("counters_csv", out_root / "counters.csv", formats={
+            "Cr": f".{args.decimals}f", "contention": f".{args.decimals}f",
+            "delay_mean": ".9f", "miss_rate_percent": ".9f"})
+    pruner.export(out_root, args.decimals)
+    db.export_csv("cores_csv", out_root / "cores.csv", formats={
+        "Cr": f".{args.decimals}f", "contention": f".{args.decimals}f", "core_util": ".4f",
+        "shared_util": ".4f", "delay_mean": ".9f", "miss_rate_percent": ".9f"})
+    umax_mean, umax_max, n_over, n_cores = db.query(
+        "SELECT AVG(c.core_util_max), MAX(c.core_util_max), "
+        "(SELECT COUNT(*) FROM core_loads WHERE run_idx = 0 AND util > 1.0), "
+        "(SELECT COUNT(*) FROM core_loads WHERE run_idx = 0) FROM cases_csv c")[0]
+    if umax_max is not None:   # 没有实测用例（全部剪枝或失败）时不报告
+        print(f"[PARTITION] {args.partition}: max core utilization mean={umax_mean:.3f} max={umax_max:.3f}, "
+              f"overloaded cores={n_over}/{n_cores}")
+    db.close()
+    if args.fragment_stats:
+        # random contention: grouped into 10 bins
+        inflation_report(db.path, out_root / "inflation.csv", cont_bins=10)
+    if queue is not None:
+        queue.close()
 
     # —— 总结统计 —— 
     delay_stats = stat4(per_case_delay_means)
@@ -272,18 +576,18 @@ def main():
     with open(summary_csv, "w", newline="") as f:
         w = csv.writer(f)
         w.writerow([
-            "cases", "seed",
+            "cases", "seed", "sampler",
             "M_min", "M_max", "N_min", "N_max",
             "delay_mean_mean", "delay_mean_std", "delay_mean_min", "delay_mean_max",
             "miss_mean_percent", "miss_std", "miss_min", "miss_max",
-            "sum_misses", "sum_jobs"
+            "sum_misses", "sum_jobs", "sum_duration_s", "rng", "shard", "pruned"
         ])
         w.writerow([
-            Ncases, args.seed,
+            n_cases, args.seed, args.sampler,
             M_min, M_max, N_min, N_max,
             *format4(delay_stats),
             *format4(miss_stats),
-            sum_misses, sum_jobs
+            sum_misses, sum_jobs, f"{sum_duration:.3f}", args.rng, args.shard, len(pruner.pruned)
         ])
 
     # -------- 输出直方图数据（不画图） --------
@@ -321,9 +625,22 @@ def main():
                 w.writerow(["miss_rate_percent", f"{miss_edges[j]:.9f}", f"{miss_edges[j+1]:.9f}", int(miss_counts[j])])
 
     print(f"\n[OUTPUT]")
+    print(f"Results store  : {db.path.resolve()}")
     print(f"Per-case table : {cases_csv.resolve()}")
+    print(f"Per-core loads : {(out_root / 'cores.csv').resolve()}")
     print(f"Summary table  : {summary_csv.resolve()}")
     print(f"Histograms CSV : {hist_csv.resolve()}")
+    if args.counters:
+        print(f"Counters table : {(out_root / 'counters.csv').resolve()}")
+    if args.fragment_stats:
+        print(f"Inflation      : {(out_root / 'inflation.csv').resolve()}")
+    if args.prune != "off":
+        print(f"Predictions    : {(out_root / 'predictions.csv').resolve()}")
+    if args.backend == "hw":
+        build_cache.report()
+    if pipeline is not None:
+        pipeline.close()
+        pipeline.report()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+"""
+Build helpers shared by benchmark_tool3/4/5.
+
+- build_fragment_lib: compile linuxAPI_lib.c / bench_lib.c once per campaign into a static
+  library keyed by compiler, flags and source hash, so cases only compile their own .c.
+- BuildCache: content-addressed cache of taskset.out binaries keyed by the rendered C text,
+  compiler, flags, headers and link inputs; identical cases reuse one binary via hard link.
+- build_parallel: run BuildCache.build over many cases with a bounded pool of gcc workers.
+- build_runner: render generator3's data-driven runner once per campaign and compile it,
+  so cases only need a taskset.txt description instead of a per-case gcc invocation.
+"""
+
+import hashlib
+import os
+import shutil
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+from generator3 import generate_runner_file
+
+
+def _compiler_id(gcc: str):
+    """First line of `gcc --version` (empty if the compiler cannot be queried)."""
+    try:
+        p = subprocess.run(f"{gcc} --version", shell=True,
+                           stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+        return p.stdout.splitlines()[0] if p.stdout else ""
+    except Exception:
+        return ""
+
+
+def fragment_lib_key(gcc: str, compile_flags: str, include_dirs, sources):
+    """sha256 over compiler identity, flags, the library sources and the headers next to them."""
+    h = hashlib.sha256()
+    h.update(gcc.encode())
+    h.update(_compiler_id(gcc).encode())
+    h.update(compile_flags.encode())
+    files = [Path(s) for s in sources]
+    for d in include_dirs:
+        files.extend(sorted(Path(d).glob("*.h")))
+    for p in files:
+        h.update(p.name.encode())
+        h.update(p.read_bytes())
+    return h.hexdigest()
+
+
+def build_fragment_lib(out_root: Path, gcc: str, compile_flags: str, include_dirs, sources):
+    """
+    Compile `sources` to objects and archive them into
+    <out_root>/fraglib/<key>/libfragments.a (reused when the key already exists).
+    Returns the absolute archive path, or None if compilation failed.
+    """
+    key = fragment_lib_key(gcc, compile_flags, include_dirs, sources)
+    lib_dir = (out_root / "fraglib" / key[:16]).resolve()
+    lib = lib_dir / "libfragments.a"
+    if lib.exists():
+        print(f"[FRAGLIB_HIT] {lib}")
+        return lib
+
+    lib_dir.mkdir(parents=True, exist_ok=True)
+    incs = " ".join(f'-I"{d}"' for d in include_dirs)
+    objs = []
+    log = []
+    for src in sources:
+        obj = lib_dir / (Path(src).stem + ".o")
+        cmd = f'{gcc} {compile_flags} {incs} -c "{src}" -o "{obj}"'
+        comp = subprocess.run(cmd, shell=True, cwd=str(lib_dir),
+                              stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+        log.append(f"$ {cmd}\n{comp.stdout}")
+        if comp.returncode != 0:
+            print(f"[FRAGLIB_FAIL] {src}\n{comp.stdout}")
+            return None
+        objs.append(obj)
+
+    # archive under a temp name, then publish atomically
+    tmp = lib_dir / f"libfragments.{os.getpid()}.tmp.a"
+    arp = subprocess.run(["ar", "rcs", str(tmp), *map(str, objs)],
+                         stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    log.append(f"$ ar rcs {tmp.name}\n{arp.stdout}")
+    with open(lib_dir / "build_log.txt", "w") as bf:
+        bf.write("\n".join(log))
+    if arp.returncode != 0:
+        print(f"[FRAGLIB_FAIL] ar\n{arp.stdout}")
+        return None
+    os.replace(tmp, lib)
+    print(f"[FRAGLIB_OK] {lib}")
+    return lib
+
+
+class BuildCache:
+    """
+    Content-addressed build cache for per-case binaries.
+
+    key = sha256(compiler id, flags, headers, link inputs, rendered C text);
+    the binary is stored once under <root>/<key[:2]>/<key>/taskset.out and hard-linked
+    (copied if linking is not possible) into every case with the same key.
+    With root=None the cache is disabled and build() just compiles.
+    """
+
+    def __init__(self, root, gcc: str, compile_flags: str, include_dirs, link_inputs):
+        self.root = Path(root).resolve() if root is not None else None
+        self.gcc = gcc
+        self.compile_flags = compile_flags
+        self.include_dirs = list(include_dirs)
+        self.link_inputs = list(link_inputs)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        base = hashlib.sha256()
+        base.update(gcc.encode())
+        base.update(_compiler_id(gcc).encode())
+        base.update(compile_flags.encode())
+        for d in self.include_dirs:
+            for h in sorted(Path(d).glob("*.h")):
+                base.update(h.name.encode())
+                base.update(h.read_bytes())
+        for p in self.link_inputs:
+            base.update(Path(p).name.encode())
+            base.update(Path(p).read_bytes())
+        self._base = base.digest()
+
+    def key_for(self, c_text: bytes):
+        h = hashlib.sha256(self._base)
+        h.update(c_text)
+        return h.hexdigest()
+
+    def compile_cmd(self, src: str, exe: str):
+        incs = " ".join(f'-I"{d}"' for d in self.include_dirs)
+        libs = " ".join(f'"{p}"' for p in self.link_inputs)
+        return f'{self.gcc} {self.compile_flags} {incs} {src} {libs} -o {exe}'
+
+    def build(self, case_dir: Path, src: str = "generated_taskset.c", exe: str = "taskset.out", cpus=None):
+        """
+        Compile (or fetch) case_dir/src -> case_dir/exe. Returns (ok, compiler_output, cache_hit).
+        `cpus` (optional) confines the compiler processes to those CPUs (taskset -c; the affinity is
+        set by the taskset binary, so nothing runs in the forked child before exec, which matters
+        because builds are started from worker threads).
+        """
+        case_dir = Path(case_dir)
+        exe_path = case_dir / exe
+        if self.root is None:
+            return self._compile(case_dir, src, exe, cpus) + (False,)
+
+        key = self.key_for((case_dir / src).read_bytes())
+        cached = self.root / key[:2] / key / "taskset.out"
+        if cached.exists():
+            _link_or_copy(cached, exe_path)
+            with self._lock:
+                self.hits += 1
+            return True, "", True
+
+        ok, out = self._compile(case_dir, src, exe, cpus)
+        with self._lock:
+            self.misses += 1
+        if ok:
+            cached.parent.mkdir(parents=True, exist_ok=True)
+            tmp = cached.parent / f"taskset.{os.getpid()}.{threading.get_ident()}.tmp"
+            _link_or_copy(exe_path, tmp)
+            os.replace(tmp, cached)
+        return ok, out, False
+
+    def _compile(self, case_dir: Path, src: str, exe: str, cpus=None):
+        # never write through a hard link into the cache
+        if (case_dir / exe).exists():
+            (case_dir / exe).unlink()
+        cmd = self.compile_cmd(src, exe)
+        if cpus:
+            cmd = f"{_taskset_bin()} -c {','.join(str(c) for c in sorted(cpus))} {cmd}"
+        comp = subprocess.run(cmd, shell=True, cwd=str(case_dir),
+                              stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+        return comp.returncode == 0, comp.stdout
+
+    def report(self):
+        if self.root is None:
+            return
+        total = self.hits + self.misses
+        rate = (100.0 * self.hits / total) if total else 0.0
+        print(f"[BUILD_CACHE] hits={self.hits} misses={self.misses} hit_rate={rate:.1f}% ({self.root})")
+
+
+def _taskset_bin():
+    path = shutil.which("taskset")
+    if path is None:
+        raise RuntimeError("pinned builds (--pipeline) need the taskset command (util-linux)")
+    return path
+
+
+def _link_or_copy(src: Path, dst: Path):
+    if dst.exists() or dst.is_symlink():
+        dst.unlink()
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def build_parallel(cache: BuildCache, case_dirs, jobs: int):
+    """
+    Compile every case in `case_dirs` with at most `jobs` concurrent gcc processes.
+    Yields (case_dir, ok, compiler_output) in completion order.
+
+    gcc does the work in child processes, so a thread pool is enough to keep `jobs`
+    compilers busy and lets all workers share one BuildCache (and its counters).
+    """
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        futs = {pool.submit(cache.build, d): d for d in case_dirs}
+        for fut in as_completed(futs):
+            ok, out, _ = fut.result()
+            yield futs[fut], ok, out
+
+
+def build_runner(out_root: Path, gcc: str, compile_flags: str, include_dirs, link_inputs, options=None):
+    """
+    Generate + compile <out_root>/runner/taskset_runner.out.
+    `link_inputs` are the library sources or the prebuilt fragment archive;
+    `options` are generator3 render options (see generator3.DEFAULT_OPTIONS).
+    Returns the absolute executable path, or None if compilation failed.
+    """
+    runner_dir = (out_root / "runner").resolve()
+    runner_dir.mkdir(parents=True, exist_ok=True)
+    generate_runner_file(str(runner_dir / "taskset_runner.c"), **(options or {}))
+
+    incs = " ".join(f'-I"{d}"' for d in include_dirs)
+    libs = " ".join(f'"{p}"' for p in link_inputs)
+    cmd = (
+        f'{gcc} {compile_flags} {incs} '
+        f'taskset_runner.c {libs} '
+        f'-o taskset_runner.out'
+    )
+    comp = subprocess.run(cmd, shell=True, cwd=str(runner_dir),
+                          stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    with open(runner_dir / "build_log.txt", "w") as bf:
+        bf.write(comp.stdout)
+    if comp.returncode != 0:
+        print(f"[RUNNER_FAIL] {runner_dir}\n{comp.stdout}")
+        return None
+    exe = runner_dir / "taskset_runner.out"
+    print(f"[RUNNER_OK] {exe}")
+    return exe
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""
+Campaign helpers shared by benchmark_tool4/5 (random cases, one taskset per case).
+
+- check_options: option combinations the backends cannot honour, and the fragment library
+  sources needed to build (--backend hw) or calibrate (--cost-profile).
+- apply_costs: calibrate or load the --cost-profile and apply it to generator3; --prune skip
+  is refused unless the profile covers every fragment.
+- Pruner: --prune response-time analysis of each case before it is written; records the
+  prediction, decides whether the case is still measured and exports predictions.csv.
+- simulate_case / build_case / run_case: the per-case backend steps (the simulator for
+  --backend sim, the build and the serial run for --backend hw), timed into stage_times.
+- enqueue_and_merge / queue_results: the --role coordinator side of a work-queue campaign.
+"""
+
+import json
+import subprocess
+import time
+from pathlib import Path
+
+from generator3 import apply_cost_profile
+from calibration import ensure_profile
+from results_db import OK, merge
+from rta import analyse_taskset
+from samplers import case_rng
+from simulator import simulate
+
+
+def check_options(ap, args):
+    """ap.error on options that contradict each other or the backend."""
+    if args.no_stats and args.log_format == "none":
+        ap.error("--no-stats needs per-job logs (--log-format bin|csv)")
+    if args.no_stats and args.counters:
+        ap.error("--counters is reported in the SUMMARY record and cannot be combined with --no-stats")
+    if args.no_stats and args.fragment_stats:
+        ap.error("--fragment-stats is reported in the SUMMARY record and cannot be combined with --no-stats")
+    if args.trace < 0:
+        ap.error("--trace must be >= 0")
+    if args.prune == "skip" and not ((args.cost_profile is not None and args.cost_stat in ("p99", "max"))
+                                     or args.prune_margin > 1.0):
+        # mean costs and FIFO-ordered blocking are optimistic: skipped cases would be recorded as 0% miss
+        ap.error("--prune skip needs a conservative cost basis (--cost-profile with --cost-stat p99|max, "
+                 "or --prune-margin > 1); use --prune sample otherwise")
+    if args.backend == "sim":
+        hw_only = [flag for flag, on in (
+            ("--runner", args.runner), ("--pack", args.pack), ("--pipeline", args.pipeline),
+            ("--adaptive", args.adaptive), ("--counters", args.counters), ("--trace", args.trace),
+            ("--fragment-stats", args.fragment_stats), ("--no-stats", args.no_stats),
+            ("--log-format", args.log_format != "none")) if on]
+        if hw_only:
+            ap.error(f"{', '.join(hw_only)} only apply to --backend hw")
+    if args.backend == "hw" or args.cost_profile is not None:
+        missing = [str(pth) for pth in (args.linuxapi_path / args.linuxapi_c, args.linuxapi_path / args.linuxapi_h,
+                                        args.tacle_path / args.bench_c, args.tacle_path / args.bench_h)
+                   if not pth.exists()]
+        if missing:
+            ap.error("fragment library sources not found (set --linuxapi-path / --tacle-path): " + ", ".join(missing))
+
+
+def apply_costs(ap, args, include_dirs):
+    """Apply --cost-profile (calibrated on first use) to generator3's fragment costs."""
+    if args.cost_profile is None:
+        return
+    try:
+        prof = ensure_profile(args.cost_profile, *include_dirs, gcc=args.gcc)
+        no_cost = apply_cost_profile(prof, stat=args.cost_stat, state=args.cost_state)
+    except (RuntimeError, ValueError) as e:
+        ap.error(f"--cost-profile: {e}")
+    if no_cost:
+        print(f"[COST_PROFILE] no {args.cost_state}/{args.cost_stat} data, built-in cost kept: {', '.join(no_cost)}")
+    if no_cost and args.prune == "skip" and args.prune_margin <= 1.0:
+        # the profile is the conservative basis of --prune skip only if it covers every fragment
+        ap.error(f"--prune skip: the cost profile has no {args.cost_state}/{args.cost_stat} data for "
+                 f"{', '.join(no_cost)}; use --prune sample or --prune-margin > 1")
+
+
+class Pruner:
+    """
+    --prune: response-time analysis (Generator/rta.py) of each case before it is written.
+    Every analysed case gets a row in the predictions table. A case predicted schedulable is
+    pruned (not written, built or run) with mode "skip"; with "sample" it is still measured with
+    probability `keep`, drawn from the case's own stream so the choice does not depend on the
+    other cases. Mode "log" only records; "off" does nothing.
+    """
+
+    def __init__(self, db, mode: str, keep: float, margin: float, interference: str, seed: int):
+        self.db = db
+        self.mode = mode
+        self.keep = keep
+        self.margin = margin
+        self.interference = interference
+        self.seed = seed
+        self.pruned = set()
+
+    def __contains__(self, case_id):
+        return case_id in self.pruned
+
+    def predict(self, case_id, taskset):
+        """Analyse and record case `case_id`; True if it is pruned."""
+        if self.mode == "off":
+            return False
+        a = analyse_taskset(taskset, interference=self.interference, cost_scale=self.margin)
+        prune = a["schedulable"] and (self.mode == "skip" or (
+            self.mode == "sample" and case_rng(self.seed, case_id, stream=1).random() >= self.keep))
+        self.db.add_prediction(case_id, a["schedulable"], a["rt_ratio"], a["delay_bound"], a["blocking"],
+                               pruned=prune)
+        if prune:
+            self.pruned.add(case_id)
+        return prune
+
+    def export(self, out_root: Path, decimals: int):
+        """predictions.csv (predicted vs measured) and the [PRUNE] line."""
+        if self.mode == "off":
+            return
+        self.db.export_csv("predictions_csv", out_root / "predictions.csv", formats={
+            "Cr": f".{decimals}f", "contention": f".{decimals}f", "rt_ratio": ".6f",
+            "delay_bound": ".6f", "blocking_us": ".1f", "delay_mean": ".9f", "miss_rate_percent": ".9f"})
+        n_sched, n_viol = self.db.query(
+            "SELECT COUNT(*), COALESCE(SUM(misses > 0), 0) FROM predictions_csv "
+            "WHERE schedulable = 1 AND status = ?", (OK,))[0]
+        print(f"[PRUNE] pruned={len(self.pruned)}  measured predicted-schedulable={n_sched}, with misses={n_viol}")
+
+
+def simulate_case(db, case_id, taskset, duration_s: float):
+    """--backend sim: simulate the taskset; its SUMMARY record stands in for the program output."""
+    t0 = time.monotonic()
+    summ = simulate(taskset, duration_s)
+    db.add_stage(case_id, 0, "simulate", time.monotonic() - t0)
+    return "SUMMARY " + json.dumps(summ)
+
+
+def build_case(db, build_cache, case_id, case_dir: Path, pipeline=None, cpus=None):
+    """
+    Build case_dir/taskset.out through the cache, or take the build `pipeline` prefetched
+    (the stage time is then what the measurement waited for). A failed build leaves its
+    compiler output in build_log.txt. Returns True on success.
+    """
+    t0 = time.monotonic()
+    if pipeline is not None:
+        ok, out = pipeline.wait(case_dir)
+    else:
+        ok, out, _ = build_cache.build(case_dir, cpus=cpus)
+    db.add_stage(case_id, 0, "build", time.monotonic() - t0)
+    if not ok:
+        (Path(case_dir) / "build_log.txt").write_text(out)
+    return ok
+
+
+def run_case(db, case_id, run_cmd, case_dir: Path, timeout: float):
+    """
+    Run one case on this host (stdout+stderr also go to run_log.txt).
+    Returns the output, or None if the program timed out or exited non-zero.
+    """
+    t0 = time.monotonic()
+    try:
+        runp = subprocess.run(run_cmd, cwd=str(case_dir),
+                              stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                              text=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        return None
+    db.add_stage(case_id, 0, "run", time.monotonic() - t0)
+    (Path(case_dir) / "run_log.txt").write_text(runp.stdout)
+    return runp.stdout if runp.returncode == 0 else None
+
+
+def enqueue_and_merge(queue, args, case_ids, store: Path):
+    """
+    --role coordinator: enqueue the cases, wait until the workers have done them all and merge
+    their results stores into `store`. The workers do the measurements.
+    """
+    n = queue.create(case_ids, vars(args))
+    print(f"[QUEUE] {args.queue}: {n} cases enqueued, start workers with --queue {args.queue} --role worker")
+    queue.wait()
+    merge(store, queue.worker_stores()).close()
+
+
+def queue_results(db, case_ids):
+    """
+    --role coordinator: the cases of the merged store with a result (measured or pruned).
+    A case no worker measured successfully is reported, not re-measured on this host.
+    """
+    stored_pruned = {r[0] for r in db.query("SELECT case_id FROM predictions WHERE pruned = 1")}
+    failed = [i for i in case_ids if not db.is_done(i) and i not in stored_pruned]
+    if failed:
+        print(f"[QUEUE] {len(failed)} cases without a successful run (not measured by the coordinator): "
+              + " ".join(map(str, failed[:20])) + (" ..." if len(failed) > 20 else ""))
+    return [i for i in case_ids if db.is_done(i) or i in stored_pruned]
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+Readers for the per-task delay logs written by generated tasksets / the runner.
+
+Binary format (log_format="bin", task_<id>_delays.bin), little endian:
+    header  TaskLogHeader  magic "TLOG", u32 version, u32 entry_size, i32 task_id, u64 count
+    body    count x TaskLogEntry  i32 period_idx, i32 missed, f64 delay_ratio
+
+The body is mapped with np.memmap straight into a structured array, so reading a case
+costs one mmap per task instead of parsing text. task_<id>_delays.csv (log_format="csv")
+is still understood for older output directories.
+"""
+
+import csv
+from pathlib import Path
+
+import numpy as np
+
+LOG_MAGIC = b"TLOG"
+LOG_VERSION = 1
+
+HEADER_DTYPE = np.dtype([
+    ("magic", "S4"), ("version", "<u4"), ("entry_size", "<u4"),
+    ("task_id", "<i4"), ("count", "<u8"),
+])
+ENTRY_DTYPE = np.dtype([
+    ("period_idx", "<i4"), ("missed", "<i4"), ("delay_ratio", "<f8"),
+])
+
+
+def read_task_log(path: Path):
+    """
+    Map one task_<id>_delays.bin; returns (task_id, structured array with ENTRY_DTYPE).
+    Raises ValueError on a foreign or truncated file.
+    """
+    path = Path(path)
+    size = path.stat().st_size
+    if size < HEADER_DTYPE.itemsize:
+        raise ValueError(f"{path}: truncated header")
+    hdr = np.fromfile(path, dtype=HEADER_DTYPE, count=1)[0]
+    if hdr["magic"] != LOG_MAGIC or hdr["version"] != LOG_VERSION:
+        raise ValueError(f"{path}: not a v{LOG_VERSION} task log")
+    if hdr["entry_size"] != ENTRY_DTYPE.itemsize:
+        raise ValueError(f"{path}: entry size {hdr['entry_size']} != {ENTRY_DTYPE.itemsize}")
+
+    count = int(hdr["count"])
+    if HEADER_DTYPE.itemsize + count * ENTRY_DTYPE.itemsize > size:
+        raise ValueError(f"{path}: truncated body ({count} entries announced)")
+    if count == 0:
+        return int(hdr["task_id"]), np.empty(0, dtype=ENTRY_DTYPE)
+    entries = np.memmap(path, dtype=ENTRY_DTYPE, mode="r",
+                        offset=HEADER_DTYPE.itemsize, shape=(count,))
+    return int(hdr["task_id"]), entries
+
+
+def _read_csv_ratios(path: Path):
+    vals = []
+    with path.open("r", newline="") as f:
+        for row in csv.DictReader(f):
+            v = row.get("delay_ratio")
+            try:
+                vals.append(float(v))
+            except (TypeError, ValueError):
+                pass
+    return vals
+
+
+def read_case_delay_ratios(case_dir: Path):
+    """All delay_ratio values of a case directory as one float64 array (binary logs preferred)."""
+    case_dir = Path(case_dir)
+    parts = []
+    bins = sorted(case_dir.glob("task_*_delays.bin"))
+    if bins:
+        for p in bins:
+            try:
+                _, entries = read_task_log(p)
+            except (OSError, ValueError):
+                continue
+            parts.append(np.asarray(entries["delay_ratio"], dtype=np.float64))
+    else:
+        for p in sorted(case_dir.glob("task_*_delays.csv")):
+            try:
+                parts.append(np.asarray(_read_csv_ratios(p), dtype=np.float64))
+            except OSError:
+                continue
+    return np.concatenate(parts) if parts else np.empty(0)
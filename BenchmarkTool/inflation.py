@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+"""
+Contention inflation of the shared API fragments, from the per-fragment statistics of a
+campaign (render option fragstats, --fragment-stats in benchmark_tool3/4/5).
+
+For every shared fragment (API_fragmentK: semaphore, mutex, dataqueue, spin, rwlock,
+eventfd) and every (M, contention) group of the campaign, the execution time of the
+shared variant is compared with its uncontended para_ variant (API_para_fragmentK):
+
+    inflation_mean = mean time(shared) / mean time(para)
+    inflation_p99  = p99 time(shared)  / p99 time(para)
+
+The para_ baseline comes from the same group when it has at least `min_calls` para_
+calls, otherwise from every group with the same M (at contention 1.0 no para_ variant is
+drawn at all); the `baseline` column says which. Percentiles are interpolated in the
+merged per-fragment histograms (run_summary.frag_bin_edges).
+
+    python inflation.py out_tool4/results.sqlite --cont-bins 10 -o inflation.csv
+"""
+
+import argparse
+import csv
+import json
+import math
+from collections import defaultdict
+from pathlib import Path
+
+import numpy as np
+
+from generator3 import shared_api_lib
+from results_db import OK, ResultsDB
+from run_summary import FRAG_HIST_BINS, frag_bin_edges
+
+COLUMNS = [
+    "M", "contention", "fragment", "kind",
+    "shared_calls", "shared_mean_ns", "shared_p50_ns", "shared_p99_ns",
+    "para_calls", "para_mean_ns", "para_p50_ns", "para_p99_ns",
+    "inflation_mean", "inflation_p99", "baseline",
+]
+
+
+class _Acc:
+    __slots__ = ("calls", "sum_ns", "hist")
+
+    def __init__(self):
+        self.calls = 0
+        self.sum_ns = 0
+        self.hist = np.zeros(FRAG_HIST_BINS, dtype=np.int64)
+
+    def add(self, calls, sum_ns, hist):
+        self.calls += calls
+        self.sum_ns += sum_ns
+        for b, c in hist:
+            self.hist[int(b)] += int(c)
+
+    def merge(self, other):
+        self.calls += other.calls
+        self.sum_ns += other.sum_ns
+        self.hist += other.hist
+
+    def mean(self):
+        return self.sum_ns / self.calls if self.calls else math.nan
+
+
+def hist_quantile(counts, edges, q):
+    """q-quantile of a binned sample, linear within the bin (open last bin: its lower edge)."""
+    total = counts.sum()
+    if total == 0:
+        return math.nan
+    cum = np.cumsum(counts)
+    b = int(np.searchsorted(cum, q * total))
+    lo, hi = edges[b], edges[b + 1]
+    if math.isinf(hi):
+        return float(lo)
+    before = cum[b - 1] if b else 0
+    return float(lo + (hi - lo) * (q * total - before) / counts[b])
+
+
+def cont_key(cont, bins):
+    """Contention group: the value itself (bins=0, grid campaigns) or the lower edge of one of `bins` bins."""
+    if bins <= 0:
+        return round(cont, 6)
+    return round(min(int(cont * bins), bins - 1) / bins, 6)
+
+
+def collect(db: ResultsDB, cont_bins: int = 0):
+    """{(M, contention group, fragment): _Acc} over every successful run of the store."""
+    acc = defaultdict(_Acc)
+    rows = db.query(
+        "SELECT c.M, c.contention, f.fragment, f.calls, f.sum_ns, f.hist "
+        "FROM fragment_stats f JOIN runs r ON r.case_id = f.case_id AND r.run_idx = f.run_idx "
+        "JOIN cases c ON c.case_id = f.case_id WHERE r.status = ?", (OK,))
+    for M, cont, frag, calls, sum_ns, hist in rows:
+        acc[(M, cont_key(cont, cont_bins), frag)].add(calls, sum_ns, json.loads(hist) if hist else [])
+    return acc
+
+
+def inflation_rows(acc, min_calls: int = 30):
+    """Report rows (dicts with COLUMNS) from collect()."""
+    edges = frag_bin_edges()
+    groups = sorted({(M, cont) for M, cont, _ in acc})
+    # pooled para_ baselines per M
+    pooled = defaultdict(_Acc)
+    for (M, cont, frag), a in acc.items():
+        pooled[(M, frag)].merge(a)
+
+    rows = []
+    for M, cont in groups:
+        for api in shared_api_lib:
+            shared = acc.get((M, cont, api["name"]))
+            if shared is None or shared.calls == 0:
+                continue
+            para = acc.get((M, cont, api["para_name"]))
+            baseline = "same"
+            if para is None or para.calls < min_calls:
+                para = pooled.get((M, api["para_name"]))
+                baseline = "M"
+            if para is None or para.calls == 0:
+                para, baseline = _Acc(), "none"
+            s_p99 = hist_quantile(shared.hist, edges, 0.99)
+            p_p99 = hist_quantile(para.hist, edges, 0.99)
+            rows.append({
+                "M": M, "contention": cont, "fragment": api["name"], "kind": api.get("kind", ""),
+                "shared_calls": shared.calls, "shared_mean_ns": shared.mean(),
+                "shared_p50_ns": hist_quantile(shared.hist, edges, 0.5), "shared_p99_ns": s_p99,
+                "para_calls": para.calls, "para_mean_ns": para.mean(),
+                "para_p50_ns": hist_quantile(para.hist, edges, 0.5), "para_p99_ns": p_p99,
+                "inflation_mean": shared.mean() / para.mean() if para.calls else math.nan,
+                "inflation_p99": s_p99 / p_p99 if p_p99 and not math.isnan(p_p99) else math.nan,
+                "baseline": baseline,
+            })
+    return rows
+
+
+def write_report(rows, path: Path):
+    with open(path, "w", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(COLUMNS)
+        for r in rows:
+            w.writerow(["NaN" if isinstance(v, float) and math.isnan(v)
+                        else (f"{v:.3f}" if isinstance(v, float) else v)
+                        for v in (r[c] for c in COLUMNS)])
+
+
+def print_matrix(rows):
+    """inflation_mean as one line per (M, contention) and one column per fragment kind."""
+    kinds = [api.get("kind", api["name"]) for api in shared_api_lib]
+    table = defaultdict(dict)
+    for r in rows:
+        table[(r["M"], r["contention"])][r["kind"] or r["fragment"]] = r["inflation_mean"]
+    print("   M  contention | " + " ".join(f"{k:>9}" for k in kinds))
+    for (M, cont), vals in sorted(table.items()):
+        cells = " ".join(f"{vals[k]:9.2f}" if k in vals and not math.isnan(vals[k]) else f"{'-':>9}"
+                         for k in kinds)
+        print(f"{M:4d}  {cont:10.3f} | {cells}")
+
+
+def report(db_path: Path, out_path: Path, cont_bins: int = 0, min_calls: int = 30, show: bool = True):
+    """Write the inflation report of the store at db_path; returns the number of rows."""
+    db = ResultsDB(db_path)
+    rows = inflation_rows(collect(db, cont_bins), min_calls)
+    db.close()
+    write_report(rows, out_path)
+    if show and rows:
+        print_matrix(rows)
+    return len(rows)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Shared vs para_ fragment inflation by M and contention")
+    ap.add_argument("db", type=Path, help="results.sqlite of a --fragment-stats campaign")
+    ap.add_argument("-o", "--out", type=Path, default=Path("inflation.csv"))
+    ap.add_argument("--cont-bins", type=int, default=0,
+                    help="group contention into this many equal bins (0 = exact values, for grid campaigns)")
+    ap.add_argument("--min-calls", type=int, default=30,
+                    help="para_ calls a group needs to serve as its own baseline")
+    args = ap.parse_args()
+    n = report(args.db, args.out, args.cont_bins, args.min_calls)
+    print(f"[INFLATION] {n} rows -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
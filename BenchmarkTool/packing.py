@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""
+Concurrent execution of independent cases on disjoint core partitions.
+
+A case with M cores only occupies cores 0..M-1 of its taskset; CorePacker hands out
+contiguous blocks of physical CPUs (optionally separated by guard cores) and
+run_packed launches each case with TASKSET_CORE_BASE set to the first CPU of its block,
+so the generated core_id becomes an offset into that partition.
+"""
+
+import os
+import subprocess
+import time
+from pathlib import Path
+
+
+class CorePacker:
+    def __init__(self, cpus=None, guard: int = 0):
+        self.cpus = sorted(cpus if cpus is not None else os.sched_getaffinity(0))
+        self.guard = max(0, guard)
+        self._owner = [None] * len(self.cpus)   # position -> partition id
+        self._next_id = 0
+
+    def _window_ok(self, pos, m):
+        if pos + m > len(self.cpus):
+            return False
+        # TASKSET_CORE_BASE + core_id must address consecutive CPU ids
+        if self.cpus[pos + m - 1] - self.cpus[pos] != m - 1:
+            return False
+        # the block plus `guard` CPUs on either side must be unused
+        lo = max(0, pos - self.guard)
+        hi = min(len(self.cpus), pos + m + self.guard)
+        return all(self._owner[k] is None for k in range(lo, hi))
+
+    def allocate(self, m: int):
+        """First-fit block of m CPUs; returns (partition_id, cpu_list) or None if nothing fits now."""
+        for pos in range(len(self.cpus)):
+            if self._window_ok(pos, m):
+                pid = self._next_id
+                self._next_id += 1
+                for k in range(pos, pos + m):
+                    self._owner[k] = pid
+                return pid, self.cpus[pos:pos + m]
+        return None
+
+    def release(self, pid):
+        for k, own in enumerate(self._owner):
+            if own == pid:
+                self._owner[k] = None
+
+    def fits(self, m: int):
+        """Whether m cores could ever be allocated on an empty host."""
+        return any(pos + m <= len(self.cpus) and self.cpus[pos + m - 1] - self.cpus[pos] == m - 1
+                   for pos in range(len(self.cpus)))
+
+    def free_cpus(self):
+        return [c for c, own in zip(self.cpus, self._owner) if own is None]
+
+
+def run_packed(jobs, packer: CorePacker, timeout: float, poll: float = 0.02):
+    """
+    Run jobs concurrently on disjoint partitions, in FIFO launch order.
+
+    jobs:  iterable of (key, M, cmd, case_dir); it is consumed lazily, only when the
+           next job can be launched (so per-case generation/builds happen just in time).
+    yields (key, partition_cpus, returncode or None on timeout / not placeable);
+    each case's stdout+stderr goes to case_dir/run_log.txt.
+    """
+    it = iter(jobs)
+    pending = next(it, None)
+    running = {}
+
+    while pending is not None or running:
+        # launch while the head job fits
+        while pending is not None:
+            key, m, cmd, case_dir = pending
+            if not packer.fits(m):
+                yield key, [], None
+                pending = next(it, None)
+                continue
+            got = packer.allocate(m)
+            if got is None:
+                break
+            pid, part = got
+            log = open(Path(case_dir) / "run_log.txt", "w")
+            env = dict(os.environ, TASKSET_CORE_BASE=str(part[0]))
+            proc = subprocess.Popen(cmd, cwd=str(case_dir), env=env,
+                                    stdout=log, stderr=subprocess.STDOUT)
+            running[proc] = (key, pid, part, log, time.monotonic())
+            pending = next(it, None)
+
+        # reap
+        time.sleep(poll)
+        for proc in list(running):
+            key, pid, part, log, t0 = running[proc]
+            rc = proc.poll()
+            if rc is None and time.monotonic() - t0 > timeout:
+                proc.kill()
+                proc.wait()
+                rc = None
+            elif rc is None:
+                continue
+            log.close()
+            packer.release(pid)
+            del running[proc]
+            yield key, part, rc
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""
+Pipelined compile/measure scheduling for benchmark_tool3/4/5.
+
+While case i is being measured, case i+1 is compiled in the background. The generated
+task_function pins taskset threads to cores 0..M-1, so the background build is confined
+(taskset -c) to the remaining CPUs; if case i uses every CPU the build is deferred
+until the measurement is over. At most one build is in flight, and measurement i+1 always
+waits for its own build, so builds never overlap a taskset's cores.
+"""
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+
+class BuildPipeline:
+    def __init__(self, cache):
+        self.cache = cache
+        self.all_cpus = sorted(os.sched_getaffinity(0))
+        self._pool = ThreadPoolExecutor(max_workers=1)
+        self._pending = {}
+
+        self.builds = 0        # builds handed to measurement
+        self.hidden = 0        # finished in the background before measurement needed them
+        self.stalls = 0        # measurement had to wait for its build
+        self.deferred = 0      # no free CPU while the previous case ran -> built in the foreground
+        self.stall_sec = 0.0
+
+    def prefetch(self, case_dir, busy_cores):
+        """Start building `case_dir` on the CPUs not in `busy_cores` (the running taskset's cores)."""
+        if case_dir is None:
+            return
+        busy = set(busy_cores)
+        free = [c for c in self.all_cpus if c not in busy]
+        if not free:
+            self.deferred += 1
+            return
+        self._pending[Path(case_dir)] = self._pool.submit(self.cache.build, case_dir, cpus=free)
+
+    def wait(self, case_dir):
+        """Return (ok, compiler_output) for `case_dir`, building it now if it was not prefetched."""
+        fut = self._pending.pop(Path(case_dir), None)
+        self.builds += 1
+        if fut is not None and fut.done():
+            self.hidden += 1
+            ok, out, _ = fut.result()
+            return ok, out
+
+        self.stalls += 1
+        t0 = time.monotonic()
+        if fut is not None:
+            ok, out, _ = fut.result()
+        else:
+            # nothing is being measured right now: use every CPU
+            ok, out, _ = self.cache.build(case_dir)
+        self.stall_sec += time.monotonic() - t0
+        return ok, out
+
+    def close(self):
+        self._pool.shutdown(wait=True)
+
+    def report(self):
+        rate = (100.0 * self.stalls / self.builds) if self.builds else 0.0
+        print(f"[PIPELINE] builds={self.builds} hidden={self.hidden} stalls={self.stalls} "
+              f"({rate:.1f}%, of which no free CPU={self.deferred}) stall_time={self.stall_sec:.2f}s")
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""
+Adaptive refinement of the (Cr, contention) grid of benchmark_tool3.
+
+Each M starts from the coarse --step grid, seen as square cells between neighbouring
+points. After a level has been measured, every cell whose corners disagree too much
+(miss rate spread in percentage points, or delay mean spread relative to its mean) is
+split in four: its edge midpoints and centre become the points of the next level.
+Splitting stops at `min_step`, and the most contrasted cells are split first when the
+point budget is limited.
+"""
+
+import math
+
+_EPS = 1e-9
+
+
+def frac_key(x: float):
+    """Canonical grid coordinate (midpoints of 2-decimal values need more digits)."""
+    return round(x, 6)
+
+
+class GridRefiner:
+    def __init__(self, frac_vals, min_step: float, miss_tol: float, delay_tol: float):
+        self.frac_vals = [frac_key(v) for v in frac_vals]
+        self.min_step = min_step
+        self.miss_tol = miss_tol
+        self.delay_tol = delay_tol
+        self.results = {}   # (M, Cr, cont) -> (delay_mean, miss_mean)
+        self._cells = []    # (M, x0, y0, h, level) waiting for their corners to be measured
+        self._known = set()
+
+    def initial(self, Ms):
+        """Level-0 points (M, Cr, cont, level) and their cells."""
+        pts = []
+        for M in Ms:
+            for Cr in self.frac_vals:
+                for cont in self.frac_vals:
+                    pts.append((M, Cr, cont, 0))
+                    self._known.add((M, Cr, cont))
+            for a, b in zip(self.frac_vals, self.frac_vals[1:]):
+                for c, d in zip(self.frac_vals, self.frac_vals[1:]):
+                    # the coarse grid is uniform, so b - a == d - c
+                    self._cells.append((M, a, c, frac_key(b - a), 0))
+        return pts
+
+    def record(self, M, Cr, cont, delay_mean, miss_mean):
+        self.results[(M, frac_key(Cr), frac_key(cont))] = (delay_mean, miss_mean)
+
+    def _score(self, M, x0, y0, h):
+        corners = [(M, x0, y0), (M, frac_key(x0 + h), y0),
+                   (M, x0, frac_key(y0 + h)), (M, frac_key(x0 + h), frac_key(y0 + h))]
+        vals = [self.results.get(k) for k in corners]
+        if any(v is None for v in vals):
+            return 0.0
+        score = 0.0
+        misses = [m for _, m in vals if not math.isnan(m)]
+        if len(misses) == 4:
+            score = max(score, (max(misses) - min(misses)) / self.miss_tol)
+        delays = [d for d, _ in vals if not math.isnan(d)]
+        if len(delays) == 4:
+            mean = sum(delays) / 4.0
+            if mean > 0:
+                score = max(score, (max(delays) - min(delays)) / mean / self.delay_tol)
+        return score
+
+    def next_level(self, budget=None):
+        """
+        Split the contrasted cells measured so far; returns the new points
+        (M, Cr, cont, level), at most `budget` of them (None = unlimited).
+        """
+        ranked = []
+        for cell in self._cells:
+            M, x0, y0, h, level = cell
+            if h / 2.0 + _EPS < self.min_step:
+                continue
+            score = self._score(M, x0, y0, h)
+            if score > 1.0:
+                ranked.append((score, cell))
+        ranked.sort(key=lambda sc: -sc[0])
+
+        self._cells = []
+        new_pts = []
+        for _, (M, x0, y0, h, level) in ranked:
+            hh = frac_key(h / 2.0)
+            xm, ym = frac_key(x0 + hh), frac_key(y0 + hh)
+            x1, y1 = frac_key(x0 + h), frac_key(y0 + h)
+            fresh = [p for p in ((xm, y0), (x0, ym), (xm, ym), (x1, ym), (xm, y1))
+                     if (M, *p) not in self._known]
+            if budget is not None and len(new_pts) + len(fresh) > budget:
+                continue
+            for Cr, cont in fresh:
+                self._known.add((M, Cr, cont))
+                new_pts.append((M, Cr, cont, level + 1))
+            self._cells.extend([(M, x0, y0, hh, level + 1), (M, xm, y0, hh, level + 1),
+                                (M, x0, ym, hh, level + 1), (M, xm, ym, hh, level + 1)])
+        return new_pts
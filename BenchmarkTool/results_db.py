@@ -0,0 +1,429 @@
+# -*- coding: utf-8 -*-
+"""
+Single-file SQLite results store for benchmark_tool3/4/5 (<out>/results.sqlite).
+
+Tables:
+    meta         key -> value (tool name, command line of the campaign)
+    cases        one parameter point: case_id, M, N, Cr, contention, level, util (target utilization
+                 of the --util campaigns, total over the M cores; NULL: period = 10 * wcet),
+                 partition (task-to-core strategy, generator3.PARTITIONERS; NULL: round-robin)
+    runs         one measurement of a case: (case_id, run_idx) primary key, status,
+                 delay_mean, miss_rate, misses, jobs, duration_s, stop reason, case directory
+    task_stats   per-task aggregates of a run from the SUMMARY record (n, misses, mean, var, min, max)
+    core_stats   the same per core (the record's "cores")
+    core_loads   per-core load of the generated taskset of a run: tasks, utilization (wcet / period)
+                 and shared utilization (contended shared fragments / period), generator3.core_loads
+    task_counters per-task perf / getrusage counters of a run (--counters): total, per-job mean and
+                 max of each counter, and where it came from (perf, rusage, none)
+    fragment_stats per-task, per-fragment calls / time sum / max / histogram of a run (--fragment-stats;
+                 hist is the sparse JSON [[bin, count], ...] of run_summary.frag_bin_edges)
+    predictions  response-time analysis of a case (--prune, Generator/rta.py): schedulable, max R/T,
+                 delay-ratio bound, max blocking (us), whether the measurement was skipped
+    stage_times  seconds spent per stage ("generate", "build", "run", "simulate") of a run
+
+Rows are buffered and written in batched transactions (every `batch` rows or `flush_sec`
+seconds, and on close), so a crash loses at most one batch, which is simply re-measured
+on resume. Resume looks up (case_id, run_idx) in the runs primary key; the completed
+keys are loaded once when the store is opened. The per-case CSV files are exports of
+views (cases_csv, runs_csv, cores_csv) and can be regenerated at any time with export_csv().
+
+Shards of one campaign (--shard i/n) use disjoint case_ids and can be combined:
+    python results_db.py merge all.sqlite shard0/results.sqlite shard1/results.sqlite --csv cases.csv
+"""
+
+import argparse
+import csv
+import json
+import math
+import sqlite3
+import time
+from pathlib import Path
+
+from run_summary import fragment_stats, task_counters
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS cases (
+    case_id    INTEGER PRIMARY KEY,
+    M          INTEGER NOT NULL,
+    N          INTEGER NOT NULL,
+    Cr         REAL    NOT NULL,
+    contention REAL    NOT NULL,
+    level      INTEGER NOT NULL DEFAULT 0,
+    util       REAL,
+    partition  TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_cases_point ON cases (M, N, Cr, contention);
+CREATE TABLE IF NOT EXISTS runs (
+    case_id    INTEGER NOT NULL,
+    run_idx    INTEGER NOT NULL,
+    status     TEXT    NOT NULL,
+    delay_mean REAL,
+    miss_rate  REAL,
+    misses     INTEGER,
+    jobs       INTEGER,
+    duration_s REAL,
+    stop       TEXT,
+    dir        TEXT,
+    PRIMARY KEY (case_id, run_idx)
+);
+CREATE TABLE IF NOT EXISTS task_stats (
+    case_id INTEGER NOT NULL,
+    run_idx INTEGER NOT NULL,
+    task_id INTEGER NOT NULL,
+    n       INTEGER,
+    misses  INTEGER,
+    mean    REAL,
+    var     REAL,
+    min     REAL,
+    max     REAL,
+    PRIMARY KEY (case_id, run_idx, task_id)
+);
+CREATE TABLE IF NOT EXISTS core_stats (
+    case_id INTEGER NOT NULL,
+    run_idx INTEGER NOT NULL,
+    core    INTEGER NOT NULL,
+    n       INTEGER,
+    misses  INTEGER,
+    mean    REAL,
+    var     REAL,
+    min     REAL,
+    max     REAL,
+    PRIMARY KEY (case_id, run_idx, core)
+);
+CREATE TABLE IF NOT EXISTS core_loads (
+    case_id     INTEGER NOT NULL,
+    run_idx     INTEGER NOT NULL,
+    core        INTEGER NOT NULL,
+    tasks       INTEGER NOT NULL,
+    util        REAL    NOT NULL,
+    shared_util REAL    NOT NULL,
+    PRIMARY KEY (case_id, run_idx, core)
+);
+CREATE TABLE IF NOT EXISTS task_counters (
+    case_id      INTEGER NOT NULL,
+    run_idx      INTEGER NOT NULL,
+    task_id      INTEGER NOT NULL,
+    counter      TEXT    NOT NULL,
+    source       TEXT    NOT NULL,
+    total        INTEGER,
+    per_job_mean REAL,
+    per_job_max  INTEGER,
+    PRIMARY KEY (case_id, run_idx, task_id, counter)
+);
+CREATE TABLE IF NOT EXISTS fragment_stats (
+    case_id  INTEGER NOT NULL,
+    run_idx  INTEGER NOT NULL,
+    task_id  INTEGER NOT NULL,
+    fragment TEXT    NOT NULL,
+    calls    INTEGER NOT NULL,
+    sum_ns   INTEGER NOT NULL,
+    max_ns   INTEGER NOT NULL,
+    hist     TEXT,
+    PRIMARY KEY (case_id, run_idx, task_id, fragment)
+);
+CREATE TABLE IF NOT EXISTS predictions (
+    case_id     INTEGER PRIMARY KEY,
+    schedulable INTEGER NOT NULL,
+    rt_ratio    REAL,
+    delay_bound REAL,
+    blocking_us REAL,
+    pruned      INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS stage_times (
+    case_id INTEGER NOT NULL,
+    run_idx INTEGER NOT NULL,
+    stage   TEXT    NOT NULL,
+    seconds REAL    NOT NULL,
+    PRIMARY KEY (case_id, run_idx, stage)
+);
+"""
+
+# columns added after the first version: (table, column, type), added to older stores on open
+ADDED_COLUMNS = (("cases", "util", "REAL"), ("cases", "partition", "TEXT"))
+
+# views are recreated on every open, so stores of older versions get the current columns
+VIEWS = """
+DROP VIEW IF EXISTS runs_csv;
+CREATE VIEW runs_csv AS
+    SELECT c.case_id, r.run_idx, c.M, c.N, c.Cr, c.contention, c.util, c.partition, c.level,
+           r.status, r.delay_mean, r.miss_rate AS miss_rate_percent, r.misses, r.jobs,
+           r.duration_s, r.stop, r.dir
+    FROM runs r JOIN cases c USING (case_id)
+    ORDER BY c.case_id, r.run_idx;
+DROP VIEW IF EXISTS cases_csv;
+CREATE VIEW cases_csv AS
+    SELECT c.case_id, c.M, c.N, c.Cr, c.contention, c.util, c.partition,
+           (SELECT MAX(l.util) FROM core_loads l WHERE l.case_id = c.case_id AND l.run_idx = 0) AS core_util_max,
+           r.delay_mean, r.miss_rate AS miss_rate_percent, r.misses, r.jobs, r.duration_s
+    FROM cases c JOIN runs r ON r.case_id = c.case_id AND r.run_idx = 0
+    ORDER BY c.case_id;
+DROP VIEW IF EXISTS cores_csv;
+CREATE VIEW cores_csv AS
+    SELECT c.case_id, l.run_idx, c.M, c.N, c.Cr, c.contention, c.util, c.partition,
+           l.core, l.tasks, l.util AS core_util, l.shared_util,
+           s.mean AS delay_mean, 100.0 * s.misses / s.n AS miss_rate_percent, s.misses, s.n AS jobs
+    FROM core_loads l JOIN cases c USING (case_id)
+         LEFT JOIN core_stats s ON s.case_id = l.case_id AND s.run_idx = l.run_idx AND s.core = l.core
+    ORDER BY l.case_id, l.run_idx, l.core;
+DROP VIEW IF EXISTS counters_csv;
+CREATE VIEW counters_csv AS
+    SELECT c.case_id, r.run_idx, c.M, c.N, c.Cr, c.contention, c.util,
+           r.delay_mean, r.miss_rate AS miss_rate_percent, r.jobs,
+           SUM(CASE WHEN k.counter = 'cycles'           THEN k.total END) * 1.0 / r.jobs AS cycles_per_job,
+           SUM(CASE WHEN k.counter = 'instructions'     THEN k.total END) * 1.0 / r.jobs AS instructions_per_job,
+           SUM(CASE WHEN k.counter = 'llc_misses'       THEN k.total END) * 1.0 / r.jobs AS llc_misses_per_job,
+           SUM(CASE WHEN k.counter = 'context_switches' THEN k.total END) * 1.0 / r.jobs AS context_switches_per_job,
+           SUM(CASE WHEN k.counter = 'page_faults'      THEN k.total END) * 1.0 / r.jobs AS page_faults_per_job
+    FROM runs r JOIN cases c USING (case_id)
+         JOIN task_counters k ON k.case_id = r.case_id AND k.run_idx = r.run_idx
+    GROUP BY r.case_id, r.run_idx
+    ORDER BY c.case_id, r.run_idx;
+DROP VIEW IF EXISTS predictions_csv;
+CREATE VIEW predictions_csv AS
+    SELECT c.case_id, c.M, c.N, c.Cr, c.contention, c.util,
+           p.schedulable, p.rt_ratio, p.delay_bound, p.blocking_us, p.pruned,
+           r.status, r.delay_mean, r.miss_rate AS miss_rate_percent, r.misses, r.jobs
+    FROM predictions p JOIN cases c USING (case_id)
+         LEFT JOIN runs r ON r.case_id = p.case_id AND r.run_idx = 0
+    ORDER BY c.case_id;
+"""
+
+TABLES = ("cases", "runs", "task_stats", "core_stats", "core_loads", "task_counters", "fragment_stats",
+          "predictions", "stage_times")
+
+OK = "ok"
+
+
+def _columns(conn, table, schema="main"):
+    return [r[1] for r in conn.execute(f"PRAGMA {schema}.table_info({table})")]
+
+
+def _num(x):
+    """float/int for the database; NaN and None become NULL."""
+    if x is None or (isinstance(x, float) and math.isnan(x)):
+        return None
+    return x
+
+
+def _point_key(M, N, Cr, cont, util=None, partition=None):
+    # partition NULL: stores written before --partition, i.e. round-robin
+    return (M, N, round(Cr, 6), round(cont, 6), None if util is None else round(util, 6), partition or "rr")
+
+
+class ResultsDB:
+    def __init__(self, path: Path, fresh: bool = False, batch: int = 256, flush_sec: float = 5.0):
+        """
+        Open (or create) the store at `path`. fresh=True deletes the results of a previous
+        campaign in the same file (a normal run); fresh=False keeps them for resume.
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(self.path))
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        for table, column, kind in ADDED_COLUMNS:
+            if column not in _columns(self.conn, table):
+                # store of an older version
+                self.conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {kind}")
+        self.conn.executescript(VIEWS)
+        if fresh:
+            with self.conn:
+                for table in TABLES:
+                    self.conn.execute(f"DELETE FROM {table}")
+
+        self.batch = max(1, batch)
+        self.flush_sec = flush_sec
+        self._pending = {table: [] for table in TABLES}
+        self._n_pending = 0
+        self._last_flush = time.monotonic()
+
+        self._done = set(self.conn.execute("SELECT case_id, run_idx FROM runs WHERE status = ?", (OK,)))
+        self._points = {}
+        self._next_case = 0
+        for case_id, M, N, Cr, cont, util, partition in self.conn.execute(
+                "SELECT case_id, M, N, Cr, contention, util, partition FROM cases"):
+            self._points[_point_key(M, N, Cr, cont, util, partition)] = case_id
+            self._next_case = max(self._next_case, case_id + 1)
+
+    # ---------------- writing ----------------
+    def set_meta(self, **items):
+        with self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                                  [(k, str(v)) for k, v in items.items()])
+
+    def meta_conflicts(self, defaults=None, **items):
+        """
+        Campaign options of `items` whose stored meta value differs: [(key, stored, current)].
+        Keys missing from the store compare against `defaults` (the value older versions
+        implied) and are skipped when not listed there; an empty store has no conflicts.
+        """
+        self.flush()
+        stored = dict(self.conn.execute("SELECT key, value FROM meta"))
+        if not stored:
+            return []
+        defaults = defaults or {}
+        out = []
+        for key, val in items.items():
+            if key in stored:
+                old = stored[key]
+            elif key in defaults:
+                old = str(defaults[key])
+            else:
+                continue
+            if old != str(val):
+                out.append((key, old, str(val)))
+        return out
+
+    def add_case(self, case_id, M, N, Cr, cont, level: int = 0, util=None, partition=None):
+        """Register case `case_id` (tool4/5 number their cases themselves)."""
+        self._points.setdefault(_point_key(M, N, Cr, cont, util, partition), case_id)
+        self._next_case = max(self._next_case, case_id + 1)
+        self._queue("cases", (case_id, M, N, Cr, cont, level, _num(util), partition))
+
+    def point_id(self, M, N, Cr, cont, level: int = 0, util=None, partition=None):
+        """case_id of the grid point (M, N, Cr, cont[, util], partition), registering it on first use (tool3)."""
+        case_id = self._points.get(_point_key(M, N, Cr, cont, util, partition))
+        if case_id is None:
+            case_id = self._next_case
+            self.add_case(case_id, M, N, Cr, cont, level, util, partition)
+        return case_id
+
+    def add_core_loads(self, case_id, run_idx, loads):
+        """Per-core load of the generated taskset of a run (generator3.core_loads rows)."""
+        for row in loads:
+            self._queue("core_loads", (case_id, run_idx, int(row["core"]), int(row["tasks"]),
+                                       float(row["util"]), float(row["shared_util"])))
+
+    def add_run(self, case_id, run_idx, status, delay_mean=None, miss_rate=None, misses=None,
+                jobs=None, duration_s=None, stop=None, case_dir=None, summary=None):
+        """One measurement; `summary` (parsed SUMMARY record) adds its per-task / per-core aggregates,
+        counters and fragment stats."""
+        self._queue("runs", (case_id, run_idx, status, _num(delay_mean), _num(miss_rate), misses, jobs,
+                             _num(duration_s), stop, None if case_dir is None else str(case_dir)))
+        if summary is not None:
+            for table, key in (("task_stats", "tasks"), ("core_stats", "cores")):
+                for t in summary.get(key, []):
+                    self._queue(table, (case_id, run_idx, int(t["id"]), int(t["n"]), int(t["misses"]),
+                                        _num(t.get("mean")), _num(t.get("var")),
+                                        _num(t.get("min")), _num(t.get("max"))))
+            for row in task_counters(summary):
+                self._queue("task_counters", (case_id, run_idx, *row))
+            for task_id, frag, calls, sum_ns, max_ns, hist in fragment_stats(summary):
+                self._queue("fragment_stats", (case_id, run_idx, task_id, frag, calls, sum_ns, max_ns,
+                                               json.dumps(hist, separators=(",", ":"))))
+        if status == OK:
+            self._done.add((case_id, run_idx))
+        else:
+            self._done.discard((case_id, run_idx))
+
+    def add_prediction(self, case_id, schedulable, rt_ratio, delay_bound, blocking_us, pruned=False):
+        self._queue("predictions", (case_id, int(bool(schedulable)), _num(rt_ratio), _num(delay_bound),
+                                    _num(blocking_us), int(bool(pruned))))
+
+    def add_stage(self, case_id, run_idx, stage: str, seconds: float):
+        self._queue("stage_times", (case_id, run_idx, stage, seconds))
+
+    def _queue(self, table, row):
+        self._pending[table].append(row)
+        self._n_pending += 1
+        if self._n_pending >= self.batch or time.monotonic() - self._last_flush >= self.flush_sec:
+            self.flush()
+
+    def flush(self):
+        """Write every buffered row in one transaction."""
+        if self._n_pending:
+            with self.conn:
+                for table, rows in self._pending.items():
+                    if rows:
+                        marks = ", ".join("?" * len(rows[0]))
+                        self.conn.executemany(f"INSERT OR REPLACE INTO {table} VALUES ({marks})", rows)
+                        rows.clear()
+            self._n_pending = 0
+        self._last_flush = time.monotonic()
+
+    def close(self):
+        self.flush()
+        self.conn.close()
+
+    # ---------------- reading ----------------
+    def is_done(self, case_id, run_idx: int = 0):
+        """True if (case_id, run_idx) already has a successful run (resume)."""
+        return (case_id, run_idx) in self._done
+
+    def get_run(self, case_id, run_idx: int = 0):
+        """(delay_mean, miss_rate, misses, jobs, duration_s) of a stored run (NULL -> nan / None)."""
+        self.flush()
+        row = self.conn.execute(
+            "SELECT delay_mean, miss_rate, misses, jobs, duration_s FROM runs WHERE case_id = ? AND run_idx = ?",
+            (case_id, run_idx)).fetchone()
+        if row is None:
+            return None
+        dmean, miss, misses, jobs, duration = row
+        return (float("nan") if dmean is None else dmean, float("nan") if miss is None else miss,
+                misses, jobs, duration)
+
+    def query(self, sql, params=()):
+        self.flush()
+        return self.conn.execute(sql, params).fetchall()
+
+    def export_csv(self, view: str, path: Path, formats=None):
+        """
+        Write a table or view to CSV. `formats` maps column -> format spec (e.g. ".9f");
+        NULL is written as an empty field.
+        """
+        self.flush()
+        formats = formats or {}
+        cur = self.conn.execute(f"SELECT * FROM {view}")
+        cols = [d[0] for d in cur.description]
+        specs = [formats.get(c) for c in cols]
+        with open(path, "w", newline="") as f:
+            w = csv.writer(f)
+            w.writerow(cols)
+            for row in cur:
+                w.writerow(["" if v is None else (format(v, s) if s else v) for v, s in zip(row, specs)])
+
+
+def merge(dst: Path, srcs):
+    """Copy every row of the stores `srcs` into `dst` (later sources win on equal keys)."""
+    db = ResultsDB(dst)
+    for i, src in enumerate(srcs):
+        db.conn.execute("ATTACH DATABASE ? AS src", (str(src),))
+        have = {r[0] for r in db.conn.execute("SELECT name FROM src.sqlite_master WHERE type = 'table'")}
+        with db.conn:
+            for table in TABLES:
+                if table in have:   # stores written before a table existed
+                    # columns both stores have (older stores lack e.g. cases.util)
+                    src_cols = set(_columns(db.conn, table, "src"))
+                    cols = ", ".join(c for c in _columns(db.conn, table) if c in src_cols)
+                    db.conn.execute(f"INSERT OR REPLACE INTO main.{table} ({cols}) SELECT {cols} FROM src.{table}")
+            if i == 0:
+                db.conn.execute("INSERT OR REPLACE INTO main.meta SELECT * FROM src.meta")
+        db.conn.execute("DETACH DATABASE src")
+        print(f"[MERGE] {src}")
+    return db
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Results store utilities")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    mp = sub.add_parser("merge", help="combine the stores of several shards")
+    mp.add_argument("dst", type=Path)
+    mp.add_argument("srcs", type=Path, nargs="+")
+    mp.add_argument("--csv", type=Path, default=None, help="also export the cases_csv view")
+    args = ap.parse_args()
+
+    db = merge(args.dst, args.srcs)
+    if args.csv is not None:
+        db.export_csv("cases_csv", args.csv)
+    n_cases, n_ok = db.query("SELECT COUNT(*), SUM(status = ?) FROM runs", (OK,))[0]
+    print(f"[MERGED] {args.dst}: {n_cases} runs ({n_ok or 0} ok)")
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
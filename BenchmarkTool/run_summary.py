@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""
+Parser for the SUMMARY record printed by generated tasksets / the runner (render option
+stats=True, see generator3.DEFAULT_OPTIONS).
+
+The record is a single stdout line "SUMMARY " + JSON:
+    {"version": 1, "duration_s": .., "stop": "fixed|converged|max",
+     "hist": {"lo_exp": .., "sub": .., "octaves": ..},
+     "global": S, "cores": [S, ...], "tasks": [S, ...]}
+with S = {"id", "n", "misses", "mean", "var", "min", "max", "hist": [[bin, count], ...]}
+(var is the sample variance of delay_ratio; hist is sparse).
+
+With render option counters=True the record also carries
+    "counters": {"names": ["cycles", "instructions", "llc_misses", "context_switches", "page_faults"],
+                 "tasks": [{"id", "jobs", "source": [..], "total": [..], "max": [..]}, ...]}
+where total / max are the sum / maximum of the per-job deltas of each counter, source is
+"perf", "rusage" (getrusage fallback) or "none" (unavailable; total and max are null).
+
+With render option fragstats=True it carries
+    "fragments": {"names": [fragment, ...], "hist": "log4_ns",
+                  "tasks": [{"id", "f": [[fragment_idx, calls, sum_ns, max_ns, [[bin, count], ...]], ...]}, ...]}
+(per-task execution time of every fragment called; bins see frag_bin_edges).
+"""
+
+import json
+import math
+import re
+
+import numpy as np
+
+SUMMARY_PREFIX = "SUMMARY "
+
+
+def parse_summary(stdout_text: str):
+    """Last SUMMARY record in stdout_text as a dict, or None if there is none."""
+    if not stdout_text:
+        return None
+    for line in reversed(stdout_text.splitlines()):
+        if line.startswith(SUMMARY_PREFIX):
+            try:
+                return json.loads(line[len(SUMMARY_PREFIX):])
+            except ValueError:
+                return None
+    return None
+
+
+def delay_and_miss(summary):
+    """(delay_mean, miss_rate_percent, misses, jobs) over all jobs of the run."""
+    g = summary["global"]
+    n = int(g["n"])
+    if n == 0:
+        return float("nan"), float("nan"), 0, 0
+    misses = int(g["misses"])
+    return float(g["mean"]), 100.0 * misses / n, misses, n
+
+
+def hist_edges(summary):
+    """
+    Bin edges of the log-linear histogram, length HIST_BINS + 1:
+    bin 0 is (0, 2^lo_exp), the last bin is [2^(lo_exp+octaves), inf).
+    """
+    h = summary["hist"]
+    lo, sub, octv = int(h["lo_exp"]), int(h["sub"]), int(h["octaves"])
+    inner = [2.0 ** (lo + o) * (1.0 + j / sub) for o in range(octv) for j in range(sub)]
+    inner.append(2.0 ** (lo + octv))
+    return np.array([0.0] + inner + [math.inf])
+
+
+def dense_hist(stats, nbins):
+    """Sparse [[bin, count], ...] of one stats object -> dense count array."""
+    out = np.zeros(nbins, dtype=np.int64)
+    for b, c in stats["hist"]:
+        out[int(b)] += int(c)
+    return out
+
+
+def task_counters(summary):
+    """
+    Per-task counter rows (task_id, counter, source, total, per_job_mean, per_job_max);
+    empty if the run had no counters. Unavailable counters have None values.
+    """
+    ctr = (summary or {}).get("counters")
+    if not ctr:
+        return []
+    rows = []
+    for t in ctr["tasks"]:
+        jobs = int(t["jobs"])
+        for name, src, total, mx in zip(ctr["names"], t["source"], t["total"], t["max"]):
+            mean = None if total is None or jobs == 0 else total / jobs
+            rows.append((int(t["id"]), name, src, total, mean, mx))
+    return rows
+
+
+FRAG_HIST_BINS = 128
+
+
+def frag_bin_edges():
+    """
+    Edges (ns) of the per-fragment histogram ("log4_ns"), length FRAG_HIST_BINS + 1:
+    bins 0..3 are 0..3 ns, bin b >= 4 is [(4 + b%4) << (b//4 - 1), (5 + b%4) << (b//4 - 1)).
+    """
+    lo = [float(b) for b in range(4)] + [float((4 + b % 4) << (b // 4 - 1)) for b in range(4, FRAG_HIST_BINS)]
+    return np.array(lo + [math.inf])
+
+
+def fragment_stats(summary):
+    """
+    Per-task fragment rows (task_id, fragment, calls, sum_ns, max_ns, hist) with hist the
+    sparse [[bin, count], ...] list; empty if the run had no fragment statistics.
+    """
+    fr = (summary or {}).get("fragments")
+    if not fr:
+        return []
+    names = fr["names"]
+    return [(int(t["id"]), names[int(k)], int(n), int(total), int(mx), hist)
+            for t in fr["tasks"] for k, n, total, mx, hist in t["f"]]
+
+
+_duration_re = re.compile(r"Run\s+duration:\s*([0-9]*\.?[0-9]+)\s*s")
+
+
+def parse_duration(stdout_text: str):
+    """Measured run length in seconds (adaptive runs stop early), or None if not reported."""
+    summary = parse_summary(stdout_text)
+    if summary is not None and "duration_s" in summary:
+        return float(summary["duration_s"])
+    m = _duration_re.search(stdout_text or "")
+    return float(m.group(1)) if m else None
@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+"""
+Case samplers for the random campaigns of benchmark_tool4/5.
+
+A sampler proposes the (M, N, Cr, contention) of the next case and is told the measured
+miss rate of every finished case:
+
+    s = make_sampler("boundary", M=16, N=None, decimals=2, seed=12345)
+    M, N, Cr, cont = s.propose()
+    ...
+    s.observe(M, Cr, cont, miss_rate_percent)
+
+- "uniform": M uniform in [1, M] (or fixed), Cr / contention uniform, so the per-case
+  statistics stay unbiased. propose(rng) draws from the case's own generator (see
+  case_rng); propose() draws from the `random` module exactly as the tools always did.
+- "boundary": active learning. A logistic surrogate (quadratic features of M, Cr, cont)
+  of P(miss rate > boundary) is refitted every `batch` observations; each proposal is the
+  candidate, out of `candidates` uniform draws, where the surrogate is least certain
+  (p closest to 0.5), kept `min_dist` away from the still-pending proposals. A fraction
+  `explore` of the proposals, and everything before `warmup` observations (or while only
+  one class has been seen), stays uniform. Statistics over such a campaign are biased
+  towards the boundary by design. Its proposals depend on every earlier result, so it
+  cannot be sharded.
+
+case_rng(seed, case_id) is the counter-based stream of one case: a Philox generator keyed
+by (seed, case_id). Case k can be generated without generating cases 0..k-1, so shards
+(--shard i/n) and parallel runs produce exactly the cases of a serial run.
+"""
+
+import random
+
+import numpy as np
+
+SAMPLERS = ("uniform", "boundary")
+RNG_MODES = ("philox", "legacy")
+
+
+def case_rng(seed: int, case_id: int, stream: int = 0):
+    """
+    numpy Generator of case `case_id`: Philox with the 128-bit key (case_id, seed).
+    stream > 0 starts the counter in a disjoint block, for draws that must not disturb
+    (or correlate with) the case's own stream, e.g. the --prune sample decision.
+    """
+    key = (int(case_id) << 64) | (int(seed) & 0xFFFFFFFFFFFFFFFF)
+    if stream:
+        return np.random.Generator(np.random.Philox(key=key, counter=[0, 0, 0, int(stream)]))
+    return np.random.Generator(np.random.Philox(key=key))
+
+
+def parse_shard(text: str):
+    """"i/n" -> (i, n) with 0 <= i < n; raises ValueError otherwise."""
+    i, sep, n = text.partition("/")
+    if not sep:
+        raise ValueError(f"shard must look like i/n: {text!r}")
+    i, n = int(i), int(n)
+    if n < 1 or not 0 <= i < n:
+        raise ValueError(f"shard index out of range: {text!r}")
+    return i, n
+
+
+class UniformSampler:
+    name = "uniform"
+
+    def __init__(self, M, N=None, decimals: int = 2):
+        """M: int (fixed, no draw) or (lo, hi) drawn with random.randint for every case."""
+        self.M = M
+        self.N = N
+        self.decimals = decimals
+
+    def _draw_M(self, rng=None):
+        if not isinstance(self.M, tuple):
+            return self.M
+        return random.randint(*self.M) if rng is None else int(rng.integers(self.M[0], self.M[1] + 1))
+
+    def propose(self, rng=None):
+        """rng: the case's own Generator (case_rng); None = the global `random` stream."""
+        M = self._draw_M(rng)
+        N = self.N if self.N is not None else M
+        draw = random.random if rng is None else rng.random
+        Cr = round(float(draw()), self.decimals)
+        cont = round(float(draw()), self.decimals)
+        return M, N, Cr, cont
+
+    def observe(self, M, Cr, cont, miss_rate):
+        pass
+
+
+def _features(M, Cr, cont, M_lo, M_hi):
+    m = (np.asarray(M, dtype=float) - M_lo) / max(1, M_hi - M_lo)
+    cr = np.asarray(Cr, dtype=float)
+    ct = np.asarray(cont, dtype=float)
+    one = np.ones_like(cr)
+    return np.stack([one, m, cr, ct, m * cr, m * ct, cr * ct, m * m, cr * cr, ct * ct], axis=-1)
+
+
+def _fit_logistic(X, y, l2: float = 1e-2, iters: int = 30):
+    """Ridge-regularised logistic regression by Newton / IRLS."""
+    w = np.zeros(X.shape[1])
+    reg = l2 * np.eye(X.shape[1])
+    reg[0, 0] = 0.0
+    for _ in range(iters):
+        p = 1.0 / (1.0 + np.exp(-np.clip(X @ w, -30, 30)))
+        H = X.T @ (X * (p * (1.0 - p))[:, None]) + reg
+        g = X.T @ (p - y) + reg @ w
+        step = np.linalg.solve(H + 1e-9 * np.eye(len(w)), g)
+        w -= step
+        if np.max(np.abs(step)) < 1e-6:
+            break
+    return w
+
+
+class BoundarySampler(UniformSampler):
+    name = "boundary"
+
+    def __init__(self, M, N=None, decimals: int = 2, seed: int = 0, boundary: float = 1.0,
+                 batch: int = 16, warmup: int = 32, explore: float = 0.2,
+                 candidates: int = 512, min_dist: float = 0.05):
+        super().__init__(M, N, decimals)
+        self.M_lo, self.M_hi = M if isinstance(M, tuple) else (M, M)
+        self.rng = np.random.default_rng(seed)
+        self.boundary = boundary
+        self.batch = max(1, batch)
+        self.warmup = warmup
+        self.explore = explore
+        self.candidates = candidates
+        self.min_dist = min_dist
+
+        self._obs = []        # (M, Cr, cont, label)
+        self._pending = []    # proposals not observed yet (features)
+        self._w = None
+        self._since_fit = 0
+
+    def _uniform(self):
+        M = int(self.rng.integers(self.M_lo, self.M_hi + 1))
+        return M, round(float(self.rng.random()), self.decimals), round(float(self.rng.random()), self.decimals)
+
+    def propose(self, rng=None):
+        # proposals come from the sampler's own generator; `rng` is not used
+        if self._w is None or self.rng.random() < self.explore:
+            M, Cr, cont = self._uniform()
+        else:
+            M, Cr, cont = self._most_uncertain()
+        self._pending.append(np.array([(M - self.M_lo) / max(1, self.M_hi - self.M_lo), Cr, cont]))
+        N = self.N if self.N is not None else M
+        return M, N, Cr, cont
+
+    def _most_uncertain(self):
+        k = self.candidates
+        Ms = self.rng.integers(self.M_lo, self.M_hi + 1, size=k)
+        Crs = np.round(self.rng.random(k), self.decimals)
+        conts = np.round(self.rng.random(k), self.decimals)
+        p = 1.0 / (1.0 + np.exp(-np.clip(_features(Ms, Crs, conts, self.M_lo, self.M_hi) @ self._w, -30, 30)))
+        order = np.argsort(np.abs(p - 0.5))
+        if self._pending:
+            pend = np.array(self._pending[-4 * self.batch:])
+            pts = np.stack([(Ms - self.M_lo) / max(1, self.M_hi - self.M_lo), Crs, conts], axis=1)
+            for j in order:
+                if np.min(np.linalg.norm(pend - pts[j], axis=1)) >= self.min_dist:
+                    return int(Ms[j]), float(Crs[j]), float(conts[j])
+        j = order[0]
+        return int(Ms[j]), float(Crs[j]), float(conts[j])
+
+    def observe(self, M, Cr, cont, miss_rate):
+        if self._pending:
+            self._pending.pop(0)
+        if miss_rate is None or miss_rate != miss_rate:   # NaN: failed case
+            return
+        self._obs.append((M, Cr, cont, 1.0 if miss_rate > self.boundary else 0.0))
+        self._since_fit += 1
+        if len(self._obs) >= self.warmup and self._since_fit >= self.batch:
+            self._refit()
+
+    def _refit(self):
+        self._since_fit = 0
+        obs = np.array(self._obs)
+        y = obs[:, 3]
+        if y.min() == y.max():
+            self._w = None     # one class only: keep exploring uniformly
+            return
+        self._w = _fit_logistic(_features(obs[:, 0], obs[:, 1], obs[:, 2], self.M_lo, self.M_hi), y)
+
+
+def make_sampler(kind: str, M, N=None, decimals: int = 2, seed: int = 0, **opts):
+    """`opts` are BoundarySampler options; the uniform sampler ignores them."""
+    if kind == "uniform":
+        return UniformSampler(M, N, decimals)
+    if kind == "boundary":
+        return BoundarySampler(M, N, decimals, seed=seed, **opts)
+    raise ValueError(f"unknown sampler: {kind}")
@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+"""
+Reader for the per-fragment event traces of generated tasksets / the runner (render
+option trace=N, --trace N in benchmark_tool3/4/5) and converter to Chrome trace JSON,
+which chrome://tracing and ui.perfetto.dev open directly.
+
+Binary format (task_<id>_trace.bin), little endian:
+    header  TraceHeader  magic "TTRC", u32 version, u32 entry_size, i32 task_id, i32 core_id,
+                         u32 capacity, u64 count, u64 overwritten
+    body    count x TraceEvent  i64 start_ns, i64 end_ns, u32 job, u32 pos   (oldest first)
+
+Times are ns relative to the release of the first job; pos is the position of the fragment
+in the task's job with the segments flattened. taskset.json in the case directory (written
+by the tools when tracing) maps positions back to segments and fragment names.
+
+    python trace_export.py out_tool4/case_00042                  # -> case_00042/trace.json
+    python trace_export.py out_tool4/case_00042 --window 100 150 # only 100..150 ms of the run
+
+In the JSON, each core is a process and each task a thread; every task thread carries
+nested slices job -> segment (RaF / NF) -> fragment.
+"""
+
+import argparse
+import json
+from pathlib import Path
+
+import numpy as np
+
+TRACE_MAGIC = b"TTRC"
+TRACE_VERSION = 1
+
+HEADER_DTYPE = np.dtype([
+    ("magic", "S4"), ("version", "<u4"), ("entry_size", "<u4"),
+    ("task_id", "<i4"), ("core_id", "<i4"), ("capacity", "<u4"),
+    ("count", "<u8"), ("overwritten", "<u8"),
+])
+EVENT_DTYPE = np.dtype([
+    ("start_ns", "<i8"), ("end_ns", "<i8"), ("job", "<u4"), ("pos", "<u4"),
+])
+
+
+def read_trace(path: Path):
+    """
+    Map one task_<id>_trace.bin; returns (header dict, structured array with EVENT_DTYPE).
+    Raises ValueError on a foreign or truncated file.
+    """
+    path = Path(path)
+    size = path.stat().st_size
+    if size < HEADER_DTYPE.itemsize:
+        raise ValueError(f"{path}: truncated header")
+    hdr = np.fromfile(path, dtype=HEADER_DTYPE, count=1)[0]
+    if hdr["magic"] != TRACE_MAGIC or hdr["version"] != TRACE_VERSION:
+        raise ValueError(f"{path}: not a v{TRACE_VERSION} trace")
+    if hdr["entry_size"] != EVENT_DTYPE.itemsize:
+        raise ValueError(f"{path}: entry size {hdr['entry_size']} != {EVENT_DTYPE.itemsize}")
+
+    count = int(hdr["count"])
+    if HEADER_DTYPE.itemsize + count * EVENT_DTYPE.itemsize > size:
+        raise ValueError(f"{path}: truncated body ({count} events announced)")
+    info = {k: int(hdr[k]) for k in ("task_id", "core_id", "capacity", "count", "overwritten")}
+    if count == 0:
+        return info, np.empty(0, dtype=EVENT_DTYPE)
+    events = np.memmap(path, dtype=EVENT_DTYPE, mode="r", offset=HEADER_DTYPE.itemsize, shape=(count,))
+    return info, events
+
+
+def _task_layout(taskset, task_id):
+    """(segment index per position, segment types, fragment name per position) or None."""
+    if taskset is None:
+        return None
+    for task in taskset["tasks"]:
+        if task["id"] == task_id:
+            seg_of, names = [], []
+            for s, seg in enumerate(task["segments"]):
+                seg_of.extend([s] * len(seg["apis"]))
+                names.extend(seg["apis"])
+            return np.array(seg_of, dtype=np.int64), [seg["type"] for seg in task["segments"]], names
+    return None
+
+
+def _slice(name, cat, pid, tid, start_ns, end_ns, args):
+    # trace event times are in microseconds
+    return {"name": name, "cat": cat, "ph": "X", "pid": pid, "tid": tid,
+            "ts": start_ns / 1000.0, "dur": max(0, end_ns - start_ns) / 1000.0, "args": args}
+
+
+def _runs(keys):
+    """[start, end) index ranges of equal consecutive values of `keys`."""
+    if len(keys) == 0:
+        return []
+    cut = np.flatnonzero(keys[1:] != keys[:-1]) + 1
+    bounds = np.concatenate(([0], cut, [len(keys)]))
+    return list(zip(bounds[:-1].tolist(), bounds[1:].tolist()))
+
+
+def case_trace_events(case_dir: Path, window=None):
+    """Chrome trace events of every task trace in `case_dir`; window = (start_ms, end_ms) or None."""
+    case_dir = Path(case_dir)
+    ts_path = case_dir / "taskset.json"
+    taskset = json.loads(ts_path.read_text()) if ts_path.exists() else None
+
+    out = []
+    cores = set()
+    for path in sorted(case_dir.glob("task_*_trace.bin")):
+        info, ev = read_trace(path)
+        task, core = info["task_id"], info["core_id"]
+        cores.add(core)
+        out.append({"name": "thread_name", "ph": "M", "pid": core, "tid": task,
+                    "args": {"name": f"task {task}"}})
+        if info["overwritten"]:
+            print(f"[TRACE] {path.name}: {info['overwritten']} oldest events were overwritten "
+                  f"(ring of {info['capacity']})")
+        if window is not None:
+            lo, hi = int(window[0] * 1e6), int(window[1] * 1e6)
+            ev = ev[(ev["end_ns"] >= lo) & (ev["start_ns"] <= hi)]
+        if len(ev) == 0:
+            continue
+
+        start = np.asarray(ev["start_ns"], dtype=np.int64)
+        end = np.asarray(ev["end_ns"], dtype=np.int64)
+        job = np.asarray(ev["job"], dtype=np.int64)
+        pos = np.asarray(ev["pos"], dtype=np.int64)
+        layout = _task_layout(taskset, task)
+        if layout is not None and len(layout[2]) and pos.max() < len(layout[2]):
+            seg_of, seg_types, names = layout
+            seg = seg_of[pos]
+        else:
+            seg, seg_types, names = None, None, None
+
+        for a, b in _runs(job):
+            out.append(_slice(f"job {job[a]}", "job", core, task, start[a], end[b - 1],
+                              {"job": int(job[a]), "fragments": b - a}))
+        if seg is not None:
+            # job * (segments + 1) + segment identifies a (job, segment) pair
+            for a, b in _runs(job * (len(seg_types) + 1) + seg):
+                s = int(seg[a])
+                out.append(_slice(f"{seg_types[s]} segment {s}", "segment", core, task, start[a], end[b - 1],
+                                  {"job": int(job[a]), "segment": s, "type": seg_types[s]}))
+        for j in range(len(ev)):
+            p = int(pos[j])
+            args = {"job": int(job[j]), "pos": p}
+            if seg is not None:
+                args["segment"] = int(seg[j])
+                name, cat = names[p], seg_types[int(seg[j])]
+            else:
+                name, cat = f"fragment {p}", "fragment"
+            out.append(_slice(name, cat, core, task, int(start[j]), int(end[j]), args))
+    for core in sorted(cores):
+        out.append({"name": "process_name", "ph": "M", "pid": core, "args": {"name": f"core {core}"}})
+    return out
+
+
+def export_case_trace(case_dir: Path, out_path: Path = None, window=None):
+    """Write the Chrome trace JSON of one case (default <case_dir>/trace.json); returns its path."""
+    case_dir = Path(case_dir)
+    out_path = Path(out_path) if out_path is not None else case_dir / "trace.json"
+    events = case_trace_events(case_dir, window)
+    with open(out_path, "w") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ns"}, f)
+    return out_path
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Convert task_*_trace.bin of a case to Chrome trace JSON")
+    ap.add_argument("case_dirs", type=Path, nargs="+", help="case directories of a --trace run")
+    ap.add_argument("-o", "--out", type=Path, default=None,
+                    help="output file (one case only; default <case_dir>/trace.json)")
+    ap.add_argument("--window", type=float, nargs=2, default=None, metavar=("START_MS", "END_MS"),
+                    help="only events within this part of the run (ms after the first release)")
+    args = ap.parse_args()
+    if args.out is not None and len(args.case_dirs) > 1:
+        ap.error("--out needs a single case directory")
+
+    for case_dir in args.case_dirs:
+        path = export_case_trace(case_dir, args.out, args.window)
+        print(f"[TRACE] {case_dir} -> {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+"""
+File-based work queue for running one benchmark_tool4/5 campaign on several hosts.
+
+The queue is a directory on storage every host can reach:
+
+    <queue>/spec.json            campaign arguments written by the coordinator
+    <queue>/lock                 lock file (fcntl.lockf) serialising claims and reclaims
+    <queue>/clock                probe file: its mtime is the filesystem's current time
+    <queue>/pending/<id>         cases nobody holds
+    <queue>/leased/<id>          cases held by a worker (JSON owner record; mtime = last heartbeat)
+    <queue>/done/<id>            finished cases
+    <queue>/workers/<worker>/    each worker's output directory and results.sqlite
+
+With --rng philox a case is fully defined by (seed, case_id), so the queue only carries
+case ids. A worker claims the lowest pending id by moving it to leased/ under the lock,
+runs it through the normal generate/build/run path and moves it to done/ once its result
+is committed to the worker's results store. A heartbeat thread refreshes the mtime of the
+held leases; a lease not refreshed for `lease_sec` seconds (crashed or unplugged worker)
+is moved back to pending/ by the next claim or by the coordinator. Lease ages are measured
+against the mtime of a probe file touched under the lock (<queue>/clock), so every timestamp
+involved comes from the shared filesystem and the hosts' clocks need not agree. A worker
+stops when nothing is pending; the coordinator materialises the case list, reclaims stale leases and
+waits until every case is done (cases reclaimed after the last worker stopped need a new
+worker, which the progress line makes visible), then merges the workers' stores
+(results_db.merge) and only aggregates them: cases that failed on a worker are reported.
+"""
+
+import fcntl
+import json
+import os
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+ROLES = ("coordinator", "worker")
+
+# options that describe the host / the process rather than the campaign: a worker keeps
+# its own values, everything else is taken from the coordinator's spec.json
+HOST_LOCAL = {
+    "queue", "role", "worker_id", "out", "db", "skip_if_done",
+    "linuxapi_path", "tacle_path", "gcc", "cost_profile", "build_cache", "no_build_cache",
+    "no_fraglib", "pipeline", "pack", "guard_cores", "timeout",
+}
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def apply_spec(args, spec):
+    """Overwrite the campaign options of `args` (argparse namespace) with the coordinator's."""
+    for key, val in spec.items():
+        if key in HOST_LOCAL or not hasattr(args, key):
+            continue
+        cur = getattr(args, key)
+        setattr(args, key, Path(val) if isinstance(cur, Path) and val is not None else val)
+    return args
+
+
+class WorkQueue:
+    def __init__(self, root: Path, lease_sec: float = 600.0):
+        self.root = Path(root)
+        self.lease_sec = lease_sec
+        self.pending = self.root / "pending"
+        self.leased = self.root / "leased"
+        self.done = self.root / "done"
+        self.workers = self.root / "workers"
+        self._held = set()
+        self._held_lock = threading.Lock()
+        self._beat = None
+
+    # ---------------- coordinator ----------------
+    def create(self, case_ids, spec):
+        """Write spec.json and enqueue every case id not already leased or done (idempotent)."""
+        for d in (self.pending, self.leased, self.done, self.workers):
+            d.mkdir(parents=True, exist_ok=True)
+        tmp = self.root / "spec.json.tmp"
+        with open(tmp, "w") as f:
+            json.dump(spec, f, indent=2, default=str)
+        os.replace(tmp, self.root / "spec.json")
+        with self._locked():
+            known = {p.name for d in (self.leased, self.done) for p in d.iterdir()}
+            n = 0
+            for i in case_ids:
+                name = str(i)
+                if name not in known:
+                    (self.pending / name).touch()
+                    n += 1
+        return n
+
+    def wait(self, poll: float = 5.0):
+        """Reclaim stale leases and report progress until no case is pending or leased."""
+        last = None
+        while True:
+            reclaimed = self.reclaim_stale()
+            c = self.counts()
+            if reclaimed or c != last:
+                print(f"[QUEUE] pending={c['pending']} leased={c['leased']} done={c['done']}"
+                      + (f" reclaimed={reclaimed}" if reclaimed else ""))
+                last = c
+            if c["pending"] == 0 and c["leased"] == 0:
+                return
+            time.sleep(poll)
+
+    def worker_stores(self):
+        return sorted(self.workers.glob("*/results.sqlite"))
+
+    # ---------------- worker ----------------
+    def load_spec(self):
+        with open(self.root / "spec.json") as f:
+            return json.load(f)
+
+    def claim(self, worker: str):
+        """Lease the lowest pending case id; None if nothing is pending right now."""
+        with self._locked():
+            self._reclaim_locked()
+            ids = sorted(int(p.name) for p in self.pending.iterdir())
+            if not ids:
+                return None
+            name = str(ids[0])
+            os.replace(self.pending / name, self.leased / name)
+            with open(self.leased / name, "w") as f:
+                json.dump({"worker": worker, "claimed": time.time()}, f)
+        with self._held_lock:
+            self._held.add(name)
+        return ids[0]
+
+    def complete(self, case_id):
+        """Mark a held case done; False if its lease had expired and was taken away."""
+        name = str(case_id)
+        with self._held_lock:
+            self._held.discard(name)
+        with self._locked():
+            try:
+                os.replace(self.leased / name, self.done / name)
+            except FileNotFoundError:
+                return False
+        return True
+
+    def claims(self, worker: str):
+        """
+        Yield case ids for `worker` until nothing is pending. Claims are lazy, one id per
+        next(), and the leases stay alive (heartbeat) until close().
+        """
+        if self._beat is None:
+            self._start_heartbeat()
+        while True:
+            i = self.claim(worker)
+            if i is None:
+                return
+            yield i
+
+    def close(self):
+        self._stop_heartbeat()
+
+    # ---------------- leases ----------------
+    def reclaim_stale(self):
+        with self._locked():
+            return self._reclaim_locked()
+
+    def _fs_now(self):
+        """Current time as the shared filesystem sees it (same clock as the lease mtimes)."""
+        probe = self.root / "clock"
+        probe.touch()
+        os.utime(probe)
+        return probe.stat().st_mtime
+
+    def _reclaim_locked(self):
+        now = self._fs_now()
+        n = 0
+        for p in self.leased.iterdir():
+            try:
+                stale = now - p.stat().st_mtime > self.lease_sec
+            except FileNotFoundError:
+                continue
+            if stale:
+                os.replace(p, self.pending / p.name)
+                print(f"[QUEUE_RECLAIM] case {p.name}")
+                n += 1
+        return n
+
+    def _start_heartbeat(self):
+        self._beat = threading.Event()
+        threading.Thread(target=self._heartbeat, args=(self._beat,), daemon=True).start()
+
+    def _stop_heartbeat(self):
+        if self._beat is not None:
+            self._beat.set()
+            self._beat = None
+
+    def _heartbeat(self, stop):
+        while not stop.wait(self.lease_sec / 4.0):
+            with self._held_lock:
+                held = list(self._held)
+            for name in held:
+                try:
+                    os.utime(self.leased / name)
+                except FileNotFoundError:
+                    pass
+
+    def counts(self):
+        return {k: sum(1 for _ in d.iterdir()) if d.exists() else 0
+                for k, d in (("pending", self.pending), ("leased", self.leased), ("done", self.done))}
+
+    @contextmanager
+    def _locked(self):
+        # lockf (POSIX record locks) also works across hosts on NFS
+        with open(self.root / "lock", "a+") as f:
+            fcntl.lockf(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.lockf(f, fcntl.LOCK_UN)
@@ -0,0 +1,293 @@
+# -*- coding: utf-8 -*-
+"""
+Host calibration of fragment costs.
+
+The costs in generator3.shared_api_lib / normal_api_lib were measured once by hand on one
+machine. This module re-measures them on the current host:
+
+1. compile and run the fragment evaluation programs (LinuxAPI/API_evaluation*.c,
+   Taclebench/bench_evaluation.c) in a work directory, cold (cache flushed around each
+   call) and warm (no flush);
+2. parse the raw sample files they write (frag<k>_shared_times.txt / frag<k>_para_times.txt,
+   fragment<k>_times.txt; nanoseconds, optionally ",freq_khz");
+3. store mean / median / p95 / p99 / max (in us, like the generator costs) per fragment and
+   state in a JSON profile named after a host fingerprint (CPU model, kernel, arch, CPU count,
+   fragment sources), so calibration is only redone when the host changes.
+
+generator3.apply_cost_profile(profile, stat, state) then loads the chosen statistic.
+
+Usage:
+    python calibration.py --profile-dir profiles                     # calibrate if needed, print costs
+    python calibration.py --profile-dir profiles --from-samples      # only parse existing *_times.txt
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import platform
+import re
+import subprocess
+import time
+from pathlib import Path
+
+import numpy as np
+
+STATS = ("mean", "median", "p95", "p99", "max")
+STATES = ("cold", "warm")
+
+here = Path(__file__).resolve().parent
+
+# (state, directory key, evaluation program, fragment library, source overrides)
+EVAL_PROGRAMS = [
+    ("cold", "linuxapi", "API_evaluation.c",     "linuxAPI_lib.c", {}),
+    ("warm", "linuxapi", "API_evaluation_ver1.c", "linuxAPI_lib.c", {}),
+    ("cold", "tacle",    "bench_evaluation.c",    "bench_lib.c",    {"DO_FLUSH_CACHE": 1}),
+    ("warm", "tacle",    "bench_evaluation.c",    "bench_lib.c",    {"DO_FLUSH_CACHE": 0}),
+]
+
+_API_SAMPLE_RE   = re.compile(r"^frag(\d+)_(shared|para)_times\.txt$")
+_BENCH_SAMPLE_RE = re.compile(r"^fragment(\d+)_times\.txt$")
+
+
+# ------------------------- host fingerprint -------------------------
+def _cpu_model():
+    try:
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                key, _, val = line.partition(":")
+                if key.strip() in ("model name", "Hardware", "Processor", "cpu model"):
+                    return val.strip()
+    except OSError:
+        pass
+    return platform.processor() or "unknown"
+
+
+def host_fingerprint(linuxapi_dir: Path, tacle_dir: Path):
+    """Identity of the host + fragment sources; returns (fingerprint dict, short key)."""
+    src = hashlib.sha256()
+    for p in (Path(linuxapi_dir) / "linuxAPI_lib.c", Path(tacle_dir) / "bench_lib.c"):
+        if p.exists():
+            src.update(p.read_bytes())
+    fp = {
+        "cpu_model": _cpu_model(),
+        "kernel": platform.release(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count() or 1,
+        "sources": src.hexdigest()[:16],
+    }
+    key = hashlib.sha256(json.dumps(fp, sort_keys=True).encode()).hexdigest()[:16]
+    return fp, key
+
+
+# ------------------------- sample parsing -------------------------
+def read_samples(path: Path):
+    """First column of a *_times.txt file (ns) as a float array."""
+    if Path(path).stat().st_size == 0:
+        return np.empty(0)
+    vals = np.loadtxt(path, delimiter=",", usecols=0, ndmin=1, dtype=float)
+    return vals[np.isfinite(vals)]
+
+
+def summarize(samples_ns):
+    """Statistics of one sample set, converted to us."""
+    if samples_ns.size == 0:
+        return None
+    us = samples_ns / 1000.0
+    return {
+        "n": int(us.size),
+        "mean": float(us.mean()),
+        "median": float(np.median(us)),
+        "p95": float(np.percentile(us, 95)),
+        "p99": float(np.percentile(us, 99)),
+        "max": float(us.max()),
+    }
+
+
+def parse_sample_dir(sample_dir: Path):
+    """Map every recognised sample file in sample_dir to its fragment function name."""
+    out = {}
+    for p in sorted(Path(sample_dir).glob("*_times.txt")):
+        m = _API_SAMPLE_RE.match(p.name)
+        if m:
+            k, kind = m.groups()
+            name = f"API_fragment{k}" if kind == "shared" else f"API_para_fragment{k}"
+        else:
+            m = _BENCH_SAMPLE_RE.match(p.name)
+            if not m:
+                continue
+            name = f"benchmark_fragment{m.group(1)}"
+        st = summarize(read_samples(p))
+        if st is not None:
+            out[name] = st
+    return out
+
+
+# ------------------------- running evaluation programs -------------------------
+def _render_source(src: Path, overrides):
+    text = src.read_text()
+    for macro, val in overrides.items():
+        text, n = re.subn(rf"^(\s*#define\s+{macro}\s+)\S+", rf"\g<1>{val}", text, flags=re.M)
+        if n == 0:
+            text = f"#define {macro} {val}\n" + text
+    return text
+
+
+def run_evaluations(linuxapi_dir: Path, tacle_dir: Path, work_dir: Path,
+                    gcc: str = "gcc", cpu=None, iterations=None, timeout: int = 1800):
+    """
+    Compile + run every EVAL_PROGRAMS entry under work_dir/<state>_<dir>/.
+    Returns ({state: {fragment_name: stats}}, [programs that failed or wrote no samples]).
+    """
+    dirs = {"linuxapi": Path(linuxapi_dir).resolve(), "tacle": Path(tacle_dir).resolve()}
+    if cpu is None:
+        allowed = sorted(os.sched_getaffinity(0))
+        cpu = 1 if 1 in allowed else allowed[0]
+
+    results = {state: {} for state in STATES}
+    failed = []
+    for state, dkey, prog, lib, extra in EVAL_PROGRAMS:
+        src_dir = dirs[dkey]
+        run_dir = Path(work_dir) / f"{state}_{dkey}"
+        run_dir.mkdir(parents=True, exist_ok=True)
+
+        overrides = {"CPU_ID": cpu, **extra}
+        if iterations:
+            overrides["NUM_ITERATIONS" if dkey == "linuxapi" else "NUM_GROUPS"] = iterations
+        (run_dir / prog).write_text(_render_source(src_dir / prog, overrides))
+
+        cmd = (f'{gcc} -O2 -D_GNU_SOURCE -pthread -I"{src_dir}" '
+               f'{prog} "{src_dir / lib}" -o eval.out -lm')
+        comp = subprocess.run(cmd, shell=True, cwd=str(run_dir),
+                              stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+        if comp.returncode != 0:
+            print(f"[CALIB_COMPILE_FAIL] {run_dir}\n{comp.stdout}")
+            failed.append(f"{state} {prog}: compile failed")
+            continue
+        try:
+            runp = subprocess.run(["./eval.out"], cwd=str(run_dir),
+                                  stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                  text=True, timeout=timeout)
+        except subprocess.TimeoutExpired:
+            print(f"[CALIB_TIMEOUT] {run_dir}")
+            failed.append(f"{state} {prog}: timeout")
+            continue
+        with open(run_dir / "run_log.txt", "w") as lf:
+            lf.write(runp.stdout)
+        if runp.returncode != 0:
+            print(f"[CALIB_RUN_FAIL] {run_dir}\n{runp.stdout}")
+            failed.append(f"{state} {prog}: exit {runp.returncode}")
+            continue
+        samples = parse_sample_dir(run_dir)
+        if not samples:
+            print(f"[CALIB_NO_SAMPLES] {run_dir}")
+            failed.append(f"{state} {prog}: no samples")
+            continue
+        results[state].update(samples)
+        print(f"[CALIB_OK] {state:4s} {prog}")
+    return results, failed
+
+
+# ------------------------- profiles -------------------------
+def _profile_from(results, fingerprint, key, source):
+    fragments = {}
+    for state, per_frag in results.items():
+        for name, st in per_frag.items():
+            fragments.setdefault(name, {})[state] = st
+    return {"key": key, "fingerprint": fingerprint, "source": source,
+            "created": time.strftime("%Y-%m-%d %H:%M:%S"), "fragments": fragments}
+
+
+def profile_path(profile_dir: Path, key: str):
+    return Path(profile_dir) / f"cost_profile_{key}.json"
+
+
+def load_profile(profile_dir: Path, linuxapi_dir: Path, tacle_dir: Path):
+    """Profile of the current host, or None if this host has not been calibrated yet."""
+    _, key = host_fingerprint(linuxapi_dir, tacle_dir)
+    p = profile_path(profile_dir, key)
+    if not p.exists():
+        return None
+    with open(p) as f:
+        return json.load(f)
+
+
+def ensure_profile(profile_dir: Path, linuxapi_dir: Path, tacle_dir: Path, gcc: str = "gcc",
+                   force: bool = False, from_samples: bool = False, samples_state: str = "warm",
+                   cpu=None, iterations=None):
+    """
+    Return the current host's profile, calibrating first if none exists (or force=True).
+    from_samples=True parses the *_times.txt already present in the library directories
+    instead of running the evaluation programs; they are recorded under `samples_state`
+    (the checked-in samples match the warm column of the generator3 comments).
+    Raises RuntimeError, and saves nothing, unless every EVAL_PROGRAMS entry produced
+    samples (or, from_samples, at least one sample file was found); a stored profile
+    without fragments is recalibrated.
+    """
+    profile_dir = Path(profile_dir)
+    fp, key = host_fingerprint(linuxapi_dir, tacle_dir)
+    p = profile_path(profile_dir, key)
+    if p.exists() and not force:
+        with open(p) as f:
+            prof = json.load(f)
+        if prof.get("fragments"):
+            print(f"[CALIB_HIT] {p}")
+            return prof
+        print(f"[CALIB_EMPTY] {p}, recalibrating")
+
+    profile_dir.mkdir(parents=True, exist_ok=True)
+    if from_samples:
+        samples = {}
+        samples.update(parse_sample_dir(linuxapi_dir))
+        samples.update(parse_sample_dir(tacle_dir))
+        if not samples:
+            raise RuntimeError(f"no *_times.txt samples in {linuxapi_dir} or {tacle_dir}; no profile saved")
+        prof = _profile_from({samples_state: samples}, fp, key, "samples")
+    else:
+        results, failed = run_evaluations(linuxapi_dir, tacle_dir, profile_dir / "work" / key,
+                                          gcc=gcc, cpu=cpu, iterations=iterations)
+        if failed:
+            raise RuntimeError("calibration incomplete, no profile saved: " + "; ".join(failed))
+        prof = _profile_from(results, fp, key, "measured")
+
+    tmp = p.with_suffix(".tmp")
+    with open(tmp, "w") as f:
+        json.dump(prof, f, indent=2)
+    os.replace(tmp, p)
+    print(f"[CALIB_SAVED] {p}")
+    return prof
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Calibrate fragment costs on this host")
+    ap.add_argument("--profile-dir", type=Path, default=Path("cost_profiles"))
+    ap.add_argument("--linuxapi-path", type=Path, default=here.parent / "LinuxAPI")
+    ap.add_argument("--tacle-path", type=Path, default=here.parent / "Taclebench")
+    ap.add_argument("--gcc", type=str, default="gcc")
+    ap.add_argument("--cpu", type=int, default=None, help="CPU the evaluation programs are pinned to")
+    ap.add_argument("--iterations", type=int, default=None,
+                    help="override NUM_ITERATIONS / NUM_GROUPS of the evaluation programs")
+    ap.add_argument("--from-samples", action="store_true",
+                    help="parse the existing *_times.txt files instead of running the programs")
+    ap.add_argument("--samples-state", choices=STATES, default="warm",
+                    help="state recorded for --from-samples data")
+    ap.add_argument("--force", action="store_true", help="recalibrate even if a profile exists")
+    ap.add_argument("--stat", choices=STATS, default="mean")
+    ap.add_argument("--state", choices=STATES, default="cold")
+    args = ap.parse_args()
+
+    try:
+        prof = ensure_profile(args.profile_dir, args.linuxapi_path, args.tacle_path, gcc=args.gcc,
+                              force=args.force, from_samples=args.from_samples,
+                              samples_state=args.samples_state, cpu=args.cpu, iterations=args.iterations)
+    except RuntimeError as e:
+        ap.error(str(e))
+
+    print(f"\n{'fragment':24s} {args.state}/{args.stat} (us)")
+    for name in sorted(prof["fragments"]):
+        st = prof["fragments"][name].get(args.state)
+        print(f"{name:24s} {st[args.stat]:.3f}" if st else f"{name:24s} -")
+
+
+if __name__ == "__main__":
+    main()
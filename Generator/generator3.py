@@ -10,12 +10,12 @@ import time
 
 # ------------------------- Fragment Cost Library -------------------------
 shared_api_lib = [
-    {"name": "API_fragment0", "para_name": "API_para_fragment0", "cost": 6.4},     # 冷态6.4  热态4.5
-    {"name": "API_fragment1", "para_name": "API_para_fragment1", "cost": 3.8},     # 冷态3.8  热态2.2
-    {"name": "API_fragment2", "para_name": "API_para_fragment2", "cost": 8},       # 冷态8    热态6.2
-    {"name": "API_fragment3", "para_name": "API_para_fragment3", "cost": 5.2},     # 冷态5.2  热态3.5
-    {"name": "API_fragment4", "para_name": "API_para_fragment4", "cost": 6},       # 冷态6    热态4.2
-    {"name": "API_fragment5", "para_name": "API_para_fragment5", "cost": 20},      # 冷态20   热态12
+    {"name": "API_fragment0", "para_name": "API_para_fragment0", "kind": "semaphore", "cost": 6.4},     # 冷态6.4  热态4.5
+    {"name": "API_fragment1", "para_name": "API_para_fragment1", "kind": "mutex", "cost": 3.8},     # 冷态3.8  热态2.2
+    {"name": "API_fragment2", "para_name": "API_para_fragment2", "kind": "dataqueue", "cost": 8},       # 冷态8    热态6.2
+    {"name": "API_fragment3", "para_name": "API_para_fragment3", "kind": "spin", "cost": 5.2},     # 冷态5.2  热态3.5
+    {"name": "API_fragment4", "para_name": "API_para_fragment4", "kind": "rwlock", "cost": 6},       # 冷态6    热态4.2
+    {"name": "API_fragment5", "para_name": "API_para_fragment5", "kind": "eventfd", "cost": 20},      # 冷态20   热态12
    # {"name": "API_fragment6", "para_name": "API_para_fragment6", "cost": 1.4}
 
 ]
@@ -34,16 +34,50 @@ normal_api_lib = [
 
 api_cost_map = {api["name"]: api["cost"] for api in shared_api_lib + normal_api_lib}
 
+def apply_cost_profile(profile, stat="mean", state="cold"):
+    """
+    用 calibration.py 生成的主机 profile 替换上面的常量 cost。
+    profile 完全没有 state 的数据时抛 ValueError；返回缺 state/stat 数据（保持原值）的片段名，由调用方报告。
+    """
+    frags = profile.get("fragments", {})
+    if not any(state in per_state for per_state in frags.values()):
+        raise ValueError(f"cost profile ({profile.get('source', '?')}) has no {state} data; "
+                         f"states present: {sorted({s for per_state in frags.values() for s in per_state})}")
+    missing = []
+    for api in shared_api_lib + normal_api_lib:
+        st = frags.get(api["name"], {}).get(state)
+        if st and round(st.get(stat, 0.0), 3) > 0:   # cost 必须 > 0，否则填充会死循环
+            api["cost"] = round(st[stat], 3)
+        else:
+            missing.append(api["name"])
+    api_cost_map.update({api["name"]: api["cost"] for api in shared_api_lib + normal_api_lib})
+    return missing
+
+# ------------------------- Random Streams -------------------------
+# 以下生成函数都接受可选的 rng（numpy.random.Generator）：
+#   rng=None  -> 沿用全局 random / np.random（由调用方 seed，保持旧的随机流）
+#   rng 给定  -> 所有抽样都来自该 Generator，用例之间互不依赖（可分片、并行复现）
+def _randint(rng, lo, hi):
+    """[lo, hi] 闭区间整数"""
+    return random.randint(lo, hi) if rng is None else int(rng.integers(lo, hi + 1))
+
+def _random(rng):
+    return random.random() if rng is None else float(rng.random())
+
+def _choice(rng, seq):
+    return random.choice(seq) if rng is None else seq[int(rng.integers(len(seq)))]
+
 # ------------------------- Segment Generation -------------------------
-def generate_segments(FN, C, Cr, RaF_max):
+def generate_segments(FN, C, Cr, RaF_max, rng=None):
     segments = []
     total_RaF_time = int(C * Cr)
     total_NF_time = C - total_RaF_time
     RaF_count = (FN + 1) // 2
     NF_count = FN // 2
 
-    RaF_durations = np.random.dirichlet(np.ones(RaF_count)) * total_RaF_time
-    NF_durations = np.random.dirichlet(np.ones(NF_count)) * total_NF_time
+    dirichlet = np.random.dirichlet if rng is None else rng.dirichlet
+    RaF_durations = dirichlet(np.ones(RaF_count)) * total_RaF_time
+    NF_durations = dirichlet(np.ones(NF_count)) * total_NF_time
 
     RaF_durations = [min(int(t), RaF_max) for t in RaF_durations]
     NF_durations = [int(t) for t in NF_durations]
@@ -57,7 +91,7 @@ def generate_segments(FN, C, Cr, RaF_max):
             segments.append({"type": "NF", "duration": duration, "apis": []})
     return segments
 
-def fill_apis_for_segment(duration, api_pool, contention=0.5):
+def fill_apis_for_segment(duration, api_pool, contention=0.5, rng=None):
     filled = []
     remaining = duration
     # 预先计算最小 cost，避免死循环
@@ -68,11 +102,11 @@ def fill_apis_for_segment(duration, api_pool, contention=0.5):
         feasible = [api for api in api_pool if api["cost"] <= remaining + 1e-9]
         if not feasible:
             break
-        api = random.choice(feasible)
+        api = _choice(rng, feasible)
 
         # 共享/并行变体选择
         if "para_name" in api:
-            if random.random() < contention:
+            if _random(rng) < contention:
                 filled.append(api["name"])        # 共享（有竞争）
             else:
                 filled.append(api["para_name"])   # 并行（无竞争）
@@ -84,36 +118,277 @@ def fill_apis_for_segment(duration, api_pool, contention=0.5):
     return filled
 
 # ------------------------- WCET & Period Generation -------------------------
-def generate_random_wcet_and_period(N, wcet_min, wcet_max, period_factor=10):
-    wcets = [random.randint(wcet_min, wcet_max) for _ in range(N)]
+def generate_random_wcet_and_period(N, wcet_min, wcet_max, period_factor=10, rng=None):
+    wcets = [_randint(rng, wcet_min, wcet_max) for _ in range(N)]
     periods = [w * period_factor for w in wcets]
     return wcets, periods
 
-# ------------------------- Task Set Generation -------------------------
-def generate_taskset(M, N, wcet_min, wcet_max, Cr, RaF_max, FN, contention):
-    wcets, periods = generate_random_wcet_and_period(N, wcet_min, wcet_max)
-    priorities = random.sample(range(1, N + 1), N)
-    cores = [i % M for i in range(N)]
+# ------------------------- Utilization-driven WCET & Period Generation -------------------------
+# 上面的生成方式固定 period = 10 * wcet（每个任务利用率都是 0.1）。以下按目标总利用率 U 生成：
+#   1) 利用率向量 u（每行 n 个、和为 U、每个 <= umax）：
+#        uunifast     UUniFast-discard（Bini & Buttazzo；超过 umax 的行整行重抽，U 接近 n*umax 时很慢）
+#        randfixedsum Stafford 的 RandFixedSum（在 [0, umax]^n 与和为 U 的超平面交集上均匀，U 接近上限也不重抽）
+#   2) 周期：[period_min, period_max] 内对数均匀；harmonic=True 时取 period_min * 2^k（两两整除）
+#   3) wcet = round(u * period)（us，至少 1）
+# 全部按 (nsets, n) 数组批量生成；按核利用率 u_core 生成时取 U = u_core * M。
+UTIL_METHODS = ("uunifast", "randfixedsum")
+
+
+def _batch_rng(rng):
+    """rng=None：从全局 np.random 派生一个 Generator（随 np.random.seed 可复现）"""
+    return rng if rng is not None else np.random.default_rng(np.random.randint(0, 2**32))
+
+
+def uunifast_discard(n, U, nsets=1, umax=1.0, rng=None, max_rounds=1000):
+    """UUniFast-discard：(nsets, n) 利用率，每行和为 U、每个 <= umax"""
+    if not 0 < U <= n * umax:
+        raise ValueError(f"total utilization {U} not in (0, {n * umax}] for {n} tasks")
+    rng = _batch_rng(rng)
+    out = np.empty((nsets, n))
+    todo = np.arange(nsets)
+    exps = 1.0 / np.arange(n - 1, 0, -1)          # 1/(n-1), ..., 1/1
+    for _ in range(max_rounds):
+        # 剩余利用率 sumU_k = U * prod_{j<=k} r_j^(1/(n-j))，u_k = sumU_{k-1} - sumU_k
+        rest = U * np.cumprod(rng.random((todo.size, n - 1)) ** exps, axis=1)
+        rest = np.hstack([np.full((todo.size, 1), float(U)), rest, np.zeros((todo.size, 1))])
+        u = rest[:, :-1] - rest[:, 1:]
+        ok = u.max(axis=1) <= umax
+        out[todo[ok]] = u[ok]
+        todo = todo[~ok]
+        if todo.size == 0:
+            return out
+    raise ValueError(f"UUniFast-discard: no valid vector in {max_rounds} rounds (U={U}, n={n}); use randfixedsum")
+
+
+def randfixedsum(n, U, nsets=1, umax=1.0, rng=None):
+    """RandFixedSum（Stafford）：(nsets, n) 利用率，在 [0, umax]^n ∩ {sum = U} 上均匀分布"""
+    if not 0 < U <= n * umax:
+        raise ValueError(f"total utilization {U} not in (0, {n * umax}] for {n} tasks")
+    rng = _batch_rng(rng)
+    if n == 1:
+        return np.full((nsets, 1), float(U))
+    s = U / umax                                   # 在 [0,1]^n 中求和为 s
+    k = int(max(min(np.floor(s), n - 1), 0))
+    s = max(min(s, k + 1), k)
+    s1 = s - np.arange(k, k - n, -1)
+    s2 = np.arange(k + n, k, -1) - s
+    # 转移表：w 为各单纯形的相对体积，t 为逐维选择方向的概率
+    w = np.zeros((n, n + 1))
+    w[0, 1] = np.finfo(float).max
+    t = np.zeros((n - 1, n))
+    tiny = np.finfo(float).tiny
+    for i in range(2, n + 1):
+        tmp1 = w[i - 2, 1:i + 1] * s1[:i] / i
+        tmp2 = w[i - 2, :i] * s2[n - i:] / i
+        w[i - 1, 1:i + 1] = tmp1 + tmp2
+        tmp3 = w[i - 1, 1:i + 1] + tiny
+        tmp4 = s2[n - i:] > s1[:i]
+        t[i - 2, :i] = np.where(tmp4, tmp2 / tmp3, 1.0 - tmp1 / tmp3)
+    # 逐维抽样（所有 nsets 行同时进行）
+    x = np.empty((nsets, n))
+    rt = rng.random((n - 1, nsets))
+    rs = rng.random((n - 1, nsets))
+    rem = np.full(nsets, s)
+    j = np.full(nsets, k + 1)
+    sm = np.zeros(nsets)
+    pr = np.ones(nsets)
+    for i in range(n - 1, 0, -1):
+        e = rt[n - i - 1] <= t[i - 1, j - 1]
+        sx = rs[n - i - 1] ** (1.0 / i)
+        sm = sm + (1.0 - sx) * pr * rem / (i + 1)
+        pr = sx * pr
+        x[:, n - i - 1] = sm + pr * e
+        rem = rem - e
+        j = j - e
+    x[:, n - 1] = sm + pr * rem
+    # 各维按固定顺序生成，每行再随机打乱
+    x = np.take_along_axis(x, rng.random((nsets, n)).argsort(axis=1), axis=1)
+    return np.clip(x, 0.0, 1.0) * umax
+
+
+def generate_periods(n, period_min, period_max, nsets=1, harmonic=False, rng=None):
+    """(nsets, n) 整数周期（us）：对数均匀；harmonic=True 时为 period_min * 2^k"""
+    if not 0 < period_min <= period_max:
+        raise ValueError(f"bad period range [{period_min}, {period_max}]")
+    rng = _batch_rng(rng)
+    if harmonic:
+        kmax = int(np.floor(np.log2(period_max / period_min)))
+        return (period_min * 2 ** rng.integers(0, kmax + 1, size=(nsets, n))).astype(np.int64)
+    logp = rng.uniform(np.log(period_min), np.log(period_max), size=(nsets, n))
+    return np.rint(np.exp(logp)).astype(np.int64)
+
+
+def generate_utilization_timing(N, U, nsets=1, method="uunifast", period_min=2000, period_max=5000,
+                                harmonic=False, umax=1.0, rng=None):
+    """按总利用率 U 批量生成 (wcets, periods)，均为 (nsets, N) 整数数组（us）"""
+    if method not in UTIL_METHODS:
+        raise ValueError(f"unknown utilization method: {method}")
+    rng = _batch_rng(rng)
+    draw = uunifast_discard if method == "uunifast" else randfixedsum
+    u = draw(N, U, nsets, umax=umax, rng=rng)
+    periods = generate_periods(N, period_min, period_max, nsets, harmonic, rng=rng)
+    wcets = np.maximum(1, np.rint(u * periods)).astype(np.int64)
+    return wcets, periods
+
+
+def generate_tasksets(nsets, M, N, U, Cr, RaF_max, FN, contention, method="uunifast",
+                      period_min=2000, period_max=5000, harmonic=False, rng=None, partition="rr"):
+    """一次生成 nsets 个总利用率为 U 的任务集（周期/WCET 批量抽取，片段逐任务填充）"""
+    rng = _batch_rng(rng)
+    wcets, periods = generate_utilization_timing(N, U, nsets, method, period_min, period_max, harmonic, rng=rng)
+    return [generate_taskset(M, N, None, None, Cr, RaF_max, FN, contention, rng=rng,
+                             timing=(wcets[s].tolist(), periods[s].tolist()), partition=partition)
+            for s in range(nsets)]
+
+
+# ------------------------- Task-to-Core Partitioning -------------------------
+# 任务 i 的利用率 u = wcet / period；共享占用率 u_shared = 每个 job 中有竞争的共享片段（API_fragmentK，
+# 不含 para_ 变体）的 cost 之和 / period。可选策略（PARTITIONERS，可扩展：f(tasks, M) -> 每个任务的核号）：
+#   rr          轮转 i % M（默认，与旧版本一致，不看 WCET / 竞争）
+#   wfd         worst-fit decreasing：按 u 降序，放到当前负载最小的核（负载均衡）
+#   ffd         first-fit decreasing：放到第一个放得下（负载 + u <= 1）的核（尽量少用核）
+#   bfd         best-fit decreasing：放到放得下且剩余容量最小的核
+#   contention  先把有共享占用的任务按 u_shared 降序分散到（放得下的核中）共享占用最小的核，其余任务再做 wfd
+# ffd / bfd 放不下时退回负载最小的核（该核超载，core_loads 中 util > 1）。
+# 分配不消耗随机数：同一随机流下各策略的任务集只有 core 不同，可直接对比 miss 率。
+_SHARED_NAMES = {api["name"] for api in shared_api_lib}
+
+
+def task_utilization(task):
+    """(u, u_shared)：wcet / period 与有竞争的共享片段时间 / period"""
+    shared = sum(api_cost_map[a] for seg in task["segments"] if seg["type"] == "RaF"
+                 for a in seg["apis"] if a in _SHARED_NAMES)
+    return task["wcet"] / task["period"], shared / task["period"]
+
+
+def _decreasing(us):
+    return sorted(range(len(us)), key=lambda i: (-us[i], i))
+
+
+def _least_loaded(load):
+    return min(range(len(load)), key=load.__getitem__)
+
+
+def _partition_rr(tasks, M):
+    return [i % M for i in range(len(tasks))]
+
+
+def _partition_wfd(tasks, M):
+    us = [task_utilization(t)[0] for t in tasks]
+    load = [0.0] * M
+    cores = [0] * len(tasks)
+    for i in _decreasing(us):
+        cores[i] = c = _least_loaded(load)
+        load[c] += us[i]
+    return cores
+
+
+def _fit_decreasing(tasks, M, best):
+    us = [task_utilization(t)[0] for t in tasks]
+    load = [0.0] * M
+    cores = [0] * len(tasks)
+    for i in _decreasing(us):
+        fits = [c for c in range(M) if load[c] + us[i] <= 1.0 + 1e-9]
+        if not fits:
+            c = _least_loaded(load)
+        elif best:
+            c = max(fits, key=load.__getitem__)
+        else:
+            c = fits[0]
+        cores[i] = c
+        load[c] += us[i]
+    return cores
+
+
+def _partition_contention(tasks, M):
+    util = [task_utilization(t) for t in tasks]
+    load = [0.0] * M
+    shared_load = [0.0] * M
+    cores = [0] * len(tasks)
+    heavy = sorted((i for i, (_, sh) in enumerate(util) if sh > 0), key=lambda i: (-util[i][1], -util[i][0], i))
+    for i in heavy:
+        # 只在放得下的核中挑（都放不下时在全部核中挑）
+        fits = [c for c in range(M) if load[c] + util[i][0] <= 1.0 + 1e-9] or range(M)
+        c = min(fits, key=lambda c: (shared_load[c], load[c]))
+        cores[i] = c
+        shared_load[c] += util[i][1]
+        load[c] += util[i][0]
+    for i in _decreasing([u for u, _ in util]):
+        if util[i][1] == 0:
+            cores[i] = c = _least_loaded(load)
+            load[c] += util[i][0]
+    return cores
+
+
+PARTITIONERS = {
+    "rr": _partition_rr,
+    "wfd": _partition_wfd,
+    "ffd": lambda tasks, M: _fit_decreasing(tasks, M, best=False),
+    "bfd": lambda tasks, M: _fit_decreasing(tasks, M, best=True),
+    "contention": _partition_contention,
+}
+
+
+def partition_tasks(tasks, M, method="rr"):
+    """按 PARTITIONERS[method] 重新设置 tasks 的 "core"（原地修改并返回核号列表）"""
+    if method not in PARTITIONERS:
+        raise ValueError(f"unknown partitioning method: {method}")
+    cores = PARTITIONERS[method](tasks, M)
+    for task, c in zip(tasks, cores):
+        task["core"] = c
+    return cores
+
 
-    taskset = {"meta": {"M": M, "N": N}, "tasks": []}
+def core_loads(taskset):
+    """每个核一行：{"core", "tasks", "util", "shared_util"}（按 task_utilization 求和）"""
+    M = taskset["meta"]["M"]
+    loads = [{"core": c, "tasks": 0, "util": 0.0, "shared_util": 0.0} for c in range(M)]
+    for task in taskset["tasks"]:
+        u, sh = task_utilization(task)
+        row = loads[task["core"]]
+        row["tasks"] += 1
+        row["util"] += u
+        row["shared_util"] += sh
+    return loads
+
+
+# ------------------------- Task Set Generation -------------------------
+def generate_taskset(M, N, wcet_min, wcet_max, Cr, RaF_max, FN, contention, rng=None, timing=None,
+                     partition="rr"):
+    # timing=(wcets, periods)：使用给定的 WCET/周期（如 generate_utilization_timing 的一行），
+    # 否则按 [wcet_min, wcet_max] 与 period = 10 * wcet 抽取
+    # partition：任务到核的分配策略（PARTITIONERS），在片段生成之后进行
+    if partition not in PARTITIONERS:
+        raise ValueError(f"unknown partitioning method: {partition}")
+    if timing is not None:
+        wcets, periods = (list(v) for v in timing)
+    else:
+        wcets, periods = generate_random_wcet_and_period(N, wcet_min, wcet_max, rng=rng)
+    if rng is None:
+        priorities = random.sample(range(1, N + 1), N)
+    else:
+        priorities = (rng.permutation(N) + 1).tolist()
+    taskset = {"meta": {"M": M, "N": N, "partition": partition}, "tasks": []}
     for i in range(N):
         C = wcets[i]
         T = periods[i]
-        segments = generate_segments(FN, C, Cr, RaF_max)
+        segments = generate_segments(FN, C, Cr, RaF_max, rng=rng)
         for seg in segments:
             if seg["type"] == "RaF":
-                seg["apis"] = fill_apis_for_segment(seg["duration"], shared_api_lib, contention)
+                seg["apis"] = fill_apis_for_segment(seg["duration"], shared_api_lib, contention, rng=rng)
             else:
-                seg["apis"] = fill_apis_for_segment(seg["duration"], normal_api_lib)
+                seg["apis"] = fill_apis_for_segment(seg["duration"], normal_api_lib, rng=rng)
         task = {
             "id": i,
-            "core": cores[i],
+            "core": i % M,
             "priority": priorities[i],
             "period": T,
             "wcet": C,
             "segments": segments
         }
         taskset["tasks"].append(task)
+    if partition != "rr":
+        partition_tasks(taskset["tasks"], M, partition)
     return taskset
 
 
@@ -127,15 +402,42 @@ c_template = r"""
 #include <string.h>
 #include <time.h>
 #include <sched.h>
+#include <math.h>
+#include <errno.h>
+#include <sys/mman.h>
+{% if opt.counters %}
+#include <sys/ioctl.h>
+#include <sys/resource.h>
+#include <sys/syscall.h>
+#include <linux/perf_event.h>
+{% endif %}
 
 //#include "LinuxAPI/linuxAPI_lib.h"
 //#include "Taclebench/bench_lib.h"
 #include "linuxAPI_lib.h"
 #include "bench_lib.h"
 
+{% if runner %}
+// data-driven runner: the taskset is loaded at startup (see load_taskset)
+#define MAX_TASKS 1024
+#define MAX_CORES CPU_SETSIZE
+static int num_tasks = 0;
+static int num_cores = 0;
+{% else %}
 #define NUM_TASKS {{ taskset.tasks|length }}
 #define NUM_CORES {{ taskset.meta.M }}
-#define RUN_DURATION_SEC 5
+#define MAX_TASKS NUM_TASKS
+#define MAX_CORES NUM_CORES
+static int num_tasks = NUM_TASKS;
+static int num_cores = NUM_CORES;
+{% endif %}
+#define RUN_DURATION_SEC 5              // default; TASKSET_MAX_SEC overrides it at runtime
+#define CI_Z             1.96           // 95% confidence for the adaptive stop rule
+#define CI_MIN_JOBS      30
+#define CHECK_INTERVAL_US 50000ULL      // convergence check period of the adaptive mode
+#define START_DELAY_US   100000ULL      // release of the first job, after thread setup
+#define STACK_PREFAULT   (256 * 1024)   // bytes of each task stack touched before the start barrier
+#define CACHE_LINE       64             // per-task state written in the job loop is padded to this
 
 typedef struct {
     int task_id;
@@ -144,20 +446,38 @@ typedef struct {
     int wcet_us;     // theoretical WCET
     int segment_count;
     void (**segments)(void);
+{% if opt.fragstats %}
+    const int* frag_ids;   // fragment_names index of each segment entry
+{% endif %}
 } TaskArgs;
 
-pthread_t threads[NUM_TASKS];
-TaskArgs  task_args[NUM_TASKS];
+pthread_t threads[MAX_TASKS];
+TaskArgs  task_args[MAX_TASKS];
 
-// global tallies for miss rate
-static int job_counts[NUM_TASKS];
-static int deadline_miss[NUM_TASKS];
+// global tallies for miss rate (filled from task_agg after join)
+static int job_counts[MAX_TASKS];
+static int deadline_miss[MAX_TASKS];
+
+// physical core of logical core 0 (TASKSET_CORE_BASE); lets the harness run several
+// cases side by side on disjoint core partitions
+static int core_base = 0;
 
 // start/stop sync
 static pthread_barrier_t start_barrier;
 static volatile uint64_t global_start_us = 0;
 static volatile uint64_t global_end_us   = 0;
 
+// run length (runtime options, environment):
+//   TASKSET_MAX_SEC  run length, or the upper bound with the adaptive mode (default RUN_DURATION_SEC)
+//   TASKSET_CI_REL   enable the adaptive mode: stop once the 95% CI half-width of the delay_ratio
+//                    mean is <= CI_REL * mean ...
+//   TASKSET_CI_MISS  ... and the Wilson half-width of the miss rate is <= CI_MISS percentage points
+//   TASKSET_MIN_SEC  lower bound of the adaptive mode (default 0.2)
+static uint64_t run_max_us = (uint64_t)RUN_DURATION_SEC * 1000000ULL;
+static uint64_t run_min_us = 200000ULL;
+static double   ci_rel  = 0.0;   // 0 -> fixed run length
+static double   ci_miss = 1.0;
+
 static inline uint64_t now_us() {
     struct timespec ts;
     clock_gettime(CLOCK_MONOTONIC, &ts);
@@ -170,30 +490,417 @@ static inline void sleep_until_us(uint64_t tgt_us) {
     clock_nanosleep(CLOCK_MONOTONIC, TIMER_ABSTIME, &ts, NULL);
 }
 
-// ---- per-task log (CSV) ----
+// ---- per-task log (binary or CSV, see opt.log_format) ----
+// fixed 16-byte layout so the binary log can be mapped directly (BenchmarkTool/delay_log.py)
 typedef struct {
-    int period_idx;
+    int32_t period_idx;
+    int32_t missed;     // 0/1
     double delay_ratio; // actual_us / wcet_us
-    int missed;         // 0/1
 } TaskLogEntry;
+_Static_assert(sizeof(TaskLogEntry) == 16, "TaskLogEntry layout");
 typedef struct {
+    char     magic[4];   // "TLOG"
+    uint32_t version;    // 1
+    uint32_t entry_size; // sizeof(TaskLogEntry)
+    int32_t  task_id;
+    uint64_t count;
+} TaskLogHeader;
+_Static_assert(sizeof(TaskLogHeader) == 24, "TaskLogHeader layout");
+// preallocated in main() for the whole run (see log_capacity); never grown in the job loop
+typedef struct __attribute__((aligned(CACHE_LINE))) {
     TaskLogEntry* entries;
     size_t capacity;
     size_t count;
+    size_t dropped;   // jobs past capacity (should stay 0)
 } TaskLog;
-static TaskLog task_logs[NUM_TASKS];
+static TaskLog task_logs[MAX_TASKS];
 
-// ---- per-core aggregates ----
+{% if opt.trace or opt.fragstats %}
+static inline int64_t now_ns(void) {
+    struct timespec ts;
+    clock_gettime(CLOCK_MONOTONIC, &ts);
+    return (int64_t)ts.tv_sec * 1000000000LL + ts.tv_nsec;
+}
+{% endif %}
+
+{% if opt.trace %}
+// ---- per-fragment event trace (opt.trace) ----
+// One preallocated ring of TRACE_CAP events per task thread, written only by that thread
+// (no locks, no I/O); once full, the oldest events are overwritten. Dumped after join as
+// task_<id>_trace.bin, oldest event first (BenchmarkTool/trace_export.py). Times are ns
+// relative to global_start_us; the two clock reads per fragment are inside the timed job.
+#define TRACE_CAP {{ opt.trace }}
 typedef struct {
+    int64_t  start_ns;
+    int64_t  end_ns;
+    uint32_t job;       // job index k of the task
+    uint32_t pos;       // fragment position within the job (segments flattened)
+} TraceEvent;
+_Static_assert(sizeof(TraceEvent) == 24, "TraceEvent layout");
+typedef struct {
+    char     magic[4];    // "TTRC"
+    uint32_t version;     // 1
+    uint32_t entry_size;  // sizeof(TraceEvent)
+    int32_t  task_id;
+    int32_t  core_id;
+    uint32_t capacity;
+    uint64_t count;       // events in the file
+    uint64_t overwritten; // oldest events lost to the ring
+} TraceHeader;
+_Static_assert(sizeof(TraceHeader) == 40, "TraceHeader layout");
+typedef struct __attribute__((aligned(CACHE_LINE))) {
+    TraceEvent* ev;
+    uint64_t    written;  // total events; ring slot = written % TRACE_CAP
+} TraceRing;
+static TraceRing task_trace[MAX_TASKS];
+static inline void trace_put(TraceRing* r, int64_t start_ns, int64_t end_ns, int job, int pos) {
+    int64_t base = (int64_t)global_start_us * 1000LL;
+    r->ev[r->written % TRACE_CAP] = (TraceEvent){ start_ns - base, end_ns - base, (uint32_t)job, (uint32_t)pos };
+    r->written++;
+}
+static void trace_dump(int i, int core) {
+    TraceRing* r = &task_trace[i];
+    char fname[64]; snprintf(fname, sizeof(fname), "task_%d_trace.bin", i);
+    FILE* f = fopen(fname, "wb");
+    if (!f) { perror("fopen"); return; }
+    uint64_t n = r->written < TRACE_CAP ? r->written : TRACE_CAP;
+    TraceHeader h = { {'T', 'T', 'R', 'C'}, 1, (uint32_t)sizeof(TraceEvent), i, core,
+                      (uint32_t)TRACE_CAP, n, r->written - n };
+    fwrite(&h, sizeof(h), 1, f);
+    size_t head = (size_t)(r->written % TRACE_CAP);
+    if (r->written > TRACE_CAP) {
+        fwrite(r->ev + head, sizeof(TraceEvent), TRACE_CAP - head, f);
+        fwrite(r->ev, sizeof(TraceEvent), head, f);
+    } else {
+        fwrite(r->ev, sizeof(TraceEvent), (size_t)n, f);
+    }
+    fclose(f);
+}
+{% endif %}
+
+{% if opt.fragstats %}
+// ---- per-fragment execution time statistics (opt.fragstats) ----
+// Calls, time sum / max and a log-linear histogram of the ns spent in every fragment,
+// per task thread (each thread writes only its own block; allocated in main). Bins 0..3
+// hold 0..3 ns exactly; bin b >= 4 covers [(4 + b%4) << (b/4 - 1), (5 + b%4) << (b/4 - 1)),
+// i.e. 4 bins per octave; the last bin is open ended.
+#define FRAG_COUNT     {{ fragments|length }}
+#define FRAG_HIST_BINS 128
+static const char* const fragment_names[FRAG_COUNT] = {
+{% for name in fragments %}    "{{ name }}",
+{% endfor %}
+};
+typedef struct __attribute__((aligned(CACHE_LINE))) {
+    unsigned long long n;
+    unsigned long long sum_ns;
+    unsigned long long max_ns;
+    unsigned long long hist[FRAG_HIST_BINS];
+} FragStats;
+static FragStats* task_frag = NULL;   // [num_tasks][FRAG_COUNT]
+
+static inline int frag_bin(uint64_t ns) {
+    if (ns < 4) return (int)ns;
+    int e = 63 - __builtin_clzll(ns);
+    int b = 4 * (e - 1) + (int)((ns >> (e - 2)) & 3);
+    return b < FRAG_HIST_BINS ? b : FRAG_HIST_BINS - 1;
+}
+static inline void frag_add(FragStats* s, uint64_t ns) {
+    s->n += 1;
+    s->sum_ns += ns;
+    if (ns > s->max_ns) s->max_ns = ns;
+    s->hist[frag_bin(ns)] += 1;
+}
+// {"id":..,"f":[[frag,n,sum_ns,max_ns,[[bin,count],...]],...]} (fragments with calls only)
+static void fragstats_print_json(FILE* f, int id, const FragStats* fs) {
+    fprintf(f, "{\"id\":%d,\"f\":[", id);
+    int first = 1;
+    for (int k = 0; k < FRAG_COUNT; ++k) {
+        const FragStats* s = &fs[k];
+        if (!s->n) continue;
+        fprintf(f, "%s[%d,%llu,%llu,%llu,[", first ? "" : ",", k, s->n, s->sum_ns, s->max_ns);
+        int fb = 1;
+        for (int b = 0; b < FRAG_HIST_BINS; ++b) {
+            if (!s->hist[b]) continue;
+            fprintf(f, "%s[%d,%llu]", fb ? "" : ",", b, s->hist[b]);
+            fb = 0;
+        }
+        fprintf(f, "]]");
+        first = 0;
+    }
+    fprintf(f, "]}");
+}
+{% endif %}
+
+{% if opt.stats %}
+// ---- streaming delay_ratio statistics (opt.stats) ----
+// Welford mean/variance, min/max, misses and a log-linear histogram, updated by each
+// task's own thread; per-core and global values are merged after join and printed as
+// one SUMMARY line (BenchmarkTool/run_summary.py).
+#define HIST_LO_EXP  ({{ opt.hist_lo_exp }})
+#define HIST_SUB     {{ opt.hist_sub }}
+#define HIST_OCTAVES {{ opt.hist_octaves }}
+#define HIST_BINS    (HIST_OCTAVES * HIST_SUB + 2)   // [0] underflow, [HIST_BINS-1] overflow
+typedef struct __attribute__((aligned(CACHE_LINE))) {
+    unsigned long long n;
+    unsigned long long misses;
+    double mean;
+    double m2;
+    double min;
+    double max;
+    unsigned long long hist[HIST_BINS];
+} DelayStats;
+static DelayStats task_stats[MAX_TASKS];
+
+static void stats_init(DelayStats* s) {
+    memset(s, 0, sizeof(*s));
+    s->min = 1e300;
+    s->max = -1e300;
+}
+// bin b >= 1 covers 2^(HIST_LO_EXP + o) * [1 + j/HIST_SUB, 1 + (j+1)/HIST_SUB), b = 1 + o*HIST_SUB + j
+static inline int hist_bin(double x) {
+    if (!(x > 0.0)) return 0;
+    int e;
+    double m = frexp(x, &e);  // x = m * 2^e, m in [0.5, 1)
+    int o = e - 1 - HIST_LO_EXP;
+    if (o < 0) return 0;
+    if (o >= HIST_OCTAVES) return HIST_BINS - 1;
+    return 1 + o * HIST_SUB + (int)((2.0 * m - 1.0) * HIST_SUB);
+}
+static inline void stats_add(DelayStats* s, double x, int missed) {
+    s->n += 1;
+    double d = x - s->mean;
+    s->mean += d / (double)s->n;
+    s->m2 += d * (x - s->mean);
+    if (x < s->min) s->min = x;
+    if (x > s->max) s->max = x;
+    s->misses += missed;
+    s->hist[hist_bin(x)] += 1;
+}
+// pairwise combination (Chan et al.)
+static void stats_merge(DelayStats* a, const DelayStats* b) {
+    if (b->n == 0) return;
+    if (a->n == 0) { *a = *b; return; }
+    double na = (double)a->n, nb = (double)b->n, n = na + nb;
+    double d = b->mean - a->mean;
+    a->mean += d * nb / n;
+    a->m2   += b->m2 + d * d * na * nb / n;
+    a->n    += b->n;
+    a->misses += b->misses;
+    if (b->min < a->min) a->min = b->min;
+    if (b->max > a->max) a->max = b->max;
+    for (int i = 0; i < HIST_BINS; ++i) a->hist[i] += b->hist[i];
+}
+// {"id":..,"n":..,"misses":..,"mean":..,"var":..,"min":..,"max":..,"hist":[[bin,count],...]}
+static void stats_print_json(FILE* f, int id, const DelayStats* s) {
+    double var = (s->n > 1) ? s->m2 / (double)(s->n - 1) : 0.0;
+    fprintf(f, "{\"id\":%d,\"n\":%llu,\"misses\":%llu,\"mean\":%.17g,\"var\":%.17g,"
+               "\"min\":%.17g,\"max\":%.17g,\"hist\":[",
+            id, s->n, s->misses, s->n ? s->mean : 0.0, var,
+            s->n ? s->min : 0.0, s->n ? s->max : 0.0);
+    int first = 1;
+    for (int i = 0; i < HIST_BINS; ++i) {
+        if (!s->hist[i]) continue;
+        fprintf(f, "%s[%d,%llu]", first ? "" : ",", i, s->hist[i]);
+        first = 0;
+    }
+    fprintf(f, "]}");
+}
+{% endif %}
+
+{% if opt.counters %}
+// ---- per-job hardware / software counters (opt.counters) ----
+// Each task thread opens its own perf_event_open counters (pid 0 = this thread, any CPU)
+// before the start barrier and reads them right before and after every job, outside the
+// timed window. A counter perf refuses (no PMU in a VM, perf_event_paranoid, seccomp) is
+// reported as unavailable; context switches and page faults then fall back to
+// getrusage(RUSAGE_THREAD). Hardware counters retry user-space only when kernel counting
+// is not permitted. Per task: sum and max of the per-job deltas (mean = sum / jobs).
+enum { CTR_CYCLES, CTR_INSTRUCTIONS, CTR_LLC_MISSES, CTR_CTX_SWITCHES, CTR_PAGE_FAULTS, NUM_CTRS };
+static const char* const ctr_names[NUM_CTRS] = {
+    "cycles", "instructions", "llc_misses", "context_switches", "page_faults"
+};
+enum { SRC_NONE, SRC_PERF, SRC_RUSAGE };
+static const char* const src_names[] = { "none", "perf", "rusage" };
+typedef struct __attribute__((aligned(CACHE_LINE))) {
+    int fd[NUM_CTRS];
+    int src[NUM_CTRS];
+    unsigned long long jobs;
+    unsigned long long total[NUM_CTRS];
+    unsigned long long max[NUM_CTRS];
+} TaskCounters;
+static TaskCounters task_ctrs[MAX_TASKS];
+
+static int perf_open(uint32_t type, uint64_t config, int user_fallback) {
+    struct perf_event_attr pe;
+    memset(&pe, 0, sizeof(pe));
+    pe.size = sizeof(pe);
+    pe.type = type;
+    pe.config = config;
+    pe.exclude_hv = 1;
+    int fd = (int)syscall(SYS_perf_event_open, &pe, 0, -1, -1, PERF_FLAG_FD_CLOEXEC);
+    if (fd < 0 && user_fallback && (errno == EACCES || errno == EPERM)) {
+        pe.exclude_kernel = 1;
+        fd = (int)syscall(SYS_perf_event_open, &pe, 0, -1, -1, PERF_FLAG_FD_CLOEXEC);
+    }
+    return fd;
+}
+// context switches are counted in the kernel, so the software counters have no
+// user-space-only variant: getrusage replaces them instead
+static void counters_open(TaskCounters* c) {
+    static const uint32_t type[NUM_CTRS] = {
+        PERF_TYPE_HARDWARE, PERF_TYPE_HARDWARE, PERF_TYPE_HARDWARE, PERF_TYPE_SOFTWARE, PERF_TYPE_SOFTWARE
+    };
+    static const uint64_t config[NUM_CTRS] = {
+        PERF_COUNT_HW_CPU_CYCLES, PERF_COUNT_HW_INSTRUCTIONS, PERF_COUNT_HW_CACHE_MISSES,
+        PERF_COUNT_SW_CONTEXT_SWITCHES, PERF_COUNT_SW_PAGE_FAULTS
+    };
+    memset(c, 0, sizeof(*c));
+    for (int k = 0; k < NUM_CTRS; ++k) {
+        c->fd[k] = perf_open(type[k], config[k], type[k] == PERF_TYPE_HARDWARE);
+        if (c->fd[k] >= 0) c->src[k] = SRC_PERF;
+        else c->src[k] = (k == CTR_CTX_SWITCHES || k == CTR_PAGE_FAULTS) ? SRC_RUSAGE : SRC_NONE;
+    }
+}
+static inline void counters_read(const TaskCounters* c, unsigned long long v[NUM_CTRS]) {
+    int ru = 0;
+    for (int k = 0; k < NUM_CTRS; ++k) {
+        uint64_t x = 0;
+        if (c->src[k] == SRC_PERF && read(c->fd[k], &x, sizeof(x)) != (ssize_t)sizeof(x)) x = 0;
+        if (c->src[k] == SRC_RUSAGE) ru = 1;
+        v[k] = x;
+    }
+    if (ru) {
+        struct rusage r;
+        getrusage(RUSAGE_THREAD, &r);
+        if (c->src[CTR_CTX_SWITCHES] == SRC_RUSAGE)
+            v[CTR_CTX_SWITCHES] = (unsigned long long)(r.ru_nvcsw + r.ru_nivcsw);
+        if (c->src[CTR_PAGE_FAULTS] == SRC_RUSAGE)
+            v[CTR_PAGE_FAULTS] = (unsigned long long)(r.ru_minflt + r.ru_majflt);
+    }
+}
+static inline void counters_add(TaskCounters* c, const unsigned long long* before, const unsigned long long* after) {
+    for (int k = 0; k < NUM_CTRS; ++k) {
+        unsigned long long d = after[k] >= before[k] ? after[k] - before[k] : 0;
+        c->total[k] += d;
+        if (d > c->max[k]) c->max[k] = d;
+    }
+    c->jobs += 1;
+}
+static void counters_close(TaskCounters* c) {
+    for (int k = 0; k < NUM_CTRS; ++k)
+        if (c->src[k] == SRC_PERF) close(c->fd[k]);
+}
+// {"id":..,"jobs":..,"source":[..],"total":[..],"max":[..]} in ctr_names order, null = unavailable
+static void counters_print_json(FILE* f, int id, const TaskCounters* c) {
+    fprintf(f, "{\"id\":%d,\"jobs\":%llu,\"source\":[", id, c->jobs);
+    for (int k = 0; k < NUM_CTRS; ++k) fprintf(f, "%s\"%s\"", k ? "," : "", src_names[c->src[k]]);
+    fprintf(f, "],\"total\":[");
+    for (int k = 0; k < NUM_CTRS; ++k) {
+        if (c->src[k] == SRC_NONE) fprintf(f, "%snull", k ? "," : "");
+        else fprintf(f, "%s%llu", k ? "," : "", c->total[k]);
+    }
+    fprintf(f, "],\"max\":[");
+    for (int k = 0; k < NUM_CTRS; ++k) {
+        if (c->src[k] == SRC_NONE) fprintf(f, "%snull", k ? "," : "");
+        else fprintf(f, "%s%llu", k ? "," : "", c->max[k]);
+    }
+    fprintf(f, "]}");
+}
+{% endif %}
+
+// ---- per-task / per-core aggregates ----
+// Each task thread updates only its own task_agg[] entry (one cache line, no locks or
+// atomic read-modify-writes in the job loop); core_stats / job_counts / deadline_miss are
+// merged after join. The fields read by the adaptive stop rule while the run is still going
+// are published with relaxed stores (plain moves, single writer).
+typedef struct __attribute__((aligned(CACHE_LINE))) {
     double sum_delay;
+    double sum_sq_delay;
     double min_delay;
     double max_delay;
     unsigned long long delay_count;
     unsigned long long jobs;
     unsigned long long misses;
-} CoreAgg;
-static CoreAgg core_stats[NUM_CORES];
-static pthread_mutex_t core_mutex[NUM_CORES];
+} JobAgg;
+static JobAgg task_agg[MAX_TASKS];
+static JobAgg core_stats[MAX_CORES];
+
+static void agg_init(JobAgg* a) {
+    a->sum_delay = 0.0;
+    a->sum_sq_delay = 0.0;
+    a->min_delay = 1e300;
+    a->max_delay = -1e300;
+    a->delay_count = 0;
+    a->jobs = 0;
+    a->misses = 0;
+}
+static void agg_merge(JobAgg* a, const JobAgg* b) {
+    a->sum_delay    += b->sum_delay;
+    a->sum_sq_delay += b->sum_sq_delay;
+    a->delay_count  += b->delay_count;
+    if (b->min_delay < a->min_delay) a->min_delay = b->min_delay;
+    if (b->max_delay > a->max_delay) a->max_delay = b->max_delay;
+    a->jobs   += b->jobs;
+    a->misses += b->misses;
+}
+static inline void publish_add_u64(unsigned long long* p, unsigned long long v) {
+    __atomic_store_n(p, *p + v, __ATOMIC_RELAXED);
+}
+static inline void publish_add_f64(double* p, double v) {
+    double x = *p + v;
+    __atomic_store(p, &x, __ATOMIC_RELAXED);
+}
+
+// adaptive stop rule over all tasks so far (called by main while the tasks run)
+static int converged(void) {
+    unsigned long long n = 0, m = 0;
+    double s1 = 0.0, s2 = 0.0;
+    for (int i = 0; i < num_tasks; ++i) {
+        double x;
+        n += __atomic_load_n(&task_agg[i].jobs, __ATOMIC_RELAXED);
+        m += __atomic_load_n(&task_agg[i].misses, __ATOMIC_RELAXED);
+        __atomic_load(&task_agg[i].sum_delay, &x, __ATOMIC_RELAXED);    s1 += x;
+        __atomic_load(&task_agg[i].sum_sq_delay, &x, __ATOMIC_RELAXED); s2 += x;
+    }
+    if (n < CI_MIN_JOBS) return 0;
+    double dn = (double)n;
+    double mean = s1 / dn;
+    double var = (s2 - dn * mean * mean) / (dn - 1.0);
+    if (var < 0.0) var = 0.0;
+    // half-widths are compared squared (no libm: the default flags list -lm before the sources)
+    double z2 = CI_Z * CI_Z, tgt = ci_rel * mean;
+    if (z2 * var / dn > tgt * tgt) return 0;
+    // Wilson score interval, so a zero miss count still needs enough jobs
+    double p = (double)m / dn, k = CI_Z / (1.0 + z2 / dn);
+    double hw2 = k * k * (p * (1.0 - p) / dn + z2 / (4.0 * dn * dn));
+    return 1e4 * hw2 <= ci_miss * ci_miss;
+}
+
+// returns the stop reason; moves global_end_us forward to now once converged
+static const char* run_until_converged(void) {
+    sleep_until_us(global_start_us + run_min_us);
+    for (;;) {
+        uint64_t now = now_us();
+        if (now >= global_end_us) return "max";
+        if (converged()) { global_end_us = now; return "converged"; }
+        sleep_until_us(now + CHECK_INTERVAL_US);
+    }
+}
+
+{% if opt.log_format != "none" %}
+// jobs a task can release in [thread start, global_end_us]: one per period plus the
+// job started before global_start_us and the one started right before the end
+static size_t log_capacity(int period_us) {
+    uint64_t span_us = START_DELAY_US + run_max_us;
+    return (size_t)(span_us / (uint64_t)(period_us > 0 ? period_us : 1)) + 2;
+}
+{% endif %}
+
+// touch the stack pages the job loop may use, so they fault in before the start barrier
+static void prefault_stack(void) {
+    volatile char buf[STACK_PREFAULT];
+    for (size_t i = 0; i < sizeof(buf); i += 4096) buf[i] = 0;
+}
 
 void* task_function(void* arg) {
     TaskArgs* t = (TaskArgs*)arg;
@@ -201,9 +908,20 @@ void* task_function(void* arg) {
     // RT prio + affinity
     struct sched_param param; param.sched_priority = 10;
     pthread_setschedparam(pthread_self(), SCHED_FIFO, &param);
-    cpu_set_t cpuset; CPU_ZERO(&cpuset); CPU_SET(t->core_id, &cpuset);
+    cpu_set_t cpuset; CPU_ZERO(&cpuset); CPU_SET(core_base + t->core_id, &cpuset);
     pthread_setaffinity_np(pthread_self(), sizeof(cpu_set_t), &cpuset);
 
+{% if opt.counters %}
+    TaskCounters* tc = &task_ctrs[t->task_id];
+    counters_open(tc);
+{% endif %}
+{% if opt.trace %}
+    TraceRing* tr = &task_trace[t->task_id];
+{% endif %}
+{% if opt.fragstats %}
+    FragStats* fst = task_frag + (size_t)t->task_id * FRAG_COUNT;
+{% endif %}
+    prefault_stack();
     pthread_barrier_wait(&start_barrier);
 
     uint64_t next_release = global_start_us;
@@ -211,37 +929,57 @@ void* task_function(void* arg) {
     int k = 0;
 
     while (now < global_end_us) {
+{% if opt.counters %}
+        unsigned long long ctr_before[NUM_CTRS], ctr_after[NUM_CTRS];
+        counters_read(tc, ctr_before);
+{% endif %}
         uint64_t job_start = now_us();
+{% if opt.trace or opt.fragstats %}
+        for (int i = 0; i < t->segment_count; ++i) {
+            int64_t fs = now_ns();
+            t->segments[i]();
+            int64_t fe = now_ns();
+{% if opt.trace %}
+            trace_put(tr, fs, fe, k, i);
+{% endif %}
+{% if opt.fragstats %}
+            frag_add(&fst[t->frag_ids[i]], (uint64_t)(fe - fs));
+{% endif %}
+        }
+{% else %}
         for (int i = 0; i < t->segment_count; ++i) t->segments[i]();
+{% endif %}
         uint64_t job_end = now_us();
+{% if opt.counters %}
+        counters_read(tc, ctr_after);
+        counters_add(tc, ctr_before, ctr_after);
+{% endif %}
 
         uint64_t actual_us = job_end - job_start;
         double delay_ratio = (t->wcet_us > 0) ? ((double)actual_us / (double)t->wcet_us) : 0.0;
         int missed = (actual_us > (uint64_t)t->period_us) ? 1 : 0;
 
-        __sync_fetch_and_add(&job_counts[t->task_id], 1);
-        if (missed) __sync_fetch_and_add(&deadline_miss[t->task_id], 1);
-
-        // log
+{% if opt.stats %}
+        stats_add(&task_stats[t->task_id], delay_ratio, missed);
+{% endif %}
+{% if opt.log_format != "none" %}
+        // log (preallocated: no allocation or page fault here)
         TaskLog* tl = &task_logs[t->task_id];
-        if (tl->count == tl->capacity) {
-            size_t newcap = tl->capacity ? tl->capacity * 2 : 4096;
-            tl->entries = (TaskLogEntry*)realloc(tl->entries, newcap * sizeof(TaskLogEntry));
-            tl->capacity = newcap;
-        }
-        tl->entries[tl->count++] = (TaskLogEntry){ k, delay_ratio, missed };
-
-        // per-core stats
-        int c = t->core_id;
-        pthread_mutex_lock(&core_mutex[c]);
-        CoreAgg* cs = &core_stats[c];
-        cs->sum_delay   += delay_ratio;
-        cs->delay_count += 1;
-        if (delay_ratio < cs->min_delay) cs->min_delay = delay_ratio;
-        if (delay_ratio > cs->max_delay) cs->max_delay = delay_ratio;
-        cs->jobs   += 1;
-        cs->misses += missed;
-        pthread_mutex_unlock(&core_mutex[c]);
+        if (tl->count < tl->capacity)
+            tl->entries[tl->count++] = (TaskLogEntry){ .period_idx = k, .missed = missed, .delay_ratio = delay_ratio };
+        else
+            tl->dropped++;
+{% endif %}
+
+        // per-task stats (private cache line, merged per core after join)
+        JobAgg* ta = &task_agg[t->task_id];
+        publish_add_f64(&ta->sum_delay, delay_ratio);
+        publish_add_f64(&ta->sum_sq_delay, delay_ratio * delay_ratio);
+        ta->delay_count += 1;
+        if (delay_ratio < ta->min_delay) ta->min_delay = delay_ratio;
+        if (delay_ratio > ta->max_delay) ta->max_delay = delay_ratio;
+        publish_add_u64(&ta->jobs, 1);
+        publish_add_u64(&ta->misses, (unsigned long long)missed);
 
         k++;
         next_release += (uint64_t)t->period_us;
@@ -253,33 +991,124 @@ void* task_function(void* arg) {
             next_release = now;
         }
     }
+{% if opt.counters %}
+    counters_close(tc);
+{% endif %}
     return NULL;
 }
 
+{% if runner %}
+// ---- fragment table (index order = generator3.fragment_table()) ----
+static void (*fragment_table[])(void) = {
+{% for name in fragments %}    {{ name }},
+{% endfor %}
+};
+#define NUM_FRAGMENTS ((int)(sizeof(fragment_table) / sizeof(fragment_table[0])))
+
+// ---- taskset loader ----
+// format (whitespace separated, see generator3.format_taskset_spec):
+//   TASKSET 1
+//   <M> <N>
+//   <id> <core> <priority> <period_us> <wcet_us> <count> <frag_idx> * count   (N lines)
+static int load_taskset(FILE* f) {
+    char magic[16];
+    int version;
+    if (fscanf(f, "%15s %d", magic, &version) != 2 || strcmp(magic, "TASKSET") != 0 || version != 1) {
+        fprintf(stderr, "load_taskset: bad header\n"); return -1;
+    }
+    if (fscanf(f, "%d %d", &num_cores, &num_tasks) != 2
+        || num_cores < 1 || num_cores > MAX_CORES || num_tasks < 1 || num_tasks > MAX_TASKS) {
+        fprintf(stderr, "load_taskset: bad M/N\n"); return -1;
+    }
+    for (int i = 0; i < num_tasks; ++i) {
+        int id, core, priority, period, wcet, count;
+        if (fscanf(f, "%d %d %d %d %d %d", &id, &core, &priority, &period, &wcet, &count) != 6
+            || id != i || core < 0 || core >= num_cores || count < 0) {
+            fprintf(stderr, "load_taskset: bad task line %d\n", i); return -1;
+        }
+        void (**segs)(void) = (void (**)(void))malloc((count ? count : 1) * sizeof(*segs));
+        if (!segs) { perror("malloc"); return -1; }
+{% if opt.fragstats %}
+        int* ids = (int*)malloc((count ? count : 1) * sizeof(*ids));
+        if (!ids) { perror("malloc"); free(segs); return -1; }
+{% endif %}
+        for (int j = 0; j < count; ++j) {
+            int idx;
+            if (fscanf(f, "%d", &idx) != 1 || idx < 0 || idx >= NUM_FRAGMENTS) {
+                fprintf(stderr, "load_taskset: bad fragment index (task %d, pos %d)\n", i, j);
+{% if opt.fragstats %}
+                free(ids);
+{% endif %}
+                free(segs); return -1;
+            }
+            segs[j] = fragment_table[idx];
+{% if opt.fragstats %}
+            ids[j] = idx;
+{% endif %}
+        }
+        task_args[i] = (TaskArgs){
+            .task_id = id,
+            .core_id = core,
+            .period_us = period,
+            .wcet_us = wcet,
+            .segment_count = count,
+            .segments = segs,
+{% if opt.fragstats %}
+            .frag_ids = ids,
+{% endif %}
+        };
+    }
+    return 0;
+}
+{% else %}
 // ---- Jinja: segments arrays ----
 {% for task in taskset.tasks %}
 static void (*segments_{{ task.id }}[])() = {
 {% for seg in task.segments %}{% for api in seg.apis %}    {{ api }},
 {% endfor %}{% endfor %}
 };
+{% if opt.fragstats %}
+static const int frag_ids_{{ task.id }}[] = {
+{% for seg in task.segments %}{% for api in seg.apis %}    {{ fragment_index[api] }},
+{% endfor %}{% endfor %}    -1
+};
+{% endif %}
 {% endfor %}
+{% endif %}
+
+int main(int argc, char** argv) {
+{% if runner %}
+    // taskset source: argv[1], or stdin when absent / "-"
+    FILE* spec = (argc > 1 && strcmp(argv[1], "-") != 0) ? fopen(argv[1], "r") : stdin;
+    if (!spec) { perror("fopen"); return 1; }
+    int rc = load_taskset(spec);
+    if (spec != stdin) fclose(spec);
+    if (rc != 0) return 1;
+{% else %}
+    (void)argc; (void)argv;
+{% endif %}
+
+    const char* cb = getenv("TASKSET_CORE_BASE");
+    if (cb) core_base = atoi(cb);
+    const char* ev;
+    if ((ev = getenv("TASKSET_MAX_SEC")) && atof(ev) > 0) run_max_us = (uint64_t)(atof(ev) * 1e6);
+    if ((ev = getenv("TASKSET_MIN_SEC")) && atof(ev) >= 0) run_min_us = (uint64_t)(atof(ev) * 1e6);
+    if ((ev = getenv("TASKSET_CI_REL")))  ci_rel  = atof(ev);
+    if ((ev = getenv("TASKSET_CI_MISS"))) ci_miss = atof(ev);
+    if (run_min_us > run_max_us) run_min_us = run_max_us;
 
-int main() {
     // init
-    for (int i = 0; i < NUM_TASKS; ++i) {
-        task_logs[i].entries = NULL; task_logs[i].capacity = 0; task_logs[i].count = 0;
+    for (int i = 0; i < num_tasks; ++i) {
+        task_logs[i].entries = NULL; task_logs[i].capacity = 0; task_logs[i].count = 0; task_logs[i].dropped = 0;
         job_counts[i] = 0; deadline_miss[i] = 0;
+        agg_init(&task_agg[i]);
+{% if opt.stats %}
+        stats_init(&task_stats[i]);
+{% endif %}
     }
-    for (int c = 0; c < NUM_CORES; ++c) {
-        core_stats[c].sum_delay = 0.0;
-        core_stats[c].min_delay = 1e300;
-        core_stats[c].max_delay = -1e300;
-        core_stats[c].delay_count = 0;
-        core_stats[c].jobs = 0;
-        core_stats[c].misses = 0;
-        pthread_mutex_init(&core_mutex[c], NULL);
-    }
+    for (int c = 0; c < num_cores; ++c) agg_init(&core_stats[c]);
 
+{% if not runner %}
     {% for task in taskset.tasks %}
     task_args[{{ task.id }}] = (TaskArgs){
         .task_id = {{ task.id }},
@@ -287,28 +1116,86 @@ int main() {
         .period_us = {{ task.period }},
         .wcet_us = {{ task.wcet }},
         .segment_count = {{ task.segments | map(attribute='apis') | map('length') | sum }},
-        .segments = segments_{{ task.id }}
+        .segments = segments_{{ task.id }},
+{% if opt.fragstats %}
+        .frag_ids = frag_ids_{{ task.id }},
+{% endif %}
     };
     {% endfor %}
+{% endif %}
+
+{% if opt.log_format != "none" %}
+    // per-job logs: allocate the whole run up front and prefault every page
+    for (int i = 0; i < num_tasks; ++i) {
+        size_t cap = log_capacity(task_args[i].period_us);
+        task_logs[i].entries = (TaskLogEntry*)malloc(cap * sizeof(TaskLogEntry));
+        if (!task_logs[i].entries) { perror("malloc"); return 1; }
+        memset(task_logs[i].entries, 0, cap * sizeof(TaskLogEntry));
+        task_logs[i].capacity = cap;
+    }
+{% endif %}
+{% if opt.fragstats %}
+    // per-fragment statistics: calloc + touch every page before the threads start
+    task_frag = (FragStats*)calloc((size_t)num_tasks * FRAG_COUNT, sizeof(FragStats));
+    if (!task_frag) { perror("calloc"); return 1; }
+    memset(task_frag, 0, (size_t)num_tasks * FRAG_COUNT * sizeof(FragStats));
+{% endif %}
+{% if opt.trace %}
+    // trace rings: allocated and prefaulted up front like the logs
+    for (int i = 0; i < num_tasks; ++i) {
+        task_trace[i].ev = (TraceEvent*)malloc((size_t)TRACE_CAP * sizeof(TraceEvent));
+        if (!task_trace[i].ev) { perror("malloc"); return 1; }
+        memset(task_trace[i].ev, 0, (size_t)TRACE_CAP * sizeof(TraceEvent));
+        task_trace[i].written = 0;
+    }
+{% endif %}
+
+    // keep everything resident (logs, stats, fragment data, thread stacks); without
+    // CAP_IPC_LOCK / enough RLIMIT_MEMLOCK this fails and the run continues unlocked
+    int locked = (mlockall(MCL_CURRENT | MCL_FUTURE) == 0);
+    if (!locked) fprintf(stderr, "mlockall: %s (running unlocked)\n", strerror(errno));
 
-    pthread_barrier_init(&start_barrier, NULL, NUM_TASKS + 1);
-    global_start_us = now_us() + 100000ULL;
-    global_end_us   = global_start_us + (uint64_t)RUN_DURATION_SEC * 1000000ULL;
+    pthread_barrier_init(&start_barrier, NULL, num_tasks + 1);
+    global_start_us = now_us() + START_DELAY_US;
+    global_end_us   = global_start_us + run_max_us;
 
-    for (int i = 0; i < NUM_TASKS; ++i) {
-        if (pthread_create(&threads[i], NULL, task_function, &task_args[i]) != 0) {
-            perror("pthread_create"); return 1;
+    for (int i = 0; i < num_tasks; ++i) {
+        int err = pthread_create(&threads[i], NULL, task_function, &task_args[i]);
+        if (err == EAGAIN && locked) {
+            // MCL_FUTURE pushed the new stack over RLIMIT_MEMLOCK: drop the lock and retry
+            munlockall();
+            locked = 0;
+            fprintf(stderr, "pthread_create: memlock limit reached (running unlocked)\n");
+            err = pthread_create(&threads[i], NULL, task_function, &task_args[i]);
+        }
+        if (err != 0) {
+            errno = err; perror("pthread_create"); return 1;
         }
     }
 
     pthread_barrier_wait(&start_barrier);
-    for (int i = 0; i < NUM_TASKS; ++i) pthread_join(threads[i], NULL);
+    const char* stop_reason = (ci_rel > 0.0) ? run_until_converged() : "fixed";
+    for (int i = 0; i < num_tasks; ++i) pthread_join(threads[i], NULL);
+    double run_sec = (double)(global_end_us - global_start_us) / 1e6;
+{% if opt.log_format != "none" %}
+    for (int i = 0; i < num_tasks; ++i)
+        if (task_logs[i].dropped)
+            fprintf(stderr, "task %d: %zu jobs beyond the preallocated log were not logged\n",
+                    i, task_logs[i].dropped);
+{% endif %}
+
+    // merge per-task accumulators
+    for (int i = 0; i < num_tasks; ++i) {
+        agg_merge(&core_stats[task_args[i].core_id], &task_agg[i]);
+        job_counts[i]    = (int)task_agg[i].jobs;
+        deadline_miss[i] = (int)task_agg[i].misses;
+    }
 
     // per-core
     printf("\nPer-core delay ratio (actual/wcet) and miss rate:\n");
     printf("Core | delay_count    mean        min        max  | jobs   miss  miss_rate(%%)\n");
     printf("-----|--------------------------------------------------------------------------\n");
-    for (int c = 0; c < NUM_CORES; ++c) {
+    for (int c = 0; c < num_cores; ++c) {
         double mean = core_stats[c].delay_count ? (core_stats[c].sum_delay / (double)core_stats[c].delay_count) : 0.0;
         double mr = core_stats[c].jobs ? (100.0 * (double)core_stats[c].misses / (double)core_stats[c].jobs) : 0.0;
         printf("%4d | %11llu  %10.6f  %10.6f  %10.6f | %5llu  %4llu  %10.2f\n",
@@ -326,7 +1213,7 @@ int main() {
     int total_jobs = 0, total_misses = 0;
     printf("\nPer-task summary:\n");
     printf("task | jobs  miss  miss_rate(%%)\n");
-    for (int i = 0; i < NUM_TASKS; ++i) {
+    for (int i = 0; i < num_tasks; ++i) {
         total_jobs   += job_counts[i];
         total_misses += deadline_miss[i];
         double mr = job_counts[i] ? (100.0 * (double)deadline_miss[i] / (double)job_counts[i]) : 0.0;
@@ -334,9 +1221,74 @@ int main() {
     }
     double global_miss_rate = total_jobs ? (100.0 * (double)total_misses / (double)total_jobs) : 0.0;
     printf("\nGlobal miss rate: %.2f%%  (misses=%d / jobs=%d)\n", global_miss_rate, total_misses, total_jobs);
+    printf("Run duration: %.3f s (%s)\n", run_sec, stop_reason);
 
+{% if opt.stats %}
+    // machine-readable summary: one line, "SUMMARY " + JSON
+    {
+        static DelayStats core_sum[MAX_CORES];
+        DelayStats all;
+        stats_init(&all);
+        for (int c = 0; c < num_cores; ++c) stats_init(&core_sum[c]);
+        for (int i = 0; i < num_tasks; ++i) {
+            stats_merge(&core_sum[task_args[i].core_id], &task_stats[i]);
+            stats_merge(&all, &task_stats[i]);
+        }
+        printf("SUMMARY {\"version\":1,\"duration_s\":%.6f,\"stop\":\"%s\","
+               "\"hist\":{\"lo_exp\":%d,\"sub\":%d,\"octaves\":%d},\"global\":",
+               run_sec, stop_reason, HIST_LO_EXP, HIST_SUB, HIST_OCTAVES);
+        stats_print_json(stdout, -1, &all);
+        printf(",\"cores\":[");
+        for (int c = 0; c < num_cores; ++c) {
+            if (c) printf(",");
+            stats_print_json(stdout, c, &core_sum[c]);
+        }
+        printf("],\"tasks\":[");
+        for (int i = 0; i < num_tasks; ++i) {
+            if (i) printf(",");
+            stats_print_json(stdout, i, &task_stats[i]);
+        }
+        printf("]");
+{% if opt.counters %}
+        printf(",\"counters\":{\"names\":[");
+        for (int k = 0; k < NUM_CTRS; ++k) printf("%s\"%s\"", k ? "," : "", ctr_names[k]);
+        printf("],\"tasks\":[");
+        for (int i = 0; i < num_tasks; ++i) {
+            if (i) printf(",");
+            counters_print_json(stdout, i, &task_ctrs[i]);
+        }
+        printf("]}");
+{% endif %}
+{% if opt.fragstats %}
+        printf(",\"fragments\":{\"names\":[");
+        for (int k = 0; k < FRAG_COUNT; ++k) printf("%s\"%s\"", k ? "," : "", fragment_names[k]);
+        printf("],\"hist\":\"log4_ns\",\"tasks\":[");
+        for (int i = 0; i < num_tasks; ++i) {
+            if (i) printf(",");
+            fragstats_print_json(stdout, i, task_frag + (size_t)i * FRAG_COUNT);
+        }
+        printf("]}");
+{% endif %}
+        printf("}\n");
+    }
+{% endif %}
+
+{% if opt.log_format == "bin" %}
+    // binary log: TaskLogHeader + packed TaskLogEntry[count]
+    for (int i = 0; i < num_tasks; ++i) {
+        char fname[64]; snprintf(fname, sizeof(fname), "task_%d_delays.bin", i);
+        FILE* f = fopen(fname, "wb");
+        if (!f) { perror("fopen"); continue; }
+        TaskLogHeader h = { {'T', 'L', 'O', 'G'}, 1, (uint32_t)sizeof(TaskLogEntry), i,
+                            (uint64_t)task_logs[i].count };
+        fwrite(&h, sizeof(h), 1, f);
+        fwrite(task_logs[i].entries, sizeof(TaskLogEntry), task_logs[i].count, f);
+        fclose(f);
+        free(task_logs[i].entries);
+    }
+{% elif opt.log_format == "csv" %}
     // CSV
-    for (int i = 0; i < NUM_TASKS; ++i) {
+    for (int i = 0; i < num_tasks; ++i) {
         char fname[64]; snprintf(fname, sizeof(fname), "task_%d_delays.csv", i);
         FILE* f = fopen(fname, "w");
         if (!f) { perror("fopen"); continue; }
@@ -348,17 +1300,118 @@ int main() {
         fclose(f);
         free(task_logs[i].entries);
     }
-    for (int c = 0; c < NUM_CORES; ++c) pthread_mutex_destroy(&core_mutex[c]);
+{% endif %}
+{% if opt.trace %}
+    for (int i = 0; i < num_tasks; ++i) {
+        trace_dump(i, task_args[i].core_id);
+        free(task_trace[i].ev);
+    }
+{% endif %}
+{% if opt.fragstats %}
+    free(task_frag);
+{% endif %}
+{% if runner %}
+    for (int i = 0; i < num_tasks; ++i) {
+        free(task_args[i].segments);
+{% if opt.fragstats %}
+        free((void*)task_args[i].frag_ids);
+{% endif %}
+    }
+{% endif %}
     return 0;
 }
 """
 
 
 
+# ------------------------- Render Options -------------------------
+# 模板开关（generate_c_file / generate_runner_file 的关键字参数）
+#   log_format: "bin" -> task_<id>_delays.bin（头 + 定长记录，供 np.memmap 读取）; "csv" -> task_<id>_delays.csv;
+#               "none" -> 不记录逐作业日志
+#   stats:      在线统计 delay_ratio（Welford 均值/方差、min/max、miss、对数-线性直方图），结束时输出一行 SUMMARY
+#   hist_*:     直方图范围 2^lo_exp .. 2^(lo_exp+octaves)，每个倍频程 sub 个线性子区间
+#   counters:   每个任务线程用 perf_event_open 计数（cycles/instructions/LLC miss/上下文切换/缺页），
+#               perf 不可用时上下文切换与缺页退回 getrusage(RUSAGE_THREAD)；逐作业差值的总和与最大值写入
+#               SUMMARY 的 "counters"（需 stats）
+#   fragstats:  每个任务线程按片段统计调用次数、耗时总和/最大值与对数-线性直方图（ns），写入 SUMMARY 的
+#               "fragments"（需 stats；BenchmarkTool/inflation.py 据此计算共享/para_ 变体的膨胀系数）
+#   trace:      >0 时每个任务线程记录片段级事件（开始/结束时间、作业号、片段位置）到该容量的环形缓冲区，
+#               结束后写入 task_<id>_trace.bin（BenchmarkTool/trace_export.py 转成 Chrome trace JSON）；0 = 关闭
+DEFAULT_OPTIONS = {
+    "log_format": "bin",
+    "stats": True,
+    "hist_lo_exp": -4,
+    "hist_sub": 16,
+    "hist_octaves": 12,
+    "counters": False,
+    "trace": 0,
+    "fragstats": False,
+}
+
+
+def render_options(options):
+    unknown = set(options) - set(DEFAULT_OPTIONS)
+    if unknown:
+        raise ValueError(f"unknown render options: {sorted(unknown)}")
+    opt = {**DEFAULT_OPTIONS, **options}
+    if not isinstance(opt["trace"], int) or opt["trace"] < 0:
+        raise ValueError(f"render option trace must be a non-negative event count: {opt['trace']!r}")
+    for key in ("counters", "fragstats"):
+        if opt[key] and not opt["stats"]:
+            raise ValueError(f"render option {key} needs stats (it is part of the SUMMARY record)")
+    return opt
+
+
+# ------------------------- Data-driven Runner -------------------------
+def fragment_table():
+    """Fragment names in runner table order: shared/para pairs first, then benchmark fragments."""
+    names = []
+    for api in shared_api_lib:
+        names.append(api["name"])
+        names.append(api["para_name"])
+    for api in normal_api_lib:
+        names.append(api["name"])
+    return names
+
+
+def format_taskset_spec(taskset):
+    """Render a taskset as the text description read by the prebuilt runner (load_taskset)."""
+    index = {name: i for i, name in enumerate(fragment_table())}
+    lines = ["TASKSET 1", f"{taskset['meta']['M']} {len(taskset['tasks'])}"]
+    for task in taskset["tasks"]:
+        frags = [index[api] for seg in task["segments"] for api in seg["apis"]]
+        lines.append(" ".join(str(v) for v in (
+            task["id"], task["core"], task["priority"], task["period"], task["wcet"], len(frags), *frags
+        )))
+    return "\n".join(lines) + "\n"
+
+
+def generate_taskset_spec(taskset, output_path="taskset.txt"):
+    with open(output_path, "w") as f:
+        f.write(format_taskset_spec(taskset))
+
+
+def generate_taskset_json(taskset, output_path="taskset.json"):
+    """Full taskset (segments and their fragments), e.g. to name the events of a trace."""
+    with open(output_path, "w") as f:
+        json.dump(taskset, f)
+
+
+def generate_runner_file(output_path="taskset_runner.c", **options):
+    """Write the data-driven runner source: same measurement loop, taskset loaded at runtime."""
+    template = Template(c_template)
+    code = template.render(runner=True, fragments=fragment_table(), opt=render_options(options))
+    with open(output_path, "w") as f:
+        f.write(code)
+    print(f"✅ Runner C code written to {output_path}")
+
+
 # ------------------------- Generator Entrypoint -------------------------
-def generate_c_file(taskset, output_path="generated_taskset.c"):
+def generate_c_file(taskset, output_path="generated_taskset.c", **options):
     template = Template(c_template)
-    code = template.render(taskset=taskset)
+    fragments = fragment_table()
+    code = template.render(taskset=taskset, runner=False, opt=render_options(options), fragments=fragments,
+                           fragment_index={name: i for i, name in enumerate(fragments)})
     with open(output_path, "w") as f:
         f.write(code)
     print(f"✅ C code written to {output_path}")
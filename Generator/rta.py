@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+"""
+Response-time analysis of generator3 tasksets, vectorized over many tasksets at once.
+
+For every task the analysis bounds the job window the runner measures (job start to job
+end; a miss is a window longer than the period) by the usual fixed-point iteration
+
+    R_i = C_i + B_i + sum_{j in hp(i)} ceil(R_i / T_j) * C_j
+
+on the task's core, where
+
+  C_i  sum of the fragment costs of one job (generator3.api_cost_map, us; a para_ variant
+       costs what its shared variant costs uncontended) times `cost_scale`;
+  T_i  the period (= deadline);
+  B_i  blocking on the shared RaF fragments: every call of a shared fragment of kind k
+       can wait for each other task that calls kind k to run that fragment once, i.e.
+       B_i = sum_k calls_i(k) * cost_k * (users(k) - 1)   (FIFO-ordered waiting assumed;
+       rwlock readers do not exclude each other and add no blocking);
+  hp(i) the tasks that can run on the core while a job of i has started but not finished:
+       interference="fifo" (what the runner does: every task thread has the same SCHED_FIFO
+       priority, so a started job is only displaced while it blocks, which a job without
+       API fragments never does) -> every other task on the core if job i calls any API
+       fragment, nobody otherwise; interference="fp" -> the tasks with a higher `priority`
+       value (preemptive fixed priority, SCHED_FIFO numbering).
+
+A taskset is `schedulable` when R_i <= T_i for every task: the analysis then predicts no
+misses. This is a heuristic rather than a proof: it is only as safe as the costs (mean costs
+by default; `cost_scale` adds margin) and the model, which treats each shared fragment call as
+one FIFO-ordered critical section while the real fragments take non-FIFO pthread mutex / spin /
+rwlock locks many times per call. benchmark_tool4/5 --prune log the prediction next to the
+measurement, so violations show up in predictions.csv, and only accept --prune skip with a
+conservative cost basis.
+
+    res = analyse_batch(tasksets)            # arrays over S tasksets
+    res = analyse_taskset(taskset)           # one taskset: plain Python values
+"""
+
+from collections import Counter
+
+import numpy as np
+
+from generator3 import api_cost_map, shared_api_lib
+
+INTERFERENCE = ("fifo", "fp")
+
+# shared fragments whose callers do not exclude each other (pthread_rwlock_rdlock)
+NON_EXCLUSIVE = {"rwlock"}
+
+_SHARED = [api["name"] for api in shared_api_lib]
+_PARA = {api["para_name"] for api in shared_api_lib}
+_EXCLUSIVE = np.array([api.get("kind") not in NON_EXCLUSIVE for api in shared_api_lib])
+
+
+def pack(tasksets, cost_scale: float = 1.0):
+    """
+    Padded arrays over S tasksets with at most N tasks each (missing tasks: valid=False):
+    C, T, wcet (S, N) in us, core / priority (S, N), api (S, N) True if the job calls any
+    API fragment, calls (S, N, K) shared calls per kind, kcost (K,) cost per shared kind.
+    """
+    S = len(tasksets)
+    N = max((len(ts["tasks"]) for ts in tasksets), default=0)
+    K = len(_SHARED)
+    kidx = {name: k for k, name in enumerate(_SHARED)}
+    # read at call time: apply_cost_profile may have replaced the costs
+    cost = dict(api_cost_map)
+    cost.update({api["para_name"]: api["cost"] for api in shared_api_lib})
+    C = np.zeros((S, N))
+    T = np.ones((S, N))
+    wcet = np.ones((S, N))
+    core = np.full((S, N), -1, dtype=np.int64)
+    prio = np.zeros((S, N), dtype=np.int64)
+    valid = np.zeros((S, N), dtype=bool)
+    api = np.zeros((S, N), dtype=bool)
+    calls = np.zeros((S, N, K))
+    for s, ts in enumerate(tasksets):
+        for i, task in enumerate(ts["tasks"]):
+            n = Counter(a for seg in task["segments"] for a in seg["apis"])
+            C[s, i] = sum(cost[a] * c for a, c in n.items())
+            T[s, i] = task["period"]
+            wcet[s, i] = task["wcet"]
+            core[s, i] = task["core"]
+            prio[s, i] = task["priority"]
+            valid[s, i] = True
+            for a, c in n.items():
+                k = kidx.get(a)
+                if k is not None:
+                    calls[s, i, k] = c
+                    api[s, i] = True
+                elif a in _PARA:
+                    api[s, i] = True
+    kcost = np.array([cost[name] for name in _SHARED])
+    return {"C": C * cost_scale, "T": T, "wcet": wcet, "core": core, "priority": prio, "valid": valid,
+            "api": api, "calls": calls, "kcost": kcost * cost_scale}
+
+
+def blocking(p):
+    """B (S, N): per-task blocking on the shared fragments (see module docstring)."""
+    users = (p["calls"] > 0).sum(axis=1, keepdims=True)            # (S, 1, K) tasks calling kind k
+    others = np.maximum(users - (p["calls"] > 0), 0)                # (S, N, K) excluding the task itself
+    per_kind = p["calls"] * p["kcost"] * others * _EXCLUSIVE
+    return per_kind.sum(axis=2)
+
+
+def interferers(p, interference: str = "fifo"):
+    """hp (S, N, N): hp[s, i, j] True if task j can run inside a job window of task i."""
+    same = (p["core"][:, :, None] == p["core"][:, None, :]) & p["valid"][:, :, None] & p["valid"][:, None, :]
+    same &= ~np.eye(same.shape[1], dtype=bool)[None]
+    if interference == "fifo":
+        return same & p["api"][:, :, None]
+    if interference == "fp":
+        return same & (p["priority"][:, None, :] > p["priority"][:, :, None])
+    raise ValueError(f"unknown interference model: {interference}")
+
+
+def response_times(p, B=None, interference: str = "fifo", max_iter: int = 1000):
+    """
+    R (S, N) by fixed-point iteration, all tasks of all tasksets at once. A task stops
+    iterating once it converged or exceeded its period (then R only says "> T").
+    """
+    if B is None:
+        B = blocking(p)
+    hp = interferers(p, interference)
+    C, T = p["C"], p["T"]
+    R = C + B
+    active = p["valid"].copy()
+    for _ in range(max_iter):
+        if not active.any():
+            break
+        demand = np.einsum("sij,sij->si", hp, np.ceil(R[:, :, None] / T[:, None, :]) * C[:, None, :])
+        R_new = np.where(active, C + B + demand, R)
+        active &= (R_new != R) & (R_new <= T)
+        R = R_new
+    return np.where(p["valid"], R, 0.0)
+
+
+def analyse_batch(tasksets, interference: str = "fifo", cost_scale: float = 1.0):
+    """
+    Dict of arrays over the tasksets: R, B (S, N); schedulable (S,); rt_ratio = max R/T;
+    delay_bound = max R/wcet (bound of the runner's delay_ratio); blocking = max B.
+    """
+    p = pack(tasksets, cost_scale)
+    B = blocking(p)
+    R = response_times(p, B, interference)
+    valid = p["valid"]
+    rt = np.where(valid, R / p["T"], 0.0)
+    return {
+        "R": R, "B": B,
+        "schedulable": (rt <= 1.0).all(axis=1),
+        "rt_ratio": rt.max(axis=1, initial=0.0),
+        "delay_bound": np.where(valid, R / p["wcet"], 0.0).max(axis=1, initial=0.0),
+        "blocking": np.where(valid, B, 0.0).max(axis=1, initial=0.0),
+    }
+
+
+def analyse_taskset(taskset, interference: str = "fifo", cost_scale: float = 1.0):
+    """analyse_batch for one taskset: {"schedulable", "rt_ratio", "delay_bound", "blocking", "R"}."""
+    res = analyse_batch([taskset], interference, cost_scale)
+    n = len(taskset["tasks"])
+    return {
+        "schedulable": bool(res["schedulable"][0]),
+        "rt_ratio": float(res["rt_ratio"][0]),
+        "delay_bound": float(res["delay_bound"][0]),
+        "blocking": float(res["blocking"][0]),
+        "R": res["R"][0, :n].tolist(),
+    }
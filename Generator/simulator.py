@@ -0,0 +1,745 @@
+# -*- coding: utf-8 -*-
+"""
+Discrete-event simulation of generator3 tasksets: the job loop of the generated program /
+the runner, executed in simulated time instead of on hardware.
+
+Model (what the runner does, with fragment costs instead of measured times):
+
+  threads   one per task, pinned to its core, all SCHED_FIFO at the same priority: on a core
+            the running thread keeps the CPU until it blocks or sleeps, woken threads queue
+            behind it in FIFO order (task id order at the start);
+  jobs      the first job starts right after the start barrier (t = 0), the next releases
+            follow at START_DELAY_US + k * period; a job that ends after its next release
+            starts the next one immediately (overrun realign), and the loop ends after the
+            first job that ends at or after START_DELAY_US + duration;
+  fragments every fragment runs for its generator3.api_cost_map cost (us, times
+            `cost_scale`; a para_ variant costs what its shared variant costs uncontended).
+            NF fragments, para_ variants and the shared rwlock fragment (read locks) never
+            wait. Every other shared fragment call is one critical section on the global lock
+            of its kind, granted in FIFO order and handed over to the next waiter on release;
+            a waiter on the spinlock fragment keeps its CPU, the others (semaphore, mutex,
+            data queue, eventfd) sleep and let the next thread of the core run, and need the
+            CPU back before their critical section starts;
+  blocking  the granularity is the whole fragment: a shared fragment is one critical section
+            for its full cost. The real fragments (LinuxAPI) lock and unlock repeatedly inside
+            their body, with pthread / kernel primitives that are not FIFO, so waiting and
+            handover in hardware interleave much more finely. Results of --backend sim are a
+            model for screening parameter spaces, not a substitute for hardware measurements;
+  outputs   actual = job end - job start in whole us (like now_us()), delay_ratio =
+            actual / wcet, missed = actual > period.
+
+simulate() returns the SUMMARY record of the run (run_summary.py format, "stop": "fixed",
+plus "backend": "sim"), so the benchmark tools consume it like a hardware run. Only lock
+calls interact, so events are only created at lock calls and job boundaries; a thread
+that stays ahead of every other event keeps running without going through the heap, and a
+waiter whose CPU nobody else can take (spinlock, or alone on its core) reserves the lock
+instead of waiting for a grant event. The event loop runs compiled (_KERNEL_C, built with
+gcc or $CC on first use and kept in the temp directory); the same loop in Python is the
+fallback where no compiler is available. A 5 s run of a 16-core case at Cr = contention = 1
+takes about 0.03 s with 16 tasks and 0.2 s with 64 tasks (one CPU; about 0.7 s and 2 s with
+the Python loop): 64 tasks overload the locks, so nearly every lock call waits and needs a
+grant event of its own.
+
+    summary = simulate(taskset, duration_s=5.0)
+    python simulator.py --M 16 --N 16 --Cr 0.5 --contention 0.5 --duration 5
+"""
+
+import argparse
+import ctypes
+import hashlib
+import heapq
+import json
+import math
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+from collections import deque
+from pathlib import Path
+
+import numpy as np
+
+from generator3 import DEFAULT_OPTIONS, PARTITIONERS, api_cost_map, core_loads, generate_taskset, shared_api_lib
+
+START_DELAY_US = 100000.0   # = START_DELAY_US of the C template
+RUN_DURATION_SEC = 5.0      # = RUN_DURATION_SEC of the C template (default run length)
+
+# shared fragments whose callers do not exclude each other (pthread_rwlock_rdlock)
+NON_EXCLUSIVE = {"rwlock"}
+# shared fragments whose waiters keep spinning on their CPU
+SPINNING = {"spin"}
+
+_LOCK = {api["name"]: k for k, api in enumerate(shared_api_lib) if api.get("kind") not in NON_EXCLUSIVE}
+_SPIN = [api.get("kind") in SPINNING for api in shared_api_lib]
+
+# event kinds
+_STEP, _GRANT, _RELEASE = 0, 1, 2
+
+
+def task_plan(task, cost_scale: float = 1.0):
+    """
+    One job of `task` as (pre, locks, cs, tail): lock call k waits for lock locks[k] after
+    pre[k] us of non-waiting work and holds it for cs[k] us; tail is the work after the
+    last lock call.
+    """
+    cost = dict(api_cost_map)
+    cost.update({api["para_name"]: api["cost"] for api in shared_api_lib})
+    pre, locks, cs = [], [], []
+    acc = 0.0
+    for seg in task["segments"]:
+        for a in seg["apis"]:
+            c = cost[a] * cost_scale
+            k = _LOCK.get(a)
+            if k is None:
+                acc += c
+            else:
+                pre.append(acc)
+                locks.append(k)
+                cs.append(c)
+                acc = 0.0
+    return pre, locks, cs, acc
+
+
+# C version of the event loop of _jobs_py, built once per source / compiler into the temp
+# directory and loaded with ctypes. Same events, same order, same double arithmetic (no
+# contraction into FMA), so both loops give identical job times.
+_KERNEL_C = r"""
+#include <math.h>
+#include <stdlib.h>
+
+enum { STEP, GRANT, RELEASE };
+
+typedef struct { double t; int i; } ev_t;                 /* event: (time, thread) */
+typedef struct { int *buf; int head, len, cap; } fifo_t;  /* ring buffer, cap = threads */
+
+static int ev_less(ev_t a, ev_t b) { return a.t < b.t || (a.t == b.t && a.i < b.i); }
+
+static void sift_down(ev_t *h, int n, int k, ev_t e)
+{
+    for (;;) {
+        int c = 2 * k + 1;
+        if (c >= n) break;
+        if (c + 1 < n && ev_less(h[c + 1], h[c])) c++;
+        if (!ev_less(h[c], e)) break;
+        h[k] = h[c];
+        k = c;
+    }
+    h[k] = e;
+}
+
+static void push(ev_t *h, int *n, double t, int i)
+{
+    ev_t e = { t, i };
+    int k = (*n)++;
+    while (k > 0) {
+        int p = (k - 1) / 2;
+        if (!ev_less(e, h[p])) break;
+        h[k] = h[p];
+        k = p;
+    }
+    h[k] = e;
+}
+
+static ev_t pop(ev_t *h, int *n)
+{
+    ev_t top = h[0];
+    if (--(*n) > 0) sift_down(h, *n, 0, h[*n]);
+    return top;
+}
+
+static int front(const fifo_t *q) { return q->buf[q->head]; }
+static void append(fifo_t *q, int i) { q->buf[(q->head + q->len++) % q->cap] = i; }
+static int popleft(fifo_t *q) { int i = q->buf[q->head]; q->head = (q->head + 1) % q->cap; q->len--; return i; }
+
+typedef struct {
+    const int *ncalls, *call_off, *pre_off, *locks, *core;
+    const double *cs, *pre;
+    const unsigned char *alone, *spin;
+    int *kind, *pos, *owns, *busy;
+    double *free_at, *jstart;
+    fifo_t *waiters, *ready;
+    ev_t *heap;
+    int nheap;
+} sim_t;
+
+#define LOCK(s, i, k) ((s)->locks[(s)->call_off[i] + (k)])
+#define CS(s, i, k)   ((s)->cs[(s)->call_off[i] + (k)])
+#define PRE(s, i, k)  ((s)->pre[(s)->pre_off[i] + (k)])
+
+static void hand_over(sim_t *s, int r, double t)
+{
+    fifo_t *q = &s->waiters[r];
+    while (q->len) {
+        int w = front(q), k;
+        if (!(s->spin[r] || s->alone[w])) {
+            s->kind[w] = GRANT;
+            push(s->heap, &s->nheap, t, w);
+            break;
+        }
+        popleft(q);
+        s->busy[s->core[w]] = 1;
+        k = s->pos[w];
+        t += CS(s, w, k);
+        s->pos[w] = k + 1;
+        s->kind[w] = STEP;
+        push(s->heap, &s->nheap, t + PRE(s, w, k + 1), w);
+    }
+    s->free_at[r] = t;
+}
+
+static ev_t resume(sim_t *s, int i, double t)
+{
+    int r = s->owns[i], k;
+    double t_rel;
+    ev_t e;
+    s->kind[i] = STEP;
+    e.i = i;
+    if (r < 0) {
+        s->jstart[i] = t;
+        s->pos[i] = 0;
+        e.t = t + PRE(s, i, 0);
+        return e;
+    }
+    s->owns[i] = -1;
+    k = s->pos[i];
+    t_rel = t + CS(s, i, k);
+    if (s->waiters[r].len)
+        hand_over(s, r, t_rel);
+    else
+        s->free_at[r] = t_rel;
+    s->pos[i] = k + 1;
+    e.t = t_rel + PRE(s, i, k + 1);
+    return e;
+}
+
+static int give_up_cpu(sim_t *s, int c, double t, ev_t *next)
+{
+    if (s->ready[c].len) {
+        *next = resume(s, popleft(&s->ready[c]), t);
+        return 1;
+    }
+    s->busy[c] = 0;
+    return 0;
+}
+
+/* 0: done, -1: out of memory, -2: a thread ran more jobs than cap[] allows */
+int sim_jobs(int n, int ncores, int nlocks, double end_us, double start_delay,
+             const int *ncalls, const int *call_off, const int *pre_off, const int *locks,
+             const double *cs, const double *pre, const double *period, const int *core,
+             const unsigned char *alone, const unsigned char *spin,
+             const int *job_off, const int *cap, double *starts, double *ends, int *njobs)
+{
+    sim_t s = { .ncalls = ncalls, .call_off = call_off, .pre_off = pre_off, .locks = locks,
+                .core = core, .cs = cs, .pre = pre, .alone = alone, .spin = spin };
+    int *ibuf = calloc((size_t)3 * n + ncores + (size_t)(nlocks + ncores) * n + 1, sizeof(int));
+    double *dbuf = calloc((size_t)nlocks + 2 * n + 1, sizeof(double));
+    fifo_t *queues = calloc((size_t)nlocks + ncores + 1, sizeof(fifo_t));
+    ev_t *heap = calloc((size_t)n + 1, sizeof(ev_t));
+    double *next_rel;
+    ev_t pend = { 0.0, 0 };
+    int has_pend = 0, rc = 0, i, q;
+
+    if (!ibuf || !dbuf || !queues || !heap) {
+        rc = -1;
+        goto out;
+    }
+    s.kind = ibuf;
+    s.pos = ibuf + n;
+    s.owns = ibuf + 2 * n;
+    s.busy = ibuf + 3 * n;
+    s.free_at = dbuf;
+    s.jstart = dbuf + nlocks;
+    next_rel = dbuf + nlocks + n;
+    s.waiters = queues;
+    s.ready = queues + nlocks;
+    for (q = 0; q < nlocks + ncores; q++) {
+        queues[q].buf = ibuf + 3 * n + ncores + (size_t)q * n;
+        queues[q].cap = n;
+    }
+    s.heap = heap;
+    for (i = 0; i < n; i++) {
+        s.kind[i] = RELEASE;
+        s.owns[i] = -1;
+        next_rel[i] = start_delay;
+        njobs[i] = 0;
+        heap[i].t = 0.0;          /* start barrier: every thread starts its first job at t = 0 */
+        heap[i].i = i;
+    }
+    s.nheap = n;
+
+    while (s.nheap || has_pend) {
+        ev_t e;
+        int k, r, c;
+        double t, t_rel;
+        if (has_pend) {
+            if (s.nheap && ev_less(heap[0], pend)) {
+                e = heap[0];
+                sift_down(heap, s.nheap, 0, pend);
+            } else {
+                e = pend;
+            }
+            has_pend = 0;
+        } else {
+            e = pop(heap, &s.nheap);
+        }
+        t = e.t;
+        i = e.i;
+
+        if (s.kind[i] == STEP) {
+            int nc = ncalls[i], ahead = 0;
+            k = s.pos[i];
+            while (k < nc) {
+                double f;
+                r = LOCK(&s, i, k);
+                f = s.free_at[r];
+                if (s.waiters[r].len || (f > t && (isinf(f) || !(alone[i] || spin[r]))))
+                    break;
+                if (f > t)
+                    t = f;
+                t_rel = t + CS(&s, i, k);
+                s.free_at[r] = t_rel;
+                k++;
+                t = t_rel + PRE(&s, i, k);
+                if (s.nheap && heap[0].t <= t) {
+                    ahead = 1;
+                    break;
+                }
+            }
+            s.pos[i] = k;
+            if (ahead) {
+                pend.t = t;
+                pend.i = i;
+                has_pend = 1;
+                continue;
+            }
+            if (k == nc) {
+                if (njobs[i] == cap[i]) {
+                    rc = -2;
+                    goto out;
+                }
+                starts[job_off[i] + njobs[i]] = s.jstart[i];
+                ends[job_off[i] + njobs[i]] = t;
+                njobs[i]++;
+                next_rel[i] += period[i];
+                if (t >= end_us) {
+                    has_pend = give_up_cpu(&s, core[i], t, &pend);
+                } else if (t < next_rel[i]) {
+                    s.kind[i] = RELEASE;
+                    push(heap, &s.nheap, next_rel[i], i);
+                    has_pend = give_up_cpu(&s, core[i], t, &pend);
+                } else {
+                    next_rel[i] = t;
+                    s.jstart[i] = t;
+                    s.pos[i] = 0;
+                    pend.t = t + PRE(&s, i, 0);
+                    pend.i = i;
+                    has_pend = 1;
+                }
+                continue;
+            }
+            r = LOCK(&s, i, k);
+            if (!s.waiters[r].len && !isinf(s.free_at[r])) {
+                s.kind[i] = GRANT;
+                push(heap, &s.nheap, s.free_at[r], i);
+            }
+            append(&s.waiters[r], i);
+            if (!spin[r])
+                has_pend = give_up_cpu(&s, core[i], t, &pend);
+        } else if (s.kind[i] == GRANT) {
+            k = s.pos[i];
+            r = LOCK(&s, i, k);
+            popleft(&s.waiters[r]);
+            c = core[i];
+            if (spin[r] || !s.busy[c]) {
+                s.busy[c] = 1;
+                t_rel = t + CS(&s, i, k);
+                if (s.waiters[r].len)
+                    hand_over(&s, r, t_rel);
+                else
+                    s.free_at[r] = t_rel;
+                s.pos[i] = k + 1;
+                s.kind[i] = STEP;
+                pend.t = t_rel + PRE(&s, i, k + 1);
+                pend.i = i;
+                has_pend = 1;
+            } else {
+                s.free_at[r] = INFINITY;
+                s.owns[i] = r;
+                append(&s.ready[c], i);
+            }
+        } else {
+            c = core[i];
+            if (s.busy[c]) {
+                append(&s.ready[c], i);
+            } else {
+                s.busy[c] = 1;
+                pend = resume(&s, i, t);
+                has_pend = 1;
+            }
+        }
+    }
+out:
+    free(ibuf);
+    free(dbuf);
+    free(queues);
+    free(heap);
+    return rc;
+}
+"""
+
+_KERNEL_FLAGS = ("-O2", "-fPIC", "-shared", "-ffp-contract=off")
+_kernel_fn = None          # ctypes function once built, False if building it failed
+
+
+def _kernel():
+    """The compiled event loop (sim_jobs of _KERNEL_C), or None if it cannot be built here."""
+    global _kernel_fn
+    if _kernel_fn is None:
+        try:
+            _kernel_fn = _build_kernel(os.environ.get("CC", "gcc"))
+        except (OSError, RuntimeError) as e:
+            print(f"[SIM] C event loop unavailable ({e}), using the Python one")
+            _kernel_fn = False
+    return _kernel_fn or None
+
+
+def _build_kernel(cc: str):
+    """Compile _KERNEL_C into <tmp>/generator3_sim_<key>.so (reused when it exists) and load it."""
+    path = shutil.which(cc)
+    if path is None:
+        raise RuntimeError(f"{cc} not found")
+    key = hashlib.sha256("\0".join((_KERNEL_C, path, *_KERNEL_FLAGS)).encode()).hexdigest()[:16]
+    lib = Path(tempfile.gettempdir()) / f"generator3_sim_{key}.so"
+    if not lib.exists():
+        with tempfile.TemporaryDirectory(dir=lib.parent) as d:
+            src, out = Path(d) / "sim_kernel.c", Path(d) / "sim_kernel.so"
+            src.write_text(_KERNEL_C)
+            p = subprocess.run([path, *_KERNEL_FLAGS, "-o", str(out), str(src), "-lm"],
+                               stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+            if p.returncode != 0:
+                raise RuntimeError(f"{cc} failed: {p.stdout.strip()}")
+            os.replace(out, lib)
+    fn = ctypes.CDLL(str(lib)).sim_jobs
+    ints = np.ctypeslib.ndpointer(np.int32, flags="C_CONTIGUOUS")
+    doubles = np.ctypeslib.ndpointer(np.float64, flags="C_CONTIGUOUS")
+    flags = np.ctypeslib.ndpointer(np.uint8, flags="C_CONTIGUOUS")
+    fn.restype = ctypes.c_int
+    fn.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.c_int, ctypes.c_double, ctypes.c_double,
+                   ints, ints, ints, ints, doubles, doubles, doubles, ints, flags, flags,
+                   ints, ints, doubles, doubles, ints]
+    return fn
+
+
+def simulate_jobs(taskset, duration_s: float = RUN_DURATION_SEC, cost_scale: float = 1.0, engine: str = "auto"):
+    """
+    Per task (list by task order): (job start, job end) arrays in simulated us. engine "c"
+    runs the compiled event loop, "python" the interpreted one, "auto" the compiled one when
+    it can be built (gcc, or $CC).
+    """
+    tasks = taskset["tasks"]
+    end_us = START_DELAY_US + duration_s * 1e6
+    plans = [task_plan(t, cost_scale) for t in tasks]
+    period = [float(t["period"]) for t in tasks]
+    core = [t["core"] for t in tasks]
+    if engine != "python":
+        fn = _kernel()
+        if fn is not None:
+            return _jobs_c(fn, plans, period, core, end_us)
+        if engine == "c":
+            raise RuntimeError("the C event loop of the simulator cannot be built")
+    return _jobs_py(plans, period, core, end_us)
+
+
+def _jobs_c(fn, plans, period, core, end_us):
+    """simulate_jobs through sim_jobs of _KERNEL_C."""
+    n = len(plans)
+    if n == 0:
+        return []
+    ncalls = np.array([len(p[1]) for p in plans], dtype=np.int32)
+    call_off = np.zeros(n, dtype=np.int32)
+    call_off[1:] = np.cumsum(ncalls)[:-1]
+    pre_off = call_off + np.arange(n, dtype=np.int32)              # ncalls + 1 entries per task
+    locks = np.array([k for p in plans for k in p[1]], dtype=np.int32)
+    cs = np.array([c for p in plans for c in p[2]], dtype=np.float64)
+    pre = np.array([x for p in plans for x in p[0] + [p[3]]], dtype=np.float64)
+    period = np.array(period, dtype=np.float64)
+    core = np.array(core, dtype=np.int32)
+    ncores = int(core.max()) + 1
+    alone = (np.bincount(core, minlength=ncores)[core] == 1).astype(np.uint8)
+    spin = np.array(_SPIN, dtype=np.uint8)
+    # one job per release, plus slack; doubled (and the run repeated) if a task needs more
+    cap = (end_us / np.maximum(period, 1.0)).astype(np.int32) + 4
+    while True:
+        job_off = np.zeros(n, dtype=np.int32)
+        job_off[1:] = np.cumsum(cap)[:-1]
+        starts = np.empty(int(cap.sum()))
+        ends = np.empty_like(starts)
+        njobs = np.zeros(n, dtype=np.int32)
+        rc = fn(n, ncores, len(spin), end_us, START_DELAY_US, ncalls, call_off, pre_off, locks, cs, pre,
+                period, core, alone, spin, job_off, cap, starts, ends, njobs)
+        if rc == -2:
+            cap *= 2
+            continue
+        if rc != 0:
+            raise MemoryError("simulator event loop: out of memory")
+        return [(starts[o:o + m].copy(), ends[o:o + m].copy()) for o, m in zip(job_off, njobs)]
+
+
+def _jobs_py(plans, period, core, end_us):
+    """simulate_jobs in Python: the reference event loop, used where the C one cannot be built."""
+    n = len(plans)
+    pre = [p[0] + [p[3]] for p in plans]          # pre[i][ncalls] = tail
+    locks = [p[1] for p in plans]
+    cs = [p[2] for p in plans]
+    ncalls = [len(p[1]) for p in plans]
+
+    ncores = max(core, default=-1) + 1
+    per_core = [0] * ncores
+    for c in core:
+        per_core[c] += 1
+    alone = [per_core[c] == 1 for c in core]     # only thread of its core
+    busy = [False] * ncores                      # a thread holds the CPU (running or spinning)
+    ready = [deque() for _ in range(ncores)]     # woken threads waiting for the CPU
+    nlocks = len(shared_api_lib)
+    free_at = [0.0] * nlocks                     # release time of the holder (inf: holder waits for its CPU)
+    waiters = [deque() for _ in range(nlocks)]
+
+    kind = [_RELEASE] * n      # the one pending event of each thread
+    pos = [0] * n              # next lock call of the current job (ncalls: the tail)
+    owns = [-1] * n            # lock granted while the thread waited for its CPU
+    next_rel = [START_DELAY_US] * n
+    jstart = [0.0] * n
+    starts = [[] for _ in range(n)]
+    ends = [[] for _ in range(n)]
+
+    # events are (time, thread): a thread has at most one pending event, its kind is kind[thread];
+    # start barrier: every thread starts its first job at t = 0, queued per core in task order
+    heap = [(0.0, i) for i in range(n)]
+    push, pop, pushpop = heapq.heappush, heapq.heappop, heapq.heappushpop
+    inf, spin_lock = math.inf, _SPIN
+
+    def hand_over(r, t):
+        """
+        Lock r is released at t with threads waiting: the waiters that need nobody's CPU
+        (spinning, or alone on their core) take it in turn right away, a grant event is
+        scheduled for the first other one.
+        """
+        q = waiters[r]
+        spin = spin_lock[r]
+        while q:
+            w = q[0]
+            if not (spin or alone[w]):
+                kind[w] = _GRANT
+                push(heap, (t, w))
+                break
+            q.popleft()
+            busy[core[w]] = True
+            k = pos[w]
+            t += cs[w][k]
+            pos[w] = k + 1
+            kind[w] = _STEP
+            push(heap, (t + pre[w][k + 1], w))
+        free_at[r] = t
+
+    def resume(i, t):
+        """
+        Thread i gets the CPU at t: start a job or run the critical section it was granted.
+        Returns its next event, for the caller to schedule.
+        """
+        r = owns[i]
+        kind[i] = _STEP
+        if r < 0:
+            jstart[i] = t
+            pos[i] = 0
+            return t + pre[i][0], i
+        owns[i] = -1
+        k = pos[i]
+        t_rel = t + cs[i][k]
+        if waiters[r]:
+            hand_over(r, t_rel)
+        else:
+            free_at[r] = t_rel
+        pos[i] = k + 1
+        return t_rel + pre[i][k + 1], i
+
+    def give_up_cpu(c, t):
+        """The thread running on core c stops at t; returns the next event of the one taking over, if any."""
+        if ready[c]:
+            return resume(ready[c].popleft(), t)
+        busy[c] = False
+        return None
+
+    pending = None             # next event of the thread just processed (fast path: heappushpop)
+    while heap or pending is not None:
+        if pending is not None:
+            t, i = pushpop(heap, pending) if heap else pending
+            pending = None
+        else:
+            t, i = pop(heap)
+        ev = kind[i]
+
+        if ev == _STEP:
+            # thread i holds its CPU and reached lock call pos[i] (or the end of its job);
+            # it runs ahead through free locks as long as no other event comes first
+            k = pos[i]
+            nc, locks_i, cs_i, pre_i, alone_i = ncalls[i], locks[i], cs[i], pre[i], alone[i]
+            ahead = False
+            while k < nc:
+                r = locks_i[k]
+                f = free_at[r]
+                if waiters[r] or (f > t and (f == inf or not (alone_i or spin_lock[r]))):
+                    break
+                if f > t:
+                    # nobody can take this thread's CPU while it waits: queue behind the
+                    # holder by reserving the lock instead of waiting for a grant
+                    t = f
+                free_at[r] = t_rel = t + cs_i[k]
+                k += 1
+                t = t_rel + pre_i[k]
+                if heap and heap[0][0] <= t:
+                    ahead = True
+                    break
+            pos[i] = k
+            if ahead:
+                pending = (t, i)
+                continue
+            if k == nc:
+                starts[i].append(jstart[i])
+                ends[i].append(t)
+                next_rel[i] += period[i]
+                if t >= end_us:
+                    pending = give_up_cpu(core[i], t)
+                elif t < next_rel[i]:
+                    kind[i] = _RELEASE
+                    push(heap, (next_rel[i], i))
+                    pending = give_up_cpu(core[i], t)
+                else:
+                    # overrun: realign and start the next job right away
+                    next_rel[i] = t
+                    jstart[i] = t
+                    pos[i] = 0
+                    pending = (t + pre[i][0], i)
+                continue
+            r = locks_i[k]
+            if not waiters[r] and free_at[r] != inf:
+                kind[i] = _GRANT
+                push(heap, (free_at[r], i))
+            waiters[r].append(i)
+            if not spin_lock[r]:
+                pending = give_up_cpu(core[i], t)
+
+        elif ev == _GRANT:
+            # the lock of thread i's pending call is handed over to it at t
+            k = pos[i]
+            r = locks[i][k]
+            waiters[r].popleft()
+            c = core[i]
+            if spin_lock[r] or not busy[c]:
+                busy[c] = True
+                t_rel = t + cs[i][k]
+                if waiters[r]:
+                    hand_over(r, t_rel)
+                else:
+                    free_at[r] = t_rel
+                pos[i] = k + 1
+                kind[i] = _STEP
+                pending = (t_rel + pre[i][k + 1], i)
+            else:
+                # owner, but its CPU is taken: the lock stays held until it runs
+                free_at[r] = inf
+                owns[i] = r
+                ready[c].append(i)
+
+        else:
+            # release of thread i's next job
+            c = core[i]
+            if busy[c]:
+                ready[c].append(i)
+            else:
+                busy[c] = True
+                pending = resume(i, t)
+
+    return [(np.array(s), np.array(e)) for s, e in zip(starts, ends)]
+
+
+def _stats(delay, missed, hist_bins, lo_exp, sub, octaves, sid):
+    """Stats object of the SUMMARY record (stats_print_json) for one set of jobs."""
+    nj = int(delay.size)
+    if nj == 0:
+        return {"id": sid, "n": 0, "misses": 0, "mean": 0.0, "var": 0.0, "min": 0.0, "max": 0.0, "hist": []}
+    # hist_bin() of the template: bin 1 + o*sub + j covers 2^(lo_exp+o) * [1 + j/sub, 1 + (j+1)/sub)
+    m, e = np.frexp(delay)
+    o = e - 1 - lo_exp
+    b = np.where(o < 0, 0, np.where(o >= octaves, hist_bins - 1,
+                                    1 + o * sub + ((2.0 * m - 1.0) * sub).astype(np.int64)))
+    b = np.where(delay > 0.0, b, 0)
+    counts = np.bincount(b, minlength=hist_bins)
+    return {
+        "id": sid, "n": nj, "misses": int(missed.sum()),
+        "mean": float(delay.mean()), "var": float(delay.var(ddof=1)) if nj > 1 else 0.0,
+        "min": float(delay.min()), "max": float(delay.max()),
+        "hist": [[int(k), int(counts[k])] for k in np.flatnonzero(counts)],
+    }
+
+
+def simulate(taskset, duration_s: float = RUN_DURATION_SEC, cost_scale: float = 1.0, engine: str = "auto"):
+    """SUMMARY record (dict) of a simulated run of `taskset`, see module docstring."""
+    lo_exp, sub, octaves = DEFAULT_OPTIONS["hist_lo_exp"], DEFAULT_OPTIONS["hist_sub"], DEFAULT_OPTIONS["hist_octaves"]
+    hist_bins = octaves * sub + 2
+    tasks = taskset["tasks"]
+    delays, misses = [], []
+    for task, (s, e) in zip(tasks, simulate_jobs(taskset, duration_s, cost_scale, engine)):
+        actual = np.floor(e) - np.floor(s)
+        delays.append(actual / task["wcet"] if task["wcet"] > 0 else np.zeros_like(actual))
+        misses.append(actual > task["period"])
+
+    def stats(idx, sid):
+        d = np.concatenate([delays[i] for i in idx]) if idx else np.empty(0)
+        m = np.concatenate([misses[i] for i in idx]) if idx else np.empty(0, dtype=bool)
+        return _stats(d, m, hist_bins, lo_exp, sub, octaves, sid)
+
+    ncores = taskset["meta"]["M"]
+    return {
+        "version": 1, "duration_s": float(duration_s), "stop": "fixed", "backend": "sim",
+        "hist": {"lo_exp": lo_exp, "sub": sub, "octaves": octaves},
+        "global": stats(list(range(len(tasks))), -1),
+        "cores": [stats([i for i, t in enumerate(tasks) if t["core"] == c], c) for c in range(ncores)],
+        "tasks": [stats([i], i) for i in range(len(tasks))],
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Simulate one random generator3 taskset and print its SUMMARY record")
+    ap.add_argument("--M", type=int, default=16)
+    ap.add_argument("--N", type=int, default=None, help="tasks (default M)")
+    ap.add_argument("--Cr", type=float, default=0.5)
+    ap.add_argument("--contention", type=float, default=0.5)
+    ap.add_argument("--fn", type=int, default=10)
+    ap.add_argument("--wcet-min", type=int, default=200)
+    ap.add_argument("--wcet-max", type=int, default=500)
+    ap.add_argument("--raf-max", type=int, default=200)
+    ap.add_argument("--partition", choices=tuple(PARTITIONERS), default="rr", help="task-to-core assignment")
+    ap.add_argument("--duration", type=float, default=RUN_DURATION_SEC, help="simulated run length (s)")
+    ap.add_argument("--seed", type=int, default=12345)
+    ap.add_argument("--engine", choices=("auto", "c", "python"), default="auto",
+                    help="event loop: compiled, Python, or compiled when it can be built")
+    args = ap.parse_args()
+
+    taskset = generate_taskset(args.M, args.N or args.M, args.wcet_min, args.wcet_max, args.Cr, args.raf_max,
+                               args.fn, args.contention, rng=np.random.default_rng(args.seed),
+                               partition=args.partition)
+    t0 = time.perf_counter()
+    summary = simulate(taskset, args.duration, engine=args.engine)
+    elapsed = time.perf_counter() - t0
+    g = summary["global"]
+    print("SUMMARY " + json.dumps(summary))
+    for load, c in zip(core_loads(taskset), summary["cores"]):
+        print(f"[CORE {load['core']}] tasks={load['tasks']} util={load['util']:.3f} "
+              f"shared_util={load['shared_util']:.3f} jobs={c['n']} misses={c['misses']} delay_mean={c['mean']:.6f}")
+    print(f"[SIM] jobs={g['n']} misses={g['misses']} delay_mean={g['mean']:.6f} "
+          f"simulated {args.duration:g} s in {elapsed:.3f} s")
+
+
+if __name__ == "__main__":
+    main()